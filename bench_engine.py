@@ -0,0 +1,334 @@
+import sys, os, json, asyncio, argparse, random, time, queue, tempfile, shutil, platform, subprocess, statistics, logging
+import multiprocessing as mp
+from aiohttp import web
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# ============================
+# Synthetic File Server (Range, Latency, Bandwidth, Faults)
+# ============================
+PATTERN_SIZE = 1024 * 1024
+SEND_PIECE = 64 * 1024
+
+class SyntheticServer:
+    # محتوای فایل‌ها از تکرار یک بلوک تصادفی ساخته می‌شود؛ چیزی روی دیسک یا در حافظه نگه داشته نمی‌شود
+    def __init__(self, latency=0.0, rate=0, reset_rate=0.0, error_rate=0.0, seed=1):
+        self.latency = latency
+        self.rate = rate
+        self.reset_rate = reset_rate
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        pattern = random.Random(seed).randbytes(PATTERN_SIZE)
+        self.pattern = pattern + pattern
+        self.first_bytes = []
+        self.requests = 0
+        self.faults = {"resets": 0, "errors": 0}
+
+    def piece(self, offset, size):
+        start = offset % PATTERN_SIZE
+        return self.pattern[start:start + size]
+
+    async def handle_file(self, request):
+        size = int(request.match_info["size"])
+        if not request.match_info["name"].endswith(".zip"):
+            # مثل یک سرور واقعی، فایل‌های جانبی (مثلاً .meta4) وجود ندارند
+            return web.Response(status=404)
+        headers = {"Accept-Ranges": "bytes", "ETag": f'"{request.match_info["size"]}-{request.match_info["name"]}"'}
+        if request.method == "HEAD":
+            return web.Response(headers={**headers, "Content-Length": str(size)})
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.faults["errors"] += 1
+            return web.Response(status=503, headers={"Retry-After": "1"})
+        start, end, status = 0, size - 1, 200
+        range_header = request.headers.get("Range")
+        if range_header and range_header.startswith("bytes="):
+            first, _, last = range_header[6:].partition("-")
+            start = int(first) if first else 0
+            end = min(int(last), size - 1) if last else size - 1
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        length = end - start + 1
+        cut = length
+        if self.reset_rate and self.random.random() < self.reset_rate:
+            cut = self.random.randrange(length)
+            self.faults["resets"] += 1
+        resp = web.StreamResponse(status=status, headers=headers)
+        resp.content_length = length
+        await resp.prepare(request)
+        began = time.monotonic()
+        sent = 0
+        while sent < length:
+            if sent >= cut:
+                # قطع ناگهانی اتصال در میانه پاسخ
+                request.transport.abort()
+                return resp
+            data = self.piece(start + sent, min(SEND_PIECE, length - sent, cut - sent))
+            await resp.write(data)
+            if not sent:
+                self.first_bytes.append(time.time())
+            sent += len(data)
+            if self.rate:
+                delay = began + sent / self.rate - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        await resp.write_eof()
+        return resp
+
+    async def handle_stats(self, request):
+        return web.json_response({"first_bytes": self.first_bytes, "requests": self.requests, "faults": self.faults})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_route("*", "/files/{size}/{name}", self.handle_file)
+        app.router.add_get("/_stats", self.handle_stats)
+        return app
+
+def run_server(options, ready):
+    server = SyntheticServer(options["latency"], options["rate"], options["reset_rate"], options["error_rate"], options["seed"])
+
+    async def serve():
+        runner = web.AppRunner(server.app(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        ready.put(runner.addresses[0][1])
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+# ============================
+# Client Scenarios (one process per run)
+# ============================
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # لینوکس بر حسب کیلوبایت و macOS بر حسب بایت
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def cpu_seconds():
+    if resource is None:
+        return time.process_time()
+    # پردازه‌های موتور (در حالت چندپردازه‌ای) پس از پایان اجرا join شده‌اند و در RUSAGE_CHILDREN حساب می‌شوند
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime + children.ru_utime + children.ru_stime
+
+def run_scenario(scenario, base_url, results):
+    logging.disable(logging.WARNING)
+    import main as engine
+    baseline_rss = peak_rss_mb()
+    folder = tempfile.mkdtemp(prefix="linkstorm-bench-")
+    config = dict(engine.DEFAULT_CONFIG)
+    config.update({
+        "multi_connection_parts": scenario["parts"],
+        "multi_connection_min_size": 0 if scenario["parts"] > 1 else 1 << 62,
+        "resume_downloads": False,
+        "dedup_by_content": False,
+        "use_mmap_writes": scenario["mmap"],
+        "engine_processes": scenario["processes"],
+        "engine_shard_by": "item",
+        # تنظیم خودکار میزبان‌ها نتیجه را جابه‌جا می‌کند و host_tuning.json را بازنویسی می‌کند
+        "auto_tune_hosts": False,
+        "use_uvloop": scenario["loop"] == "uvloop"
+    })
+    if scenario["chunk_size"]:
+        config["chunk_size"] = config["max_read_size"] = scenario["chunk_size"]
+    urls = [f"{base_url}/files/{scenario['file_size']}/bench{i}.zip" for i in range(scenario["concurrency"])]
+    worker = engine.DownloadWorker(urls, folder, config)
+    errors = []
+    worker.file_error.connect(lambda name, error: errors.append(f"{name}: {error}"))
+    started_wall = time.time()
+    started = time.perf_counter()
+    started_cpu = cpu_seconds()
+    try:
+        engine.run_event_loop(worker.process_downloads(), config)
+        seconds = time.perf_counter() - started
+        cpu = cpu_seconds() - started_cpu
+        total = sum(os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder) if not name.endswith(engine.PART_SUFFIX))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    results.put({
+        "bytes": total,
+        "seconds": round(seconds, 4),
+        "throughput_mbps": round(total / seconds / (1024 * 1024), 2) if seconds else None,
+        "cpu_seconds": round(cpu, 4),
+        "cpu_seconds_per_gb": round(cpu / (total / (1024 ** 3)), 3) if total else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "baseline_rss_mb": baseline_rss,
+        "started": started_wall,
+        "retries": sum(data.get("errors", 0) for data in worker.analytics.values()),
+        "failed": errors
+    })
+
+def fetch_stats(base_url):
+    import urllib.request
+    with urllib.request.urlopen(f"{base_url}/_stats", timeout=10) as resp:
+        return json.loads(resp.read())
+
+def run_isolated(scenario, base_url, context, timeout):
+    results = context.Queue()
+    process = context.Process(target=run_scenario, args=(scenario, base_url, results))
+    process.start()
+    deadline = time.monotonic() + timeout
+    result = None
+    while result is None:
+        try:
+            result = results.get(timeout=0.5)
+        except queue.Empty:
+            if not process.is_alive():
+                return {"error": f"client exited with code {process.exitcode}"}
+            if time.monotonic() > deadline:
+                process.terminate()
+                process.join()
+                return {"error": f"timed out after {timeout}s"}
+    process.join()
+    stats = fetch_stats(base_url)
+    first = [t for t in stats["first_bytes"] if t >= result["started"]]
+    result["ttfb_ms"] = round((min(first) - result.pop("started")) * 1000, 2) if first else None
+    return result
+
+# ============================
+# Scenario Matrix and Reporting
+# ============================
+def parse_list(text, convert=int):
+    return [convert(value) for value in text.split(",") if value.strip()]
+
+def parse_chunk(value):
+    value = value.strip().lower()
+    return 0 if value in ("adaptive", "auto", "0") else int(value) * 1024
+
+def build_scenarios(args):
+    base = {"file_size": int(args.size * 1024 * 1024), "parts": 1, "chunk_size": 0, "concurrency": 1, "mmap": args.mmap, "processes": 1, "loop": "asyncio"}
+    scenarios = []
+    if args.matrix:
+        for parts in args.parts:
+            for chunk in args.chunk_sizes:
+                for concurrency in args.concurrency:
+                    for processes in args.processes:
+                        for loop in args.loops:
+                            scenarios.append({**base, "parts": parts, "chunk_size": chunk, "concurrency": concurrency, "processes": processes, "loop": loop})
+    else:
+        # هر محور جداگانه نسبت به حالت پایه (یک اتصال، خواندن تطبیقی، یک فایل) تغییر می‌کند
+        scenarios += [{**base, "parts": parts} for parts in args.parts]
+        scenarios += [{**base, "chunk_size": chunk} for chunk in args.chunk_sizes if chunk]
+        scenarios += [{**base, "concurrency": concurrency} for concurrency in args.concurrency if concurrency > 1]
+        # پردازه‌های موتور فقط با چند فایل هم‌زمان معنا دارند
+        scenarios += [{**base, "concurrency": max(args.concurrency), "processes": processes} for processes in args.processes if processes > 1]
+        # هر حلقه رویداد دیگر در حالت پایه، با بیشترین هم‌زمانی و با بیشترین تعداد اتصال
+        for loop in args.loops:
+            if loop != "asyncio":
+                scenarios += [{**base, "loop": loop}, {**base, "concurrency": max(args.concurrency), "loop": loop}, {**base, "parts": max(args.parts), "loop": loop}]
+    unique = []
+    for scenario in scenarios:
+        if scenario not in unique:
+            unique.append(scenario)
+    for scenario in unique:
+        chunk = f"{scenario['chunk_size'] // 1024}K" if scenario["chunk_size"] else "adaptive"
+        scenario["name"] = f"parts={scenario['parts']} chunk={chunk} files={scenario['concurrency']}"
+        if scenario["processes"] > 1:
+            scenario["name"] += f" procs={scenario['processes']}"
+        if scenario["loop"] != "asyncio":
+            scenario["name"] += f" loop={scenario['loop']}"
+    return unique
+
+def default_loops():
+    try:
+        import uvloop
+    except ImportError:
+        return ["asyncio"]
+    return ["asyncio", "uvloop"]
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def summarize(runs):
+    ok = [run for run in runs if "error" not in run and not run["failed"]]
+    if not ok:
+        return {"runs": runs}
+    summary = {"runs": runs}
+    for key in ("throughput_mbps", "cpu_seconds_per_gb", "peak_rss_mb", "ttfb_ms", "seconds"):
+        values = [run[key] for run in ok if run.get(key) is not None]
+        if values:
+            summary[key] = round(statistics.median(values), 3)
+    return summary
+
+def print_table(results, baseline=None):
+    previous = {item["name"]: item for item in (baseline or {}).get("results", [])}
+    print(f"{'scenario':<42}{'MB/s':>10}{'CPU s/GB':>10}{'RSS MB':>9}{'TTFB ms':>9}{'vs base':>9}")
+    for item in results:
+        delta = ""
+        old = previous.get(item["name"], {}).get("throughput_mbps")
+        if old and item.get("throughput_mbps"):
+            delta = f"{(item['throughput_mbps'] / old - 1) * 100:+.1f}%"
+        row = [item.get(key) for key in ("throughput_mbps", "cpu_seconds_per_gb", "peak_rss_mb", "ttfb_ms")]
+        print(f"{item['name']:<42}" + "".join(f"{'-' if v is None else v:>{w}}" for v, w in zip(row, (10, 10, 9, 9))) + f"{delta:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the LinkStorm download engine against a local synthetic HTTP server.")
+    parser.add_argument("--size", type=float, default=64, help="file size in MB (default 64)")
+    parser.add_argument("--parts", type=lambda t: parse_list(t), default=[1, 2, 4, 8], help="connections per file; 1 = single stream (default 1,2,4,8)")
+    parser.add_argument("--chunk-sizes", type=lambda t: parse_list(t, parse_chunk), default=[0, 8 * 1024, 64 * 1024, 1024 * 1024], help="read sizes in KB or 'adaptive' (default adaptive,8,64,1024)")
+    parser.add_argument("--concurrency", type=lambda t: parse_list(t), default=[1, 4], help="files downloaded at once (default 1,4)")
+    parser.add_argument("--loops", type=lambda t: parse_list(t, str), default=default_loops(), help="event loops to compare (default asyncio, plus uvloop when installed)")
+    parser.add_argument("--processes", type=lambda t: parse_list(t), default=[1], help="engine processes (default 1; e.g. 1,2,4)")
+    parser.add_argument("--matrix", action="store_true", help="run every combination instead of one axis at a time")
+    parser.add_argument("--mmap", action="store_true", help="enable memory-mapped writes for segmented downloads")
+    parser.add_argument("--latency", type=float, default=0, help="server delay before each response, in ms")
+    parser.add_argument("--rate", type=float, default=0, help="server bandwidth cap per connection, in KB/s (0 = unlimited)")
+    parser.add_argument("--reset-rate", type=float, default=0, help="probability that a GET is cut off mid-body")
+    parser.add_argument("--error-rate", type=float, default=0, help="probability that a GET returns 503")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario; medians are reported")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds before a run is abandoned")
+    parser.add_argument("--output", default="bench_engine.json", help="JSON results file")
+    parser.add_argument("--compare", help="earlier JSON results to compare throughput against")
+    args = parser.parse_args()
+
+    context = mp.get_context("spawn")
+    server_options = {"latency": args.latency / 1000, "rate": args.rate * 1024, "reset_rate": args.reset_rate, "error_rate": args.error_rate, "seed": args.seed}
+    ready = context.Queue()
+    server = context.Process(target=run_server, args=(server_options, ready), daemon=True)
+    server.start()
+    base_url = f"http://127.0.0.1:{ready.get(timeout=30)}"
+    results = []
+    try:
+        for scenario in build_scenarios(args):
+            runs = []
+            for _ in range(args.repeat):
+                runs.append(run_isolated(scenario, base_url, context, args.timeout))
+            results.append({**scenario, **summarize(runs)})
+            print(f"{scenario['name']}: {results[-1].get('throughput_mbps', 'failed')} MB/s", flush=True)
+        faults = fetch_stats(base_url)["faults"]
+    finally:
+        server.terminate()
+    report = {
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "server": {**server_options, "injected": faults},
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print()
+    print_table(results, baseline)
+    print(f"\nResults saved to {args.output}")
+
+if __name__ == "__main__":
+    mp.freeze_support()
+    main()
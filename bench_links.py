@@ -0,0 +1,207 @@
+import sys, os, json, argparse, random, time, tempfile, threading, shutil, statistics, logging, platform, subprocess
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+# ============================
+# Fixtures (Generated Index Pages and Caches)
+# ============================
+EXTENSIONS = [".mp3", ".mp4", ".pdf", ".zip", ".rar", ".exe", ".msi"]
+OTHER_EXTENSIONS = [".html", ".php", ".jpg", ".css", ".js", "/"]
+
+def generate_index_page(anchors, seed=1, match_ratio=0.5):
+    # ترکیبی از لینک‌های نسبی/مطلق، نقل‌قول‌های مختلف، فایل‌های مجاز و غیرمجاز و چک‌سام‌ها
+    rng = random.Random(seed)
+    rows = ["<html><head><title>Index of /files</title></head><body><table>"]
+    for i in range(anchors):
+        if rng.random() < match_ratio:
+            ext = rng.choice(EXTENSIONS)
+            name = f"file-{i}-{rng.choice(['128', '320', 'hq', 'v2'])}{ext}"
+        else:
+            name = f"page-{i}{rng.choice(OTHER_EXTENSIONS)}"
+        if i % 50 == 0:
+            name += ".sha256"
+        kind = i % 4
+        if kind == 0:
+            href = f'"{name}"'
+        elif kind == 1:
+            href = f"'/files/{name}'"
+        elif kind == 2:
+            href = f'"https://mirror{i % 3}.example.org/files/{name}"'
+        else:
+            href = name
+        rows.append(f'<tr><td><a href={href}>{name}</a></td><td align="right">2024-01-{i % 28 + 1:02d} 10:{i % 60:02d}</td><td align="right">{rng.randint(1, 900)}M</td></tr>')
+    rows.append("</table></body></html>")
+    return "\n".join(rows)
+
+class FixtureServer:
+    # صفحات تولیدشده از یک پوشه موقت سرو می‌شوند تا مسیر کامل requests.get هم اندازه‌گیری شود
+    def __init__(self, folder):
+        handler = lambda *args, **kwargs: QuietHandler(*args, directory=folder, **kwargs)
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+# ============================
+# Measurement
+# ============================
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), statistics.median(timings)
+
+def bench_extraction(engine, server, folder, sizes, repeat, seed):
+    results = {}
+    allowed = engine.DEFAULT_CONFIG["allowed_extensions"]
+    for anchors in sizes:
+        page = generate_index_page(anchors, seed)
+        name = f"index-{anchors}.html"
+        with open(os.path.join(folder, name), "w", encoding="utf-8") as f:
+            f.write(page)
+        url = f"{server.base_url}/{name}"
+        megabytes = len(page.encode("utf-8")) / (1024 * 1024)
+        found = len(engine.advanced_filter_links(page, url, allowed))
+        best, median = measure(lambda: engine.advanced_filter_links(page, url, allowed, "320"), repeat)
+        results[f"filter_links/{anchors}"] = {
+            "seconds": round(best, 6), "median_seconds": round(median, 6),
+            "ns_per_link": round(best / anchors * 1e9, 1), "mb_per_s": round(megabytes / best, 2),
+            "page_mb": round(megabytes, 2), "links_found": found
+        }
+        # مانند parse_page: فقط سطرهای لینک‌های مجاز تجزیه می‌شوند
+        wanted = set(engine.advanced_filter_links(page, url, allowed))
+        entries = engine.parse_listing(page, url, wanted)
+        best, median = measure(lambda: engine.parse_listing(page, url, wanted), repeat)
+        results[f"parse_listing/{anchors}"] = {
+            "seconds": round(best, 6), "median_seconds": round(median, 6),
+            "ns_per_link": round(best / anchors * 1e9, 1), "mb_per_s": round(megabytes / best, 2),
+            "entries": len(entries), "with_size": sum(1 for entry in entries.values() if entry["size"] is not None)
+        }
+        best, median = measure(lambda: engine.extract_all_download_links(url, allowed, None, {}), repeat)
+        results[f"extract_all/{anchors}"] = {
+            "seconds": round(best, 6), "median_seconds": round(median, 6),
+            "ns_per_link": round(best / anchors * 1e9, 1), "mb_per_s": round(megabytes / best, 2)
+        }
+        print(f"{anchors:>7} anchors: filter {results[f'filter_links/{anchors}']['ns_per_link']} ns/link, "
+              f"listing {results[f'parse_listing/{anchors}']['ns_per_link']} ns/link, "
+              f"extract {results[f'extract_all/{anchors}']['ns_per_link']} ns/link", flush=True)
+    return results
+
+def bench_cache(engine, server, folder, sizes, page_anchors, repeat, seed):
+    results = {}
+    page = generate_index_page(page_anchors, seed)
+    with open(os.path.join(folder, "cached.html"), "w", encoding="utf-8") as f:
+        f.write(page)
+    engine.CACHE_FILE = os.path.join(folder, "cache.json")
+    for entries in sizes:
+        engine.cache_data = {f"{server.base_url}/page-{i}.html": page for i in range(entries)}
+        engine.save_cache_data()
+        file_mb = os.path.getsize(engine.CACHE_FILE) / (1024 * 1024)
+        hit_url = f"{server.base_url}/page-{entries // 2}.html"
+        lookups = 1000
+        best, _ = measure(lambda: [engine.get_cached_page(hit_url) for _ in range(lookups)], repeat)
+        lookup_us = best / lookups * 1e6
+        # درج: یک صفحه جدید دریافت و کل کش دوباره ذخیره می‌شود
+        insert_timings = []
+        for i in range(repeat):
+            miss_url = f"{server.base_url}/cached.html?miss={entries}-{i}"
+            started = time.perf_counter()
+            engine.get_cached_page(miss_url)
+            insert_timings.append(time.perf_counter() - started)
+            engine.cache_data.pop(miss_url, None)
+        save_best, _ = measure(engine.save_cache_data, repeat)
+        load_best, _ = measure(engine.load_cache_data, repeat)
+        results[f"cache/{entries}"] = {
+            "lookup_us": round(lookup_us, 3), "insert_ms": round(min(insert_timings) * 1000, 3),
+            "save_ms": round(save_best * 1000, 3), "load_ms": round(load_best * 1000, 3),
+            "file_mb": round(file_mb, 2), "save_mb_per_s": round(file_mb / save_best, 2) if save_best else None
+        }
+        print(f"{entries:>7} cached pages: lookup {results[f'cache/{entries}']['lookup_us']} us, "
+              f"insert {results[f'cache/{entries}']['insert_ms']} ms, save {results[f'cache/{entries}']['save_ms']} ms", flush=True)
+    return results
+
+# ============================
+# Regression Check
+# ============================
+LOWER_IS_BETTER = ("seconds", "ns_per_link", "lookup_us", "insert_ms", "save_ms", "load_ms")
+HIGHER_IS_BETTER = ("mb_per_s", "save_mb_per_s")
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, metrics in results.items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        for key, value in metrics.items():
+            previous = old.get(key)
+            if not previous or value is None or key not in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+                continue
+            change = (value / previous - 1) * 100
+            worse = change > threshold if key in LOWER_IS_BETTER else -change > threshold
+            marker = "  REGRESSION" if worse else ""
+            print(f"{name:<24}{key:<16}{previous:>12}{value:>12}{change:>+9.1f}%{marker}")
+            if worse:
+                regressions.append(f"{name} {key}")
+    return regressions
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for LinkStorm link extraction and the page cache.")
+    parser.add_argument("--anchors", default="1000,10000,100000,500000", help="anchors per generated index page")
+    parser.add_argument("--cache-sizes", default="10,100,1000", help="pages held in the cache")
+    parser.add_argument("--cache-page-anchors", type=int, default=200, help="anchors per cached page")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement; the best run is reported")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--quick", action="store_true", help="small sizes only (1k/10k anchors, 10/100 cached pages)")
+    parser.add_argument("--output", default="bench_links.json", help="JSON results file")
+    parser.add_argument("--baseline", help="earlier JSON results to check for regressions")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed slowdown in percent before a metric counts as a regression")
+    args = parser.parse_args()
+    if args.quick:
+        args.anchors, args.cache_sizes = "1000,10000", "10,100"
+
+    logging.disable(logging.WARNING)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main as engine
+    folder = tempfile.mkdtemp(prefix="linkstorm-links-")
+    server = FixtureServer(folder)
+    try:
+        results = bench_extraction(engine, server, folder, [int(n) for n in args.anchors.split(",")], args.repeat, args.seed)
+        results.update(bench_cache(engine, server, folder, [int(n) for n in args.cache_sizes.split(",")], args.cache_page_anchors, args.repeat, args.seed))
+    finally:
+        server.close()
+        shutil.rmtree(folder, ignore_errors=True)
+    report = {
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    print(f"\nResults saved to {args.output}")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print()
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold}%.")
+            sys.exit(1)
+        print(f"\nNo regression above {args.threshold}%.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import sys, os, json, argparse, random, time, sqlite3, statistics, logging, platform, subprocess
+from collections import deque
+from urllib.parse import urlparse
+
+# ============================
+# Queues (Recorded or Generated)
+# ============================
+def load_queue_db(path):
+    # فقط خواندنی؛ صف برنامه تغییر نمی‌کند
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = db.execute("SELECT url, size, priority FROM items ORDER BY position").fetchall()
+    finally:
+        db.close()
+    return [{"url": url, "size": size, "priority": priority or 0} for url, size, priority in rows]
+
+def load_queue_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    items = data.get("items", data) if isinstance(data, dict) else data
+    return [{"url": item["url"], "size": item.get("size"), "priority": item.get("priority", 0)} for item in items]
+
+def generate_queue(files, hosts, seed):
+    # توزیع log-normal: تعداد زیادی فایل کوچک و چند فایل بسیار بزرگ، مانند صفحات index واقعی
+    rng = random.Random(seed)
+    items = []
+    for i in range(files):
+        size = int(min(4 * 1024 ** 3, max(64 * 1024, rng.lognormvariate(16.5, 1.6))))
+        items.append({"url": f"http://host{i % hosts}.example.org/files/file-{i:05d}.zip", "size": size, "priority": rng.choice((0, 0, 0, 1, 2))})
+    rng.shuffle(items)
+    return items
+
+# ============================
+# Simulation
+# ============================
+def simulate(urls, sizes, host_bandwidth, link_bandwidth, concurrency, latency, default_size):
+    # شبیه‌سازی رویدادمحور: پهنای باند هر میزبان بین اتصال‌های فعال آن و پهنای باند کل بین همه تقسیم می‌شود
+    pending = deque(urls)
+    active = {}
+    completions = {}
+    now = 0.0
+    while pending or active:
+        while pending and len(active) < concurrency:
+            url = pending.popleft()
+            active[url] = [float(sizes.get(url) or default_size), now + latency]
+        flowing = [url for url, (_, ready) in active.items() if ready <= now]
+        per_host = {}
+        for url in flowing:
+            host = urlparse(url).hostname
+            per_host[host] = per_host.get(host, 0) + 1
+        rates = {}
+        for url in flowing:
+            host = urlparse(url).hostname
+            rate = host_bandwidth[host] / per_host[host]
+            if link_bandwidth:
+                rate = min(rate, link_bandwidth / len(flowing))
+            rates[url] = rate
+        steps = [ready - now for _, ready in active.values() if ready > now]
+        steps += [active[url][0] / rate for url, rate in rates.items()]
+        step = max(0.0, min(steps))
+        now += step
+        for url, rate in rates.items():
+            active[url][0] -= rate * step
+            if active[url][0] <= 1e-6:
+                completions[url] = now
+                del active[url]
+    return completions
+
+def summarize(completions, horizon):
+    times = sorted(completions.values())
+    makespan = times[-1] if times else 0.0
+    return {
+        "makespan_s": round(makespan, 2),
+        "mean_completion_s": round(statistics.fmean(times), 2) if times else 0.0,
+        "median_completion_s": round(statistics.median(times), 2) if times else 0.0,
+        "p90_completion_s": round(times[int(len(times) * 0.9) - 1], 2) if len(times) >= 10 else round(makespan, 2),
+        "completed_in_horizon": sum(1 for t in times if t <= horizon),
+        "files_per_minute": round(len(times) / makespan * 60, 2) if makespan else 0.0
+    }
+
+def assign_host_bandwidth(urls, speeds, seed):
+    hosts = sorted({urlparse(url).hostname for url in urls})
+    rng = random.Random(seed)
+    return {host: (speeds[i % len(speeds)] if speeds else rng.uniform(1, 20)) * 1024 * 1024 for i, host in enumerate(hosts)}
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def parse_list(text, convert=int):
+    return [convert(value) for value in text.split(",") if value.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a LinkStorm queue under each scheduling policy and compare completion times.")
+    parser.add_argument("--queue-db", help="replay the persisted queue (queue.db)")
+    parser.add_argument("--queue", help="replay a recorded queue (JSON list of {url, size, priority})")
+    parser.add_argument("--record", help="save the queue being simulated as JSON for later replays")
+    parser.add_argument("--files", type=int, default=500, help="files in a generated queue (default 500)")
+    parser.add_argument("--hosts", type=int, default=4, help="hosts in a generated queue (default 4)")
+    parser.add_argument("--policies", default="", help="policies to compare (default: all)")
+    parser.add_argument("--concurrency", type=lambda t: parse_list(t), default=[1, 5], help="downloads at once (default 1,5)")
+    parser.add_argument("--host-bandwidth", type=lambda t: parse_list(t, float), default=[], help="MB/s per host, assigned in turn (default: random 1-20)")
+    parser.add_argument("--bandwidth", type=float, default=50, help="client link in MB/s shared by all downloads (0 = unlimited)")
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds of setup per file (HEAD, connect, first byte)")
+    parser.add_argument("--default-size", type=float, default=20, help="MB assumed for items without a known size")
+    parser.add_argument("--horizon", type=float, default=60, help="seconds for the completed-in-horizon count")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="bench_schedule.json", help="JSON results file")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main as engine
+    if args.queue_db:
+        items = load_queue_db(args.queue_db)
+    elif args.queue:
+        items = load_queue_json(args.queue)
+    else:
+        items = generate_queue(args.files, args.hosts, args.seed)
+    if not items:
+        sys.exit("The queue is empty.")
+    if args.record:
+        with open(args.record, "w", encoding="utf-8") as f:
+            json.dump({"items": items}, f, ensure_ascii=False, indent=4)
+    urls = [item["url"] for item in items]
+    sizes = {item["url"]: item["size"] for item in items}
+    priorities = {item["url"]: item["priority"] for item in items}
+    host_bandwidth = assign_host_bandwidth(urls, args.host_bandwidth, args.seed)
+    policies = parse_list(args.policies, str) if args.policies else list(engine.QUEUE_POLICIES)
+    known = sum(1 for size in sizes.values() if size)
+    print(f"{len(urls)} files on {len(host_bandwidth)} host(s), {known} with a known size, "
+          f"{sum(size or 0 for size in sizes.values()) / 1024 ** 3:.2f} GB known in total\n")
+
+    results = []
+    print(f"{'policy':<16}{'conc':>6}{'makespan s':>12}{'mean s':>10}{'median s':>10}{'p90 s':>10}{'done@' + str(int(args.horizon)) + 's':>10}{'files/min':>11}")
+    for concurrency in args.concurrency:
+        for policy in policies:
+            # ترتیب واقعی برنامه؛ اندازه‌های نامعلوم همان‌طور که در برنامه رفتار می‌شوند، در انتها قرار می‌گیرند
+            order = engine.order_queue(urls, policy, size_of=lambda url: sizes.get(url) or None, priority_of=lambda url: priorities.get(url, 0))
+            completions = simulate(order, sizes, host_bandwidth, args.bandwidth * 1024 * 1024, concurrency, args.latency, args.default_size * 1024 * 1024)
+            result = {"policy": policy, "concurrency": concurrency, **summarize(completions, args.horizon)}
+            results.append(result)
+            print(f"{policy:<16}{concurrency:>6}{result['makespan_s']:>12}{result['mean_completion_s']:>10}{result['median_completion_s']:>10}"
+                  f"{result['p90_completion_s']:>10}{result['completed_in_horizon']:>10}{result['files_per_minute']:>11}")
+        print()
+    report = {
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "queue": args.queue_db or args.queue or f"generated ({args.files} files, {args.hosts} hosts, seed {args.seed})",
+        "model": {"link_mbps": args.bandwidth, "latency_s": args.latency, "host_mbps": {host: round(bw / 1024 / 1024, 2) for host, bw in host_bandwidth.items()}},
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
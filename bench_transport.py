@@ -0,0 +1,250 @@
+import sys, os, json, asyncio, argparse, random, time, queue, tempfile, shutil, socket, platform, subprocess, statistics, logging
+import multiprocessing as mp
+
+# ============================
+# Local TLS Server (HTTP/1.1 and HTTP/2 over ALPN)
+# ============================
+PATTERN_SIZE = 1024 * 1024
+
+def make_certificate(folder):
+    # گواهی خودامضا برای 127.0.0.1؛ کلاینت از طریق SSL_CERT_FILE به آن اعتماد می‌کند
+    cert, key = os.path.join(folder, "cert.pem"), os.path.join(folder, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=localhost",
+                    "-addext", "subjectAltName=IP:127.0.0.1,DNS:localhost", "-keyout", key, "-out", cert],
+                   check=True, capture_output=True)
+    return cert, key
+
+class FileServer:
+    # ASGI؛ hypercorn بر اساس ALPN هر اتصال را HTTP/1.1 یا HTTP/2 سرو می‌کند
+    def __init__(self, latency, seed):
+        self.latency = latency
+        pattern = random.Random(seed).randbytes(PATTERN_SIZE)
+        self.pattern = pattern + pattern
+        self.stats = {"requests": 0, "connections": 0, "versions": {}}
+        self.clients = set()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while (await receive())["type"] != "lifespan.shutdown":
+                await send({"type": "lifespan.startup.complete"})
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+        if scope["path"] == "/_stats":
+            await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+            await send({"type": "http.response.body", "body": json.dumps(self.stats).encode()})
+            return
+        parts = scope["path"].strip("/").split("/")
+        if len(parts) != 3 or parts[0] != "files" or not parts[2].endswith(".zip"):
+            await send({"type": "http.response.start", "status": 404, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        size = int(parts[1])
+        headers = [(b"accept-ranges", b"bytes"), (b"etag", f'"{size}-{parts[2]}"'.encode())]
+        if scope["method"] == "HEAD":
+            await send({"type": "http.response.start", "status": 200, "headers": headers + [(b"content-length", str(size).encode())]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        self.stats["requests"] += 1
+        version = scope.get("http_version", "1.1")
+        self.stats["versions"][version] = self.stats["versions"].get(version, 0) + 1
+        if tuple(scope["client"]) not in self.clients:
+            self.clients.add(tuple(scope["client"]))
+            self.stats["connections"] = len(self.clients)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        start, end, status = 0, size - 1, 200
+        range_header = dict(scope["headers"]).get(b"range", b"").decode()
+        if range_header.startswith("bytes="):
+            first, _, last = range_header[6:].partition("-")
+            start = int(first) if first else 0
+            end = min(int(last), size - 1) if last else size - 1
+            status = 206
+            headers.append((b"content-range", f"bytes {start}-{end}/{size}".encode()))
+        headers.append((b"content-length", str(end - start + 1).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        offset = start
+        while offset <= end:
+            piece = min(PATTERN_SIZE, end - offset + 1)
+            begin = offset % PATTERN_SIZE
+            await send({"type": "http.response.body", "body": self.pattern[begin:begin + piece], "more_body": offset + piece <= end})
+            offset += piece
+
+def run_server(options, ready):
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+    config = Config()
+    config.bind = [f"127.0.0.1:{options['port']}"]
+    config.certfile, config.keyfile = options["cert"], options["key"]
+    config.accesslog = config.errorlog = None
+    config.h2_max_concurrent_streams = options["streams"]
+
+    async def main():
+        ready.put(True)
+        await serve(FileServer(options["latency"], options["seed"]), config)
+
+    asyncio.run(main())
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+# ============================
+# Client Runs (one process per run)
+# ============================
+def run_scenario(scenario, base_url, cert, results):
+    # متغیرها پیش از ساخت هر SSLContext تنظیم می‌شوند
+    os.environ["SSL_CERT_FILE"] = os.environ["REQUESTS_CA_BUNDLE"] = cert
+    logging.disable(logging.WARNING)
+    import main as engine
+    folder = tempfile.mkdtemp(prefix="linkstorm-transport-")
+    config = dict(engine.DEFAULT_CONFIG)
+    config.update({
+        "transport": scenario["transport"],
+        "concurrent_downloads": scenario["concurrency"],
+        "multi_connection_min_size": 1 << 62,
+        "auto_tune_hosts": False,
+        "resume_downloads": False,
+        "dedup_by_content": False
+    })
+    urls = [f"{base_url}/files/{scenario['file_size']}/file{i:05d}.zip" for i in range(scenario["files"])]
+    if scenario["skip_head"]:
+        # مانند فهرستی که اندازه فایل‌ها را از قبل داده است؛ فقط مسیر GET اندازه‌گیری می‌شود
+        for url in urls:
+            engine.metadata_cache[url] = {"size": scenario["file_size"], "etag": None, "last_modified": None, "accept_ranges": True, "link": ""}
+    worker = engine.DownloadWorker(urls, folder, config)
+    errors = []
+    worker.file_error.connect(lambda name, error: errors.append(f"{name}: {error}"))
+    started = time.perf_counter()
+    try:
+        asyncio.run(worker.process_downloads())
+        seconds = time.perf_counter() - started
+        done = [name for name in os.listdir(folder) if not name.endswith(engine.PART_SUFFIX)]
+        total = sum(os.path.getsize(os.path.join(folder, name)) for name in done)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    results.put({
+        "files": len(done),
+        "seconds": round(seconds, 4),
+        "files_per_s": round(len(done) / seconds, 2) if seconds else None,
+        "throughput_mbps": round(total / seconds / (1024 * 1024), 2) if seconds else None,
+        "protocols": {f"{host}:{port}": protocol for (host, port), protocol in engine.host_protocols.items()},
+        "failed": errors[:5]
+    })
+
+def fetch_stats(base_url, cert):
+    import ssl, urllib.request
+    with urllib.request.urlopen(f"{base_url}/_stats", timeout=10, context=ssl.create_default_context(cafile=cert)) as resp:
+        return json.loads(resp.read())
+
+def run_isolated(scenario, base_url, cert, context, timeout):
+    before = fetch_stats(base_url, cert)
+    results = context.Queue()
+    process = context.Process(target=run_scenario, args=(scenario, base_url, cert, results))
+    process.start()
+    try:
+        result = results.get(timeout=timeout)
+    except queue.Empty:
+        process.terminate()
+        result = {"error": f"no result after {timeout}s (exit code {process.exitcode})"}
+    process.join()
+    after = fetch_stats(base_url, cert)
+    # سهم همین اجرا از آمار سرور
+    result["server_connections"] = after["connections"] - before["connections"]
+    result["server_versions"] = {version: count - before["versions"].get(version, 0) for version, count in after["versions"].items() if count - before["versions"].get(version, 0)}
+    return result
+
+# ============================
+# Reporting
+# ============================
+def parse_list(text, convert=int):
+    return [convert(value) for value in text.split(",") if value.strip()]
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def summarize(runs):
+    ok = [run for run in runs if "error" not in run and not run["failed"]]
+    summary = {"runs": runs}
+    for key in ("files_per_s", "throughput_mbps", "seconds", "server_connections"):
+        values = [run[key] for run in ok if run.get(key) is not None]
+        if values:
+            summary[key] = round(statistics.median(values), 3)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare LinkStorm files/s over HTTP/1.1 (aiohttp) and HTTP/2 (httpx) on many small files.")
+    parser.add_argument("--files", type=int, default=300, help="files per run (default 300)")
+    parser.add_argument("--size", type=float, default=64, help="file size in KB (default 64)")
+    parser.add_argument("--concurrency", type=lambda t: parse_list(t), default=[8, 32], help="files downloaded at once (default 8,32)")
+    parser.add_argument("--transports", type=lambda t: parse_list(t, str), default=["http1", "auto"], help="transport modes to compare (default http1,auto)")
+    parser.add_argument("--latency", type=float, default=20, help="server delay before each response, in ms (default 20)")
+    parser.add_argument("--streams", type=int, default=100, help="HTTP/2 concurrent streams the server allows (default 100)")
+    parser.add_argument("--skip-head", action="store_true", help="pre-fill the metadata cache so only GETs are measured")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario; medians are reported")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds before a run is abandoned")
+    parser.add_argument("--output", default="bench_transport.json", help="JSON results file")
+    args = parser.parse_args()
+
+    try:
+        import hypercorn, httpx, h2
+    except ImportError as e:
+        sys.exit(f"This benchmark needs hypercorn, httpx and h2 ({e}).")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    context = mp.get_context("spawn")
+    folder = tempfile.mkdtemp(prefix="linkstorm-tls-")
+    try:
+        cert, key = make_certificate(folder)
+    except (OSError, subprocess.CalledProcessError) as e:
+        shutil.rmtree(folder, ignore_errors=True)
+        sys.exit(f"Cannot create a test certificate with openssl: {e}")
+    port = free_port()
+    ready = context.Queue()
+    server = context.Process(target=run_server, args=({"port": port, "cert": cert, "key": key, "latency": args.latency / 1000, "streams": args.streams, "seed": args.seed}, ready), daemon=True)
+    server.start()
+    ready.get(timeout=30)
+    base_url = f"https://127.0.0.1:{port}"
+    for _ in range(50):
+        try:
+            fetch_stats(base_url, cert)
+            break
+        except OSError:
+            time.sleep(0.1)
+
+    results = []
+    print(f"{args.files} files of {args.size:g} KB, {args.latency:g} ms server latency{', HEAD skipped' if args.skip_head else ''}\n")
+    print(f"{'transport':<10}{'conc':>6}{'files/s':>10}{'MB/s':>9}{'seconds':>10}{'conns':>7}  protocol")
+    try:
+        for concurrency in args.concurrency:
+            for transport in args.transports:
+                scenario = {"transport": transport, "concurrency": concurrency, "files": args.files,
+                            "file_size": int(args.size * 1024), "skip_head": args.skip_head}
+                runs = [run_isolated(scenario, base_url, cert, context, args.timeout) for _ in range(args.repeat)]
+                summary = {"name": f"{transport} files={concurrency}", **scenario, **summarize(runs)}
+                results.append(summary)
+                versions = ", ".join(f"HTTP/{version}: {count}" for version, count in runs[-1].get("server_versions", {}).items())
+                print(f"{transport:<10}{concurrency:>6}{summary.get('files_per_s', '-'):>10}{summary.get('throughput_mbps', '-'):>9}"
+                      f"{summary.get('seconds', '-'):>10}{summary.get('server_connections', '-'):>7}  {versions or runs[-1].get('error', '')}", flush=True)
+                for run in runs:
+                    for failure in run.get("failed", []):
+                        print(f"    failed: {failure}")
+    finally:
+        server.terminate()
+        shutil.rmtree(folder, ignore_errors=True)
+    report = {
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    print(f"\nResults saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
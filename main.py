@@ -1,5 +1,14 @@
-import sys, os, json, asyncio, aiohttp, requests, re, logging, time, ssl
-from urllib.parse import unquote
+import sys, os, json, asyncio, aiohttp, requests, re, logging, time, ssl, hashlib, mmap, errno, shutil, posixpath, sqlite3, cProfile, functools, bisect, random, threading, zlib, socket, calendar, html, queue
+import multiprocessing as mp
+import xml.etree.ElementTree as ET
+from aiohttp import web
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from contextlib import contextmanager, asynccontextmanager, nullcontext
+from email.utils import parsedate_to_datetime
+from urllib.parse import unquote, urlparse, urlsplit, urlunsplit, quote, parse_qsl, urlencode
 from PySide6 import QtCore, QtWidgets, QtGui, QtWebEngineWidgets
 from PySide6.QtGui import QDesktopServices
 from PySide6.QtCore import QUrl
@@ -61,12 +70,52 @@ DEFAULT_CONFIG = {
     "allowed_extensions": [".mp3", ".mp4", ".pdf", ".zip", ".rar", ".exe", ".msi"],
     "min_bitrate": "none",
     "max_retries": 7,
+    "queue_policy": "alphabetical",
     "initial_backoff": 1,
+    "pause_release_after": 10,
+    "transport": "http1",
+    "engine_processes": 1,
+    "engine_shard_by": "host",
+    "use_uvloop": True,
+    "tcp_nodelay": True,
+    "socket_recv_buffer": 0,
+    "io_threads": 4,
+    "cpu_processes": 1,
+    "executor_queue_depth": 32,
+    "memory_budget_mb": 256,
+    "page_cache_mb": 64,
+    "log_max_lines": 5000,
+    "listing_metadata": True,
+    "max_backoff": 60,
+    "circuit_breaker_threshold": 5,
+    "circuit_breaker_cooldown": 30,
     "download_folder": "",
     "language": "fa",
     "theme": "light",
     "multi_connection_parts": 8,
-    "adaptive_threshold": 0.05
+    "multi_connection_min_size": 10 * 1024 * 1024,
+    "auto_tune_hosts": True,
+    "auto_tune_max_connections": 16,
+    "read_events_per_second": 64,
+    "max_read_size": 4 * 1024 * 1024,
+    "control_api_enabled": False,
+    "control_api_host": "127.0.0.1",
+    "control_api_port": 8765,
+    "control_api_token": "",
+    "block_size": 4 * 1024 * 1024,
+    "verify_block_manifest": True,
+    "global_rate_limit": 0,
+    "host_rate_limits": {},
+    "use_mmap_writes": False,
+    "dedup_by_content": True,
+    "dedup_by_hash": False,
+    "dedup_link_mode": "hardlink",
+    "queue_flush_interval": 2000,
+    "auto_resume_queue": True,
+    "instrumentation_enabled": False,
+    "profiler": "off",
+    "slow_callback_ms": 100,
+    "metrics_enabled": False
 }
 
 def load_config():
@@ -131,7 +180,42 @@ translations = {
         "resume": "ادامه",
         "about_details": "جزئیات برنامه",
         "update_available": "نسخه جدید موجود است",
-        "update_btn": "دانلود و بروزرسانی"
+        "update_btn": "دانلود و بروزرسانی",
+        "control_api_enabled": "فعال‌سازی API کنترل محلی",
+        "control_api_port": "پورت API کنترل:",
+        "set_checksum": "تعیین چک‌سام",
+        "global_rate_limit": "محدودیت کلی سرعت (KB/s، صفر = نامحدود):",
+        "host_rate_limits": "محدودیت سرعت هر میزبان (host=KB/s با , جدا شوند):",
+        "set_rate_limit": "محدودیت سرعت این مورد",
+        "set_mirrors": "آدرس‌های جایگزین (آینه‌ها)",
+        "set_priority": "تعیین اولویت",
+        "auto_tune_hosts": "تنظیم خودکار تعداد اتصال برای هر میزبان",
+        "listing_metadata": "استفاده از اندازه فایل‌های فهرست دایرکتوری به جای HEAD",
+        "queue_policy": "ترتیب صف:",
+        "policy_alphabetical": "الفبایی",
+        "policy_fifo": "ترتیب افزودن",
+        "policy_shortest_first": "کوچک‌ترین فایل اول",
+        "policy_largest_first": "بزرگ‌ترین فایل اول",
+        "policy_round_robin": "نوبتی بین میزبان‌ها",
+        "policy_priority": "اولویت دستی",
+        "transport": "پروتکل انتقال",
+        "transport_auto": "خودکار (HTTP/2 در صورت پشتیبانی میزبان)",
+        "transport_http1": "فقط HTTP/1.1",
+        "transport_http2": "HTTP/2 برای همه میزبان‌های HTTPS",
+        "engine_processes": "تعداد پردازه‌های موتور (پس از اجرای مجدد)",
+        "use_uvloop": "استفاده از uvloop در صورت نصب (پس از اجرای مجدد)",
+        "engine_shard_by": "تقسیم صف بین پردازه‌ها",
+        "io_threads": "نخ‌های نوشتن روی دیسک (پس از اجرای مجدد)",
+        "cpu_processes": "پردازه‌های تجزیه صفحات بزرگ (۰ = بدون پردازه، پس از اجرای مجدد)",
+        "memory_budget_mb": "سقف داده بافرشده در حافظه (MB، ۰ = نامحدود)",
+        "page_cache_mb": "سقف کش صفحات (MB، ۰ = نامحدود)",
+        "log_max_lines": "حداکثر خطوط گزارش در پنجره",
+        "shard_host": "بر اساس میزبان",
+        "shard_item": "بر اساس فایل (کم‌بارترین پردازه)",
+        "instrumentation_enabled": "فعال‌سازی اندازه‌گیری عملکرد",
+        "profiler": "پروفایلر:",
+        "export_instrumentation": "خروجی اندازه‌گیری‌ها",
+        "metrics_enabled": "فعال‌سازی خروجی Prometheus در ‎/metrics"
     },
     "en": {
         "app_title": "Link_Storm",
@@ -171,19 +255,359 @@ translations = {
         "resume": "Resume",
         "about_details": "App Details",
         "update_available": "New version available",
-        "update_btn": "Download & Update"
+        "update_btn": "Download & Update",
+        "control_api_enabled": "Enable Local Control API",
+        "control_api_port": "Control API Port:",
+        "set_checksum": "Set Checksum",
+        "global_rate_limit": "Global Bandwidth Limit (KB/s, 0 = unlimited):",
+        "host_rate_limits": "Per-host Limits (host=KB/s, separated by ,):",
+        "set_rate_limit": "Set Speed Limit",
+        "set_mirrors": "Set Mirrors",
+        "set_priority": "Set Priority",
+        "auto_tune_hosts": "Auto-tune Connections per Host",
+        "listing_metadata": "Use Directory Listing Sizes Instead of HEAD",
+        "queue_policy": "Queue Order:",
+        "policy_alphabetical": "Alphabetical",
+        "policy_fifo": "Order Added",
+        "policy_shortest_first": "Shortest First",
+        "policy_largest_first": "Largest First",
+        "policy_round_robin": "Round-robin Across Hosts",
+        "policy_priority": "Manual Priority",
+        "transport": "Transport",
+        "transport_auto": "Automatic (HTTP/2 where the host supports it)",
+        "transport_http1": "HTTP/1.1 Only",
+        "transport_http2": "HTTP/2 for All HTTPS Hosts",
+        "engine_processes": "Engine Processes (after restart)",
+        "use_uvloop": "Use uvloop When Installed (after restart)",
+        "engine_shard_by": "Split Queue Across Processes",
+        "io_threads": "Disk I/O Threads (after restart)",
+        "cpu_processes": "Large-Page Parser Processes (0 = none, after restart)",
+        "memory_budget_mb": "Memory Budget for Buffered Data (MB, 0 = unlimited)",
+        "page_cache_mb": "Page Cache Limit (MB, 0 = unlimited)",
+        "log_max_lines": "Maximum Log Lines in Window",
+        "shard_host": "By Host",
+        "shard_item": "By File (least-loaded process)",
+        "instrumentation_enabled": "Enable Instrumentation",
+        "profiler": "Profiler:",
+        "export_instrumentation": "Export Instrumentation",
+        "metrics_enabled": "Enable Prometheus Metrics at /metrics"
     }
 }
 
 def tr(key, lang):
     return translations.get(lang, translations["en"]).get(key, key)
 
+# ============================
+# Instrumentation (Stage Timers, Counters, Event-loop Lag, Profiling)
+# ============================
+try:
+    import yappi
+except ImportError:
+    yappi = None
+
+PROFILE_FOLDER = "profiles"
+LOOP_LAG_INTERVAL = 0.1
+NULL_TIMER = nullcontext()
+
+class StageTimer:
+    __slots__ = ("instrumentation", "name", "started")
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.instrumentation.add_time(self.name, time.perf_counter() - self.started)
+        return False
+
+class Instrumentation:
+    # در حالت غیرفعال هر نقطه اندازه‌گیری فقط یک بررسی bool است و یک شیء ثابت برمی‌گرداند
+    # هر مرحله عمدتاً فقط از یک نخ (رابط کاربری یا worker) به‌روزرسانی می‌شود؛ قفلی لازم نیست
+    def __init__(self):
+        self.enabled = False
+        self.profiler_mode = "off"
+        self.slow_callback_ms = 100
+        self.profiler = None
+        self.last_profile = None
+        self.reset()
+
+    def configure(self, config):
+        self.enabled = bool(config.get("instrumentation_enabled", DEFAULT_CONFIG["instrumentation_enabled"]))
+        self.profiler_mode = config.get("profiler", DEFAULT_CONFIG["profiler"])
+        self.slow_callback_ms = config.get("slow_callback_ms", DEFAULT_CONFIG["slow_callback_ms"])
+
+    def reset(self):
+        self.timers = {}
+        self.counters = {}
+        self.lag = [0, 0.0, 0.0]
+        self.slow_callbacks = deque(maxlen=20)
+        self.since = time.time()
+
+    def timer(self, name):
+        return StageTimer(self, name) if self.enabled else NULL_TIMER
+
+    def add_time(self, name, seconds):
+        entry = self.timers.get(name)
+        if entry is None:
+            entry = self.timers[name] = [0, 0.0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+        if seconds > entry[2]:
+            entry[2] = seconds
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    async def monitor_loop(self):
+        # تأخیر حلقه رویداد: فاصله بیدار شدن واقعی از زمان مورد انتظار
+        loop = asyncio.get_running_loop()
+        if self.enabled:
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.slow_callback_ms / 1000
+        while True:
+            started = loop.time()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            lag = max(0.0, loop.time() - started - LOOP_LAG_INTERVAL)
+            metrics.observe_loop_lag(lag)
+            if self.enabled:
+                self.lag[0] += 1
+                self.lag[1] += lag
+                self.lag[2] = max(self.lag[2], lag)
+
+    def record_slow_callback(self, message):
+        self.slow_callbacks.append(message if len(message) <= 240 else message[:200] + " ... " + message[-35:])
+        self.count("loop.slow_callbacks")
+
+    def start_profile(self):
+        if not self.enabled or self.profiler_mode == "off" or self.profiler:
+            return
+        if self.profiler_mode == "yappi" and yappi:
+            # yappi همه نخ‌ها (از جمله رابط کاربری) را پروفایل می‌کند
+            yappi.set_clock_type("wall")
+            yappi.start()
+            self.profiler = "yappi"
+        else:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop_profile(self):
+        if not self.profiler:
+            return None
+        os.makedirs(PROFILE_FOLDER, exist_ok=True)
+        path = os.path.join(PROFILE_FOLDER, f"session-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+        if self.profiler == "yappi":
+            yappi.stop()
+            yappi.get_func_stats().save(path, type="pstat")
+            yappi.clear_stats()
+        else:
+            self.profiler.disable()
+            self.profiler.dump_stats(path)
+        self.profiler = None
+        self.last_profile = path
+        logging.info(f"Profile saved to {path}")
+        return path
+
+    def snapshot(self):
+        samples, total_lag, max_lag = self.lag
+        return {
+            "enabled": self.enabled,
+            "since": self.since,
+            "timers": {
+                name: {"count": count, "total_ms": round(total * 1000, 3), "avg_ms": round(total / count * 1000, 3), "max_ms": round(peak * 1000, 3)}
+                for name, (count, total, peak) in sorted(self.timers.items())
+            },
+            "counters": dict(sorted(self.counters.items())),
+            "loop_lag_ms": {"samples": samples, "avg": round(total_lag / samples * 1000, 3) if samples else 0, "max": round(max_lag * 1000, 3)},
+            "slow_callbacks": list(self.slow_callbacks),
+            "profile": self.last_profile
+        }
+
+    def summary(self):
+        data = self.snapshot()
+        lines = [f"{'stage':<22}{'count':>10}{'total ms':>12}{'avg ms':>10}{'max ms':>10}"]
+        for name, timer in data["timers"].items():
+            lines.append(f"{name:<22}{timer['count']:>10}{timer['total_ms']:>12.1f}{timer['avg_ms']:>10.3f}{timer['max_ms']:>10.1f}")
+        lines += [f"{name}: {value}" for name, value in data["counters"].items()]
+        lag = data["loop_lag_ms"]
+        lines.append(f"event loop lag: avg {lag['avg']} ms, max {lag['max']} ms ({lag['samples']} samples)")
+        lines += [f"slow callback: {message}" for message in data["slow_callbacks"]]
+        if data["profile"]:
+            lines.append(f"last profile: {data['profile']}")
+        return "\n".join(lines)
+
+    def export(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=4)
+
+class SlowCallbackHandler(logging.Handler):
+    # asyncio در حالت debug فراخوانی‌های کند را با پیام "Executing ... took ..." گزارش می‌کند
+    def emit(self, record):
+        if instrumentation.enabled and record.getMessage().startswith("Executing"):
+            instrumentation.record_slow_callback(record.getMessage())
+
+def instrumented(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not instrumentation.enabled:
+                return func(*args, **kwargs)
+            with StageTimer(instrumentation, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+instrumentation = Instrumentation()
+logging.getLogger("asyncio").addHandler(SlowCallbackHandler())
+
+# ============================
+# Metrics (Prometheus Text Exposition)
+# ============================
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SEGMENT_THROUGHPUT_BUCKETS = tuple(2 ** power * 1024 for power in range(6, 17, 2))  # 64KB/s .. 64MB/s
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def render(self, name, lines):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), list(self.counts)):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(float(bound))
+            lines.append(f'{name}_bucket{{le="{le}"}} {cumulative}')
+        lines.append(f"{name}_sum {self.total}")
+        lines.append(f"{name}_count {cumulative}")
+
+class EngineMetrics:
+    # هر شمارنده فقط یک نخ نویسنده دارد (worker یا رابط کاربری) و بدون قفل به‌روزرسانی می‌شود؛
+    # خواندن هنگام scrape با کپی dict انجام می‌شود که زیر GIL اتمیک است
+    def __init__(self):
+        self.enabled = False
+        self.bytes_by_host = {}
+        self.retries_by_host = {}
+        self.active_connections = 0
+        self.cache_lookups = {"page": [0, 0], "metadata": [0, 0]}
+        self.browser_sessions = 0
+        self.browser_launches = 0
+        self.segment_throughput = Histogram(SEGMENT_THROUGHPUT_BUCKETS)
+        self.loop_lag = Histogram(LOOP_LAG_BUCKETS)
+        self.shard_counters = None
+
+    def configure(self, config):
+        self.enabled = bool(config.get("metrics_enabled", DEFAULT_CONFIG["metrics_enabled"]))
+
+    def add_bytes(self, host, amount):
+        if self.enabled:
+            self.bytes_by_host[host] = self.bytes_by_host.get(host, 0) + amount
+
+    def count_retry(self, host):
+        if self.enabled:
+            self.retries_by_host[host] = self.retries_by_host.get(host, 0) + 1
+
+    def cache_lookup(self, cache, hit):
+        if self.enabled:
+            self.cache_lookups[cache][0 if hit else 1] += 1
+
+    def observe_segment(self, received, seconds):
+        if self.enabled and seconds > 0:
+            self.segment_throughput.observe(received / seconds)
+
+    def observe_loop_lag(self, lag):
+        if self.enabled:
+            self.loop_lag.observe(lag)
+
+    @contextmanager
+    def connection(self):
+        self.active_connections += 1
+        try:
+            yield
+        finally:
+            self.active_connections -= 1
+
+    @contextmanager
+    def browser_session(self):
+        self.browser_sessions += 1
+        self.browser_launches += 1
+        try:
+            yield
+        finally:
+            self.browser_sessions -= 1
+
+    def render(self, queue_depth=None):
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{escape_label(str(val))}"' for key, val in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        metric("linkstorm_downloaded_bytes_total", "counter", "Bytes received per host.",
+               [({"host": host}, value) for host, value in sorted(dict(self.bytes_by_host).items())])
+        metric("linkstorm_retries_total", "counter", "Retried requests and re-queued segments per host.",
+               [({"host": host}, value) for host, value in sorted(dict(self.retries_by_host).items())])
+        metric("linkstorm_active_connections", "gauge", "Open download streams.", [({}, self.active_connections)])
+        if queue_depth is not None:
+            metric("linkstorm_queue_depth", "gauge", "Items queued or in progress.", [({}, queue_depth)])
+        lookups = {cache: tuple(counts) for cache, counts in self.cache_lookups.items()}
+        metric("linkstorm_cache_lookups_total", "counter", "Page and metadata cache lookups by result.",
+               [({"cache": cache, "result": result}, counts[i]) for cache, counts in lookups.items() for i, result in enumerate(("hit", "miss"))])
+        metric("linkstorm_cache_hit_ratio", "gauge", "Share of cache lookups served from the cache.",
+               [({"cache": cache}, round(hits / (hits + misses), 4) if hits + misses else 0) for cache, (hits, misses) in lookups.items()])
+        metric("linkstorm_host_connection_limit", "gauge", "Learned connection limit per host.",
+               [({"host": host}, state.limit) for host, state in sorted(list(host_tuner.hosts.items()))])
+        metric("linkstorm_host_protocol", "gauge", "HTTP protocol chosen for each host after ALPN negotiation.",
+               [({"host": f"{host}:{port}", "protocol": protocol}, 1) for (host, port), protocol in sorted(list(host_protocols.items()))])
+        if self.shard_counters is not None:
+            metric("linkstorm_shard_bytes_total", "counter", "Bytes received by each engine process.",
+                   [({"shard": str(index)}, value) for index, value in enumerate(self.shard_counters)])
+        metric("linkstorm_memory_buffered_bytes", "gauge", "Received bytes not yet written to disk.", [({}, memory_budget.used)])
+        metric("linkstorm_memory_budget_bytes", "gauge", "Configured limit for buffered bytes (0 = unlimited).", [({}, memory_budget.limit)])
+        metric("linkstorm_memory_waits_total", "counter", "Reads paused because the memory budget was full.", [({}, memory_budget.waits)])
+        metric("linkstorm_executor_pending", "gauge", "Jobs submitted to each executor pool and not yet finished.",
+               [({"pool": kind}, count) for kind, count in executors.pending.items()])
+        metric("linkstorm_browser_sessions", "gauge", "Headless browser sessions currently rendering pages.", [({}, self.browser_sessions)])
+        metric("linkstorm_browser_launches_total", "counter", "Headless browser sessions started.", [({}, self.browser_launches)])
+        lines.append("# HELP linkstorm_segment_throughput_bytes_per_second Throughput of completed segments.")
+        lines.append("# TYPE linkstorm_segment_throughput_bytes_per_second histogram")
+        self.segment_throughput.render("linkstorm_segment_throughput_bytes_per_second", lines)
+        lines.append("# HELP linkstorm_event_loop_lag_seconds Download event-loop wake-up delay.")
+        lines.append("# TYPE linkstorm_event_loop_lag_seconds histogram")
+        self.loop_lag.render("linkstorm_event_loop_lag_seconds", lines)
+        return "\n".join(lines) + "\n"
+
+def escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+metrics = EngineMetrics()
+
 # ============================
 # Link Extraction Functions
 # ============================
+@instrumented("parse.links")
 def advanced_filter_links(page_content, base_url, allowed_extensions, min_bitrate=None):
     pattern = r'href=[\'"]?([^\'" >]+)'
     raw_links = re.findall(pattern, page_content, re.IGNORECASE)
+    return filter_download_links(raw_links, base_url, allowed_extensions, min_bitrate)
+
+def filter_download_links(raw_links, base_url, allowed_extensions, min_bitrate=None):
     valid_links = []
     for link in raw_links:
         full_link = requests.compat.urljoin(base_url, link)
@@ -200,20 +624,339 @@ def extract_dynamic_links(url):
     options.add_argument("--headless")
     options.add_argument("--disable-gpu")
     options.add_argument("--no-sandbox")
-    driver = webdriver.Chrome(options=options)
-    driver.get(url)
-    time.sleep(3)
-    page_source = driver.page_source
-    driver.quit()
+    with metrics.browser_session():
+        driver = webdriver.Chrome(options=options)
+        driver.get(url)
+        time.sleep(3)
+        page_source = driver.page_source
+        driver.quit()
     return page_source
 
-def extract_all_download_links(url, allowed_extensions, min_bitrate=None):
+def fetch_page_content(url):
     try:
-        page_content = requests.get(url, timeout=10, verify=True).text
+        with instrumentation.timer("fetch.page"):
+            return requests.get(url, timeout=10, verify=True).text
     except Exception as e:
         logging.warning(f"Request error: {e}. Using Selenium.")
-        page_content = extract_dynamic_links(url)
-    return advanced_filter_links(page_content, url, allowed_extensions, min_bitrate)
+        return extract_dynamic_links(url)
+
+def parse_page(page_content, base_url, allowed_extensions, min_bitrate=None, listing=True):
+    # لینک‌ها به همراه اندازه و تاریخ فهرست autoindex؛ قابل اجرا در پردازه جداگانه
+    links = advanced_filter_links(page_content, base_url, allowed_extensions, min_bitrate)
+    entries = parse_listing(page_content, base_url, set(links) if links else None) if listing else {}
+    if not links and entries:
+        # فهرست JSON لینک href ندارد
+        links = filter_download_links(list(entries), base_url, allowed_extensions, min_bitrate)
+    return links, entries
+
+def extract_all_download_links(url, allowed_extensions, min_bitrate=None, checksums=None, listing=True):
+    page_content = fetch_page_content(url)
+    links, entries = parse_page(page_content, url, allowed_extensions, min_bitrate, listing)
+    if checksums is not None and links:
+        checksums.update(extract_checksum_sidecars(page_content, url, links))
+    remember_listing(entries, links)
+    return links
+
+# ============================
+# Autoindex Listings (Sizes and Dates Without HEAD)
+# ============================
+LISTING_ROW = re.compile(r"<tr\b.*?</tr>", re.IGNORECASE | re.DOTALL)
+LISTING_PRE = re.compile(r"<pre\b[^>]*>(.*?)</pre>", re.IGNORECASE | re.DOTALL)
+LISTING_HREF = re.compile(r'<a\s[^>]*?href=[\'"]?([^\'" >]+)[^>]*>.*?</a>', re.IGNORECASE | re.DOTALL)
+LISTING_DATE = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(?::\d{2})?|\d{2}-[A-Za-z]{3}-\d{4} \d{2}:\d{2}(?::\d{2})?|\d{4}-[A-Za-z]{3}-\d{2} \d{2}:\d{2}(?::\d{2})?")
+LISTING_SIZE = re.compile(r"(?<!\S)(\d+(?:\.\d+)?)(?:\s?([KMGTP])(?:i?B)?|\s?(?:B|bytes))?(?!\S)", re.IGNORECASE)
+LISTING_EXACT_SIZE = re.compile(r'data-size=[\'"]?(\d+)', re.IGNORECASE)
+LISTING_PLAIN_HREF = re.compile(r"[\w\-~%+,=@][\w\-.~%+,=@]*\Z")
+LISTING_TIME = re.compile(r'datetime=[\'"]([^\'"]+)', re.IGNORECASE)
+LISTING_DATE_FORMATS = ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%d-%b-%Y %H:%M", "%d-%b-%Y %H:%M:%S", "%Y-%b-%d %H:%M:%S", "%Y-%b-%d %H:%M")
+SIZE_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4, "P": 1024 ** 5}
+
+@functools.lru_cache(maxsize=4096)
+def parse_listing_date(text):
+    # زمان‌ها UTC فرض می‌شوند (پیش‌فرض nginx)؛ Apache زمان محلی سرور را نشان می‌دهد
+    for fmt in LISTING_DATE_FORMATS:
+        try:
+            return calendar.timegm(time.strptime(text, fmt))
+        except ValueError:
+            continue
+    try:
+        return parsedate_to_datetime(text).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+def parse_listing_entry(url, href, text, exact_size=None):
+    entry = {"url": url, "name": unquote(os.path.basename(href.split("?")[0])), "size": None, "exact": False, "mtime": None}
+    date = LISTING_DATE.search(text)
+    if date:
+        entry["mtime"] = parse_listing_date(date.group(0))
+        text = text[:date.start()] + " " + text[date.end():]
+    if exact_size is not None:
+        entry["size"], entry["exact"] = exact_size, True
+        return entry
+    size = LISTING_SIZE.search(text)
+    if size:
+        number, unit = size.group(1), size.group(2)
+        # فقط عدد صحیح بدون واحد، در سطری که تاریخ هم دارد، اندازه دقیق است؛
+        # «1.2M» گرد شده و برای پیش‌تخصیص یا ادامه دانلود قابل اعتماد نیست
+        entry["exact"] = bool(date) and not unit and number.isdigit()
+        entry["size"] = int(float(number) * SIZE_UNITS.get((unit or "").upper(), 1))
+    return entry
+
+def parse_listing(page_content, base_url, wanted=None):
+    # صفحات autoindex: جدول HTML (Apache، lighttpd، Caddy)، فهرست <pre> (nginx، Apache قدیمی) و JSON (nginx autoindex_format json)
+    entries = {}
+    stripped = page_content.lstrip()
+    if stripped.startswith("["):
+        try:
+            items = json.loads(stripped)
+        except ValueError:
+            items = []
+        for item in items if isinstance(items, list) else []:
+            if isinstance(item, dict) and item.get("type", "file") == "file" and item.get("name"):
+                size = item.get("size")
+                url = requests.compat.urljoin(base_url, quote(item["name"]))
+                entries[url] = {"url": url, "name": item["name"], "size": size if isinstance(size, int) else None,
+                                "exact": isinstance(size, int), "mtime": parse_listing_date(str(item.get("mtime", "")))}
+        return entries
+    records = LISTING_ROW.findall(page_content)
+    for block in LISTING_PRE.findall(page_content):
+        records.extend(block.splitlines())
+    directory = requests.compat.urljoin(base_url, ".")
+    for record in records:
+        match = LISTING_HREF.search(record)
+        if not match or match.group(1).startswith(("?", "#")) or match.group(1).endswith("/"):
+            continue
+        href = match.group(1)
+        # نام ساده فایل (رایج‌ترین حالت در autoindex) بدون urljoin پرهزینه به مسیر پوشه افزوده می‌شود
+        url = directory + href if LISTING_PLAIN_HREF.match(href) else requests.compat.urljoin(base_url, href)
+        # فقط سطرهای لینک‌های انتخاب‌شده تجزیه می‌شوند
+        if url in entries or wanted is not None and url not in wanted:
+            continue
+        exact = LISTING_EXACT_SIZE.search(record)
+        text = html.unescape(re.sub(r"<[^>]+>", " ", record[match.end():]))
+        stamp = LISTING_TIME.search(record)
+        if stamp:
+            text += " " + stamp.group(1)[:19]
+        entries[url] = parse_listing_entry(url, href, text, int(exact.group(1)) if exact else None)
+    return entries
+
+def remember_listing(entries, links):
+    # اندازه دقیق فهرست جای HEAD را می‌گیرد؛ ETag و Last-Modified نامعلوم می‌مانند، پس If-Range و مقایسه ETag انجام نمی‌شود
+    remembered = 0
+    for link in links:
+        entry = entries.get(link)
+        if not entry or not entry["exact"] or link in metadata_cache:
+            continue
+        metadata_cache[link] = {"size": entry["size"], "etag": None, "last_modified": None, "accept_ranges": None, "link": "", "mtime": entry["mtime"], "source": "listing"}
+        remembered += 1
+    if remembered:
+        instrumentation.count("fetch.listing_sizes", remembered)
+        logging.info(f"Sizes of {remembered} file(s) taken from the directory listing; HEAD skipped.")
+    return remembered
+
+# ============================
+# Checksum Helpers (Sidecar Files and Streaming Hashes)
+# ============================
+CHECKSUM_EXTENSIONS = {".md5": "md5", ".sha1": "sha1", ".sha256": "sha256"}
+CHECKSUM_LIST_FILES = {"md5sums": "md5", "sha1sums": "sha1", "sha256sums": "sha256"}
+HASH_LENGTHS = {32: "md5", 40: "sha1", 64: "sha256"}
+HASH_CATCH_UP_BYTES = 4 * 1024 * 1024
+
+def parse_checksum(spec):
+    # قالب‌های پذیرفته‌شده: "sha256:HEX" ، "sha256=HEX" یا فقط HEX
+    if not spec:
+        return None
+    spec = spec.strip()
+    algorithm = None
+    match = re.match(r"^(md5|sha1|sha256)\s*[:=]\s*(.+)$", spec, re.IGNORECASE)
+    if match:
+        algorithm, spec = match.group(1).lower(), match.group(2).strip()
+    digest = spec.lower()
+    if not re.fullmatch(r"[0-9a-f]+", digest) or len(digest) not in HASH_LENGTHS:
+        return None
+    if algorithm and HASH_LENGTHS[len(digest)] != algorithm:
+        return None
+    return HASH_LENGTHS[len(digest)], digest
+
+def parse_checksum_file(text, algorithm):
+    # قالب‌های رایج: "HEX  name" ، "HEX *name" و "SHA256 (name) = HEX"
+    result = {}
+    for line in text.splitlines():
+        line = line.strip()
+        bsd = re.match(r"^\w+\s*\((.+)\)\s*=\s*([0-9a-fA-F]+)$", line)
+        if bsd:
+            name, digest = bsd.group(1), bsd.group(2)
+        else:
+            parts = line.split(None, 1)
+            if not parts:
+                continue
+            digest = parts[0]
+            name = parts[1].lstrip("*").strip() if len(parts) > 1 else ""
+        if parse_checksum(f"{algorithm}:{digest}"):
+            result[os.path.basename(name)] = f"{algorithm}:{digest.lower()}"
+    return result
+
+@instrumented("parse.checksums")
+def extract_checksum_sidecars(page_content, base_url, links):
+    wanted = {unquote(os.path.basename(link.split("?")[0])) for link in links}
+    sidecars = advanced_filter_links(page_content, base_url, list(CHECKSUM_EXTENSIONS) + list(CHECKSUM_LIST_FILES))
+    checksums = {}
+    for sidecar in sidecars:
+        sidecar_name = unquote(os.path.basename(sidecar.split("?")[0]))
+        stem, ext = os.path.splitext(sidecar_name)
+        algorithm = CHECKSUM_EXTENSIONS.get(ext.lower()) or CHECKSUM_LIST_FILES.get(sidecar_name.lower())
+        if not algorithm:
+            continue
+        if ext.lower() in CHECKSUM_EXTENSIONS and stem not in wanted:
+            continue
+        try:
+            resp = requests.get(sidecar, timeout=10)
+            resp.raise_for_status()
+        except Exception as e:
+            logging.warning(f"Error fetching checksum file {sidecar}: {e}")
+            continue
+        entries = parse_checksum_file(resp.text, algorithm)
+        if ext.lower() in CHECKSUM_EXTENSIONS and not entries.get(stem):
+            # فایل‌های .sha256 گاهی فقط شامل HEX بدون نام فایل هستند
+            first = next(iter(entries.values()), None)
+            entries = {stem: first} if first else {}
+        for name, spec in entries.items():
+            if name in wanted:
+                checksums[name] = spec
+    if checksums:
+        logging.info(f"Found {len(checksums)} checksum(s) on {base_url}")
+    return checksums
+
+class StreamHasher:
+    # هش به ترتیب فایل محاسبه می‌شود؛ داده‌های سگمنت‌های جلوتر بعداً از روی دیسک خوانده می‌شوند
+    def __init__(self, algorithm, file_path):
+        self.algorithm = algorithm
+        self.file_path = file_path
+        # سگمنت‌ها از نخ‌های I/O مختلف داده می‌فرستند
+        self.lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        self.hash = hashlib.new(self.algorithm)
+        self.position = 0
+        self.frontiers = {}
+
+    def update(self, data):
+        self.hash.update(data)
+        self.position += len(data)
+
+    def feed(self, segment_start, offset, data):
+        with self.lock:
+            self.frontiers[segment_start] = offset + len(data)
+            if offset == self.position:
+                self.update(data)
+            elif offset > self.position:
+                self.catch_up(HASH_CATCH_UP_BYTES)
+
+    def skip_written(self, start, end):
+        # بازه‌ای که از اجرای قبلی روی دیسک است؛ هنگام catch_up از دیسک خوانده می‌شود
+        with self.lock:
+            self.frontiers[start] = max(self.frontiers.get(start, 0), end)
+
+    def available_end(self):
+        end = self.position
+        for start in sorted(self.frontiers):
+            if start <= end:
+                end = max(end, self.frontiers[start])
+        return end
+
+    def catch_up(self, limit=None, end=None):
+        with self.lock:
+            self.read_ahead(limit, end)
+
+    def read_ahead(self, limit, end):
+        end = self.available_end() if end is None else end
+        remaining = end - self.position
+        if limit is not None:
+            remaining = min(remaining, limit)
+        if remaining <= 0:
+            return
+        with open(self.file_path, "rb") as f:
+            f.seek(self.position)
+            while remaining > 0:
+                data = f.read(min(remaining, 1024 * 1024))
+                if not data:
+                    break
+                self.update(data)
+                remaining -= len(data)
+
+    def hexdigest(self, total_size=None):
+        self.catch_up(end=total_size)
+        return self.hash.hexdigest()
+
+# ============================
+# Memory Budget (Unwritten Bytes and Backpressure)
+# ============================
+MEMORY_MIN_READ = 64 * 1024
+
+class MemoryBudget:
+    # بایت‌های دریافت‌شده و هنوز نوشته‌نشده در کل پردازه شمرده می‌شوند؛
+    # با رسیدن به سقف، خواندن‌ها تا نوشته شدن داده‌های قبلی روی دیسک منتظر می‌مانند
+    def __init__(self):
+        self.limit = DEFAULT_CONFIG["memory_budget_mb"] * 1024 * 1024
+        self.cache_limit = DEFAULT_CONFIG["page_cache_mb"] * 1024 * 1024
+        self.used = 0
+        self.peak = 0
+        self.waits = 0
+        self.streams = 0
+        self.loop = None
+        self.freed = None
+
+    def configure(self, config):
+        self.limit = int(float(config.get("memory_budget_mb", DEFAULT_CONFIG["memory_budget_mb"])) * 1024 * 1024)
+        self.cache_limit = int(float(config.get("page_cache_mb", DEFAULT_CONFIG["page_cache_mb"])) * 1024 * 1024)
+        trim_cache_data()
+
+    def socket_buffer(self, config):
+        # StreamReader هر اتصال تا دو برابر read_bufsize بافر می‌کند؛ نیمی از بودجه برای این بافرها در نظر گرفته می‌شود
+        size = config.get("max_read_size", DEFAULT_CONFIG["max_read_size"])
+        if not self.limit:
+            return size
+        parts = int(config.get("multi_connection_parts", DEFAULT_CONFIG["multi_connection_parts"]))
+        if config.get("auto_tune_hosts", DEFAULT_CONFIG["auto_tune_hosts"]):
+            parts = min(parts, int(config.get("auto_tune_max_connections", DEFAULT_CONFIG["auto_tune_max_connections"])))
+        connections = max(1, int(config.get("concurrent_downloads", DEFAULT_CONFIG["concurrent_downloads"])) * int(parts))
+        return max(MEMORY_MIN_READ, min(size, self.limit // (4 * connections)))
+
+    def read_size(self, size):
+        # سهم هر جریان از بودجه؛ اندازه خواندن تطبیقی با تعداد سگمنت‌ها و دانلودها چند برابر نمی‌شود
+        if not self.limit:
+            return size
+        return max(min(size, MEMORY_MIN_READ), min(size, self.limit // (2 * max(1, self.streams))))
+
+    def available(self, nbytes):
+        # یک خواندن بزرگ‌تر از کل بودجه فقط وقتی مجاز است که چیز دیگری در حافظه نباشد
+        return not self.limit or not self.used or self.used + nbytes <= self.limit
+
+    async def acquire(self, nbytes):
+        if not self.available(nbytes):
+            self.waits += 1
+            loop = asyncio.get_running_loop()
+            if loop is not self.loop:
+                self.loop, self.freed = loop, asyncio.Event()
+            with instrumentation.timer("memory.wait"):
+                while not self.available(nbytes):
+                    self.freed.clear()
+                    await self.freed.wait()
+        self.used += nbytes
+        self.peak = max(self.peak, self.used)
+
+    def release(self, nbytes):
+        self.used = max(0, self.used - nbytes)
+        if self.freed:
+            self.freed.set()
+
+    def summary(self):
+        limit = f"{self.limit / (1024 * 1024):.0f} MB" if self.limit else "unlimited"
+        return (f"Buffered (unwritten): {self.used / (1024 * 1024):.1f} MB of {limit}, peak {self.peak / (1024 * 1024):.1f} MB, "
+                f"reads paused {self.waits} time(s); page cache {cache_size() / (1024 * 1024):.1f} MB in {len(cache_data)} page(s)")
+
+memory_budget = MemoryBudget()
 
 # ============================
 # Cache Management
@@ -233,6 +976,20 @@ def load_cache_data():
             cache_data = {}
     else:
         cache_data = {}
+    trim_cache_data()
+
+def cache_size():
+    return sum(len(page) for page in cache_data.values())
+
+def trim_cache_data():
+    # کش به ترتیب آخرین استفاده نگه داشته می‌شود و قدیمی‌ترین صفحات تا رسیدن به سقف حذف می‌شوند
+    if not memory_budget.cache_limit:
+        return
+    total = cache_size()
+    for url in list(cache_data):
+        if total <= memory_budget.cache_limit:
+            break
+        total -= len(cache_data.pop(url))
 
 def save_cache_data():
     try:
@@ -244,8 +1001,11 @@ def save_cache_data():
 
 def get_cached_page(url, force_update=False):
     if not force_update and url in cache_data:
+        metrics.cache_lookup("page", True)
         logging.info(f"Using cached data for {url}")
+        cache_data[url] = cache_data.pop(url)
         return cache_data[url]
+    metrics.cache_lookup("page", False)
     try:
         resp = requests.get(url, timeout=10, verify=False)
         resp.raise_for_status()
@@ -254,55 +1014,1703 @@ def get_cached_page(url, force_update=False):
         logging.warning(f"Error fetching page {url}: {e}. Using Selenium.")
         page_content = extract_dynamic_links(url)
     cache_data[url] = page_content
+    trim_cache_data()
     save_cache_data()
     return page_content
 
 load_cache_data()
 
+# ============================
+# Persistent Queue (SQLite, WAL)
+# ============================
+QUEUE_DB_FILE = "queue.db"
+RESTORE_BATCH_SIZE = 2000
+QUEUE_COLUMNS = ("url", "url_key", "position", "state", "priority", "percent", "checksum", "mirrors", "size", "etag", "part_path")
+
+class QueueStore:
+    # تغییرات در حافظه جمع می‌شوند و در هر flush در یک تراکنش نوشته می‌شوند (یک fsync برای هر دسته)
+    def __init__(self, path=QUEUE_DB_FILE):
+        self.path = path
+        self.pending = {}
+        self.deleted = set()
+        self.cleared = False
+        self.next_position = 0
+        self.etags = {}
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=FULL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS items (file_name TEXT PRIMARY KEY, url TEXT NOT NULL, url_key TEXT, position INTEGER, "
+            "state TEXT DEFAULT 'Queued', priority INTEGER DEFAULT 0, percent INTEGER DEFAULT 0, checksum TEXT, "
+            "mirrors TEXT, size INTEGER, etag TEXT, part_path TEXT, updated REAL)"
+        )
+        self.db.commit()
+
+    def load(self):
+        rows = self.db.execute(f"SELECT file_name, {', '.join(QUEUE_COLUMNS)} FROM items ORDER BY position").fetchall()
+        items = []
+        for row in rows:
+            item = dict(zip(("file_name",) + QUEUE_COLUMNS, row))
+            item["mirrors"] = json.loads(item["mirrors"]) if item["mirrors"] else []
+            if item["etag"]:
+                self.etags[item["file_name"]] = item["etag"]
+            items.append(item)
+        self.next_position = (rows[-1][3] or 0) + 1 if rows else 0
+        return items
+
+    def add(self, file_name, url, **fields):
+        # آدرس نرمال‌شده ذخیره می‌شود تا بازیابی صف‌های بزرگ به محاسبه دوباره نیاز نداشته باشد
+        self.put(file_name, url=url, url_key=normalize_url(url), position=self.next_position, state="Queued", percent=0, **fields)
+        self.next_position += 1
+
+    def put(self, file_name, **fields):
+        if "mirrors" in fields:
+            fields["mirrors"] = json.dumps(fields["mirrors"]) if fields["mirrors"] else None
+        if fields.get("etag"):
+            self.etags[file_name] = fields["etag"]
+        self.pending.setdefault(file_name, {}).update(fields)
+        self.deleted.discard(file_name)
+
+    def remove(self, file_name):
+        self.etags.pop(file_name, None)
+        self.pending.pop(file_name, None)
+        self.deleted.add(file_name)
+
+    def clear(self):
+        self.pending.clear()
+        self.deleted.clear()
+        self.etags.clear()
+        self.cleared = True
+        self.next_position = 0
+
+    def remove_completed(self):
+        # فقط ردیف‌های تمام‌شده حذف می‌شوند؛ موارد ناموفق یا لغوشده برای تلاش دوباره باقی می‌مانند
+        self.flush()
+        try:
+            with self.db:
+                names = [row[0] for row in self.db.execute("SELECT file_name FROM items WHERE state = 'Completed'")]
+                self.db.execute("DELETE FROM items WHERE state = 'Completed'")
+        except sqlite3.Error as e:
+            logging.error(f"Error saving download queue: {e}")
+            return
+        for name in names:
+            self.etags.pop(name, None)
+
+    def flush(self):
+        if not (self.pending or self.deleted or self.cleared):
+            return
+        pending, deleted, cleared = self.pending, self.deleted, self.cleared
+        self.pending, self.deleted, self.cleared = {}, set(), False
+        now = time.time()
+        # ردیف‌ها بر اساس مجموعه ستون‌ها گروه‌بندی می‌شوند تا هر گروه با یک executemany نوشته شود
+        groups = {}
+        for file_name, fields in pending.items():
+            groups.setdefault(tuple(sorted(fields)), []).append((file_name, fields))
+        try:
+            with self.db:
+                if cleared:
+                    self.db.execute("DELETE FROM items")
+                if deleted:
+                    self.db.executemany("DELETE FROM items WHERE file_name = ?", [(name,) for name in deleted])
+                for columns, entries in groups.items():
+                    values = [tuple(fields[c] for c in columns) + (now, name) for name, fields in entries]
+                    if "url" in columns:
+                        names = ", ".join(columns)
+                        updates = ", ".join(f"{c} = excluded.{c}" for c in columns + ("updated",))
+                        self.db.executemany(
+                            f"INSERT INTO items ({names}, updated, file_name) VALUES ({', '.join('?' * (len(columns) + 2))}) "
+                            f"ON CONFLICT(file_name) DO UPDATE SET {updates}", values)
+                    else:
+                        assignments = ", ".join(f"{c} = ?" for c in columns + ("updated",))
+                        self.db.executemany(f"UPDATE items SET {assignments} WHERE file_name = ?", values)
+        except sqlite3.Error as e:
+            logging.error(f"Error saving download queue: {e}")
+            # تغییرات از دست نمی‌روند و در flush بعدی دوباره نوشته می‌شوند
+            for file_name, fields in pending.items():
+                self.pending[file_name] = {**fields, **self.pending.get(file_name, {})}
+            self.deleted |= deleted - set(self.pending)
+            self.cleared = self.cleared or cleared
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+# ============================
+# Metadata Probe (HEAD) and Disk Placement
+# ============================
+PART_SUFFIX = ".part"
+metadata_cache = {}
+# تعداد آدرس‌ها در هر کار HEAD پس‌زمینه هنگام افزودن به دانلود در جریان
+PREFETCH_BATCH = 50
+
+def probe_metadata(url, force=False):
+    if not force and url in metadata_cache:
+        instrumentation.count("fetch.head_cache_hits")
+        metrics.cache_lookup("metadata", True)
+        return metadata_cache[url]
+    metrics.cache_lookup("metadata", False)
+    with instrumentation.timer("fetch.head"):
+        head_resp = requests.head(url, timeout=5, allow_redirects=True)
+    head_resp.raise_for_status()
+    metadata = {
+        "size": int(head_resp.headers.get("Content-Length", 0) or 0),
+        "etag": head_resp.headers.get("ETag"),
+        "last_modified": head_resp.headers.get("Last-Modified"),
+        "accept_ranges": head_resp.headers.get("Accept-Ranges", "").lower() == "bytes",
+        "link": head_resp.headers.get("Link", "")
+    }
+    metadata_cache[url] = metadata
+    return metadata
+
+def format_size(size):
+    return f"{size / (1024*1024):.2f} MB"
+
+def check_free_space(folder, required):
+    free = shutil.disk_usage(folder or ".").free
+    if required > free:
+        raise OSError(errno.ENOSPC, f"Not enough disk space in {folder}: {format_size(required)} needed, {format_size(free)} available.")
+
+def preallocate_file(file_path, size):
+    # رزرو فضا از ابتدا؛ برخلاف truncate فایل sparse ساخته نمی‌شود و کمبود فضا همان ابتدا مشخص می‌شود
+    with open(file_path, "wb") as f:
+        try:
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(f.fileno(), 0, size)
+            else:
+                f.truncate(size)
+        except OSError as e:
+            if e.errno in (errno.EOPNOTSUPP, errno.EINVAL):
+                f.truncate(size)
+            elif e.errno == errno.ENOSPC:
+                f.truncate(0)
+                raise OSError(errno.ENOSPC, f"Not enough disk space for {os.path.basename(file_path)} ({format_size(size)}).") from e
+            else:
+                raise
+
+def is_disk_full(error):
+    return isinstance(error, OSError) and error.errno == errno.ENOSPC
+
+# ============================
+# Scheduling Policies (Queue Order)
+# ============================
+QUEUE_POLICIES = ("alphabetical", "fifo", "shortest_first", "largest_first", "round_robin", "priority")
+
+def order_queue(urls, policy, file_name=None, size_of=None, priority_of=None):
+    # اندازه‌ها از کش متادیتا (نتیجه HEAD) خوانده می‌شوند؛ موارد با اندازه نامعلوم در انتها می‌مانند
+    file_name = file_name or url_file_name
+    size_of = size_of or (lambda url: metadata_cache.get(url, {}).get("size") or None)
+    if policy == "alphabetical":
+        return sorted(urls, key=lambda url: file_name(url).lower())
+    if policy == "shortest_first":
+        return sorted(urls, key=lambda url: (size_of(url) is None, size_of(url) or 0))
+    if policy == "largest_first":
+        return sorted(urls, key=lambda url: (size_of(url) is None, -(size_of(url) or 0)))
+    if policy == "priority" and priority_of:
+        # مرتب‌سازی پایدار؛ در اولویت یکسان ترتیب افزودن حفظ می‌شود
+        return sorted(urls, key=lambda url: -priority_of(url))
+    if policy == "round_robin":
+        by_host = {}
+        for url in urls:
+            by_host.setdefault(urlparse(url).hostname or "", deque()).append(url)
+        ordered = []
+        while by_host:
+            for host in list(by_host):
+                ordered.append(by_host[host].popleft())
+                if not by_host[host]:
+                    del by_host[host]
+        return ordered
+    return list(urls)
+
+# ============================
+# Deduplication Index (URL, Size/ETag, Hash)
+# ============================
+def url_file_name(url):
+    return unquote(os.path.basename(url.split("?")[0]))
+
+def normalize_url(url):
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    netloc = host
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        netloc = f"{host}:{parts.port}"
+    if parts.username:
+        netloc = f"{parts.username}@{netloc}"
+    path = quote(unquote(parts.path), safe="/~!$&'()*+,;=:@")
+    if path:
+        trailing = path.endswith("/")
+        path = posixpath.normpath(path) + ("/" if trailing and path != "/" else "")
+    else:
+        path = "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+def link_or_copy(source, target, mode="hardlink"):
+    # ابتدا در مسیر موقت ساخته می‌شود تا جایگزینی فایل مقصد اتمیک باشد
+    temp_path = target + ".link"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    if mode == "hardlink":
+        try:
+            os.link(source, temp_path)
+            os.replace(temp_path, target)
+            return "hardlink"
+        except OSError as e:
+            logging.info(f"Hard link failed for {target}: {e}. Copying instead.")
+    shutil.copy2(source, temp_path)
+    os.replace(temp_path, target)
+    return "copy"
+
+class DedupIndex:
+    def __init__(self):
+        self.urls = {}
+        self.names = {}
+        self.content = {}
+        self.aliases = {}
+        self.hashes = {}
+
+    def add(self, url):
+        # None یعنی همین آدرس (پس از نرمال‌سازی) قبلاً در صف بوده است
+        key = normalize_url(url)
+        if key in self.urls:
+            return None
+        file_name = url_file_name(url)
+        if file_name in self.names:
+            # نام تکراری از مسیر دیگر: تغییر نام قطعی بر اساس هش آدرس
+            stem, ext = os.path.splitext(file_name)
+            file_name = f"{stem}~{hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]}{ext}"
+        self.urls[key] = file_name
+        self.names[file_name] = key
+        return file_name
+
+    def assign(self, key, file_name):
+        # بازیابی نام‌های ذخیره‌شده در صف؛ فایل‌های .part با همین نام روی دیسک هستند
+        self.urls[key] = file_name
+        self.names[file_name] = key
+
+    def file_name(self, url):
+        return self.urls.get(normalize_url(url)) or url_file_name(url)
+
+    def __contains__(self, url):
+        return normalize_url(url) in self.urls
+
+    def remove(self, file_name):
+        key = self.names.pop(file_name, None)
+        if key:
+            self.urls.pop(key, None)
+        self.aliases.pop(file_name, None)
+        for content_key, owner in list(self.content.items()):
+            if owner == file_name:
+                del self.content[content_key]
+
+    def clear(self):
+        self.urls.clear()
+        self.names.clear()
+        self.content.clear()
+        self.aliases.clear()
+        self.hashes.clear()
+
+    def register_content(self, file_name, size, etag):
+        # فقط ETag قوی همراه با اندازه به عنوان شناسه محتوا پذیرفته می‌شود
+        if not size or not etag or etag.startswith("W/"):
+            return None
+        owner = self.content.setdefault((size, etag), file_name)
+        if owner == file_name:
+            return None
+        self.aliases[file_name] = owner
+        return owner
+
+    def aliases_of(self, owner):
+        return [name for name, alias_owner in list(self.aliases.items()) if alias_owner == owner]
+
+    def register_hash(self, digest, path):
+        existing = self.hashes.setdefault(digest, path)
+        return existing if existing != path and os.path.exists(existing) else None
+
+# ============================
+# Block Digests and Block Manifests (Metalink)
+# ============================
+MAX_MANIFEST_BYTES = 1024 * 1024
+MANIFEST_HASH_TYPES = {"sha-256": "sha256", "sha256": "sha256", "sha-1": "sha1", "sha1": "sha1", "md5": "md5"}
+
+def parse_block_manifest(text):
+    # پشتیبانی از <pieces> در metalink نسخه ۳ و ۴ (بدون وابستگی به namespace)
+    try:
+        root = ET.fromstring(text)
+    except ET.ParseError as e:
+        logging.warning(f"Invalid block manifest: {e}")
+        return None
+    for element in root.iter():
+        if element.tag.split("}")[-1] != "pieces":
+            continue
+        algorithm = MANIFEST_HASH_TYPES.get(element.get("type", "").lower())
+        try:
+            block_size = int(element.get("length", 0))
+        except ValueError:
+            block_size = 0
+        hashes = [h.text.strip().lower() for h in element if h.tag.split("}")[-1] == "hash" and h.text]
+        if algorithm and block_size > 0 and hashes:
+            return {"algorithm": algorithm, "block_size": block_size, "hashes": hashes}
+    return None
+
+def fetch_block_manifest(url, headers=None):
+    candidates = []
+    # RFC 6249: Link: <...>; rel=describedby; type="application/metalink4+xml"
+    for link in (headers or {}).get("Link", "").split(","):
+        if "describedby" in link and "metalink" in link:
+            match = re.search(r"<([^>]+)>", link)
+            if match:
+                candidates.append(requests.compat.urljoin(url, match.group(1)))
+    candidates.append(url.split("?")[0] + ".meta4")
+    for candidate in candidates:
+        try:
+            # سرورهایی که برای هر مسیری پاسخ 200 می‌دهند نباید باعث دریافت یک فایل بزرگ به جای manifest شوند
+            with requests.get(candidate, timeout=10, stream=True) as resp:
+                if resp.status_code != 200 or int(resp.headers.get("Content-Length", 0) or 0) > MAX_MANIFEST_BYTES:
+                    continue
+                body = resp.raw.read(MAX_MANIFEST_BYTES + 1, decode_content=True)
+            if len(body) > MAX_MANIFEST_BYTES:
+                continue
+            manifest = parse_block_manifest(body)
+            if manifest:
+                logging.info(f"Block manifest found for {url}: {len(manifest['hashes'])} blocks of {manifest['block_size']} bytes")
+                return manifest
+        except Exception as e:
+            logging.warning(f"Error fetching block manifest {candidate}: {e}")
+    return None
+
+class BlockLedger:
+    # خلاصه هش هر بلوک ثابت؛ هر بلوک فقط توسط یک سگمنت و به ترتیب نوشته می‌شود
+    def __init__(self, total_size, block_size, algorithm="sha256", expected=None):
+        self.total_size = total_size
+        self.block_size = block_size
+        self.algorithm = algorithm
+        self.block_count = max(1, -(-total_size // block_size))
+        self.digests = [None] * self.block_count
+        self.filled = [0] * self.block_count
+        self.hashers = {}
+        self.lock = threading.Lock()
+        self.expected = expected if expected and len(expected) == self.block_count else None
+        self.repaired = 0
+
+    @classmethod
+    def from_manifest(cls, total_size, manifest):
+        ledger = cls(total_size, manifest["block_size"], manifest["algorithm"], manifest["hashes"])
+        if ledger.expected is None:
+            logging.warning(f"Block manifest does not match file size ({len(manifest['hashes'])} hashes for {ledger.block_count} blocks); ignoring it.")
+        return ledger
+
+    def block_range(self, index):
+        start = index * self.block_size
+        return start, min(start + self.block_size, self.total_size) - 1
+
+    def feed(self, offset, data):
+        with self.lock:
+            self.feed_blocks(offset, data)
+
+    def feed_blocks(self, offset, data):
+        view = memoryview(data)
+        while view:
+            index = offset // self.block_size
+            block_start, block_end = self.block_range(index)
+            take = min(len(view), block_end + 1 - offset)
+            hasher = self.hashers.get(index)
+            if hasher is None:
+                hasher = self.hashers[index] = hashlib.new(self.algorithm)
+            hasher.update(view[:take])
+            self.filled[index] += take
+            if self.filled[index] >= block_end + 1 - block_start:
+                self.digests[index] = self.hashers.pop(index).hexdigest()
+            offset += take
+            view = view[take:]
+
+    def reset_block(self, index):
+        with self.lock:
+            self.digests[index] = None
+            self.filled[index] = 0
+            self.hashers.pop(index, None)
+
+    def mismatched_blocks(self):
+        if not self.expected:
+            return [i for i, digest in enumerate(self.digests) if digest is None]
+        return [i for i, digest in enumerate(self.digests) if digest != self.expected[i]]
+
+    def completed_blocks(self):
+        # بلوک‌هایی که کامل نوشته شده‌اند و (در صورت وجود فهرست) با هش مورد انتظار یکسان هستند
+        return [i for i, digest in enumerate(self.digests) if digest is not None and (not self.expected or digest == self.expected[i])]
+
+    def restore(self, file_path, indices):
+        # بلوک‌های ذخیره‌شده در نقشه سگمنت از روی دیسک دوباره هش می‌شوند؛ در نخ I/O اجرا می‌شود
+        with open(file_path, "rb") as f:
+            for index in indices:
+                start, end = self.block_range(index)
+                f.seek(start)
+                data = f.read(end + 1 - start)
+                if len(data) != end + 1 - start:
+                    continue
+                with self.lock:
+                    self.hashers.pop(index, None)
+                    self.filled[index] = len(data)
+                    self.digests[index] = hashlib.new(self.algorithm, data).hexdigest()
+        # بلوک ذخیره‌شده‌ای که با فهرست نمی‌خواند دوباره دریافت می‌شود
+        for index in set(indices) - set(self.completed_blocks()):
+            self.reset_block(index)
+        return sum(self.filled[index] for index in self.completed_blocks())
+
+# ============================
+# Segment Maps (Resuming Segmented Downloads)
+# ============================
+# فایل .part در حالت چنداتصالی از ابتدا با اندازه کامل ساخته می‌شود؛ بلوک‌های کامل‌شده در این فایل کناری ثبت می‌شوند
+SEGMENT_MAP_SUFFIX = ".segments"
+
+def resume_validator(metadata):
+    etag = metadata.get("etag")
+    return etag if etag and not etag.startswith("W/") else metadata.get("last_modified")
+
+def compact_blocks(indices):
+    # [0, 1, 2, 5, 6] -> [[0, 2], [5, 6]]
+    ranges = []
+    for index in sorted(indices):
+        if ranges and ranges[-1][1] == index - 1:
+            ranges[-1][1] = index
+        else:
+            ranges.append([index, index])
+    return ranges
+
+def save_segment_map(part_path, ledger, validator):
+    data = {"size": ledger.total_size, "block_size": ledger.block_size, "validator": validator, "blocks": compact_blocks(ledger.completed_blocks())}
+    temp_path = f"{part_path}{SEGMENT_MAP_SUFFIX}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(temp_path, part_path + SEGMENT_MAP_SUFFIX)
+    except OSError as e:
+        logging.warning(f"Error saving segment map for {os.path.basename(part_path)}: {e}")
+
+def load_segment_map(part_path, total_size, validator):
+    # نقشه فقط وقتی معتبر است که اندازه و اعتبارسنج فایل روی سرور تغییر نکرده باشد
+    try:
+        with open(part_path + SEGMENT_MAP_SUFFIX, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data["size"] != total_size or data["validator"] != validator or os.path.getsize(part_path) != total_size:
+            return None
+        return {"block_size": int(data["block_size"]), "blocks": [index for first, last in data["blocks"] for index in range(first, last + 1)]}
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def remove_segment_map(part_path):
+    try:
+        os.remove(part_path + SEGMENT_MAP_SUFFIX)
+    except OSError:
+        pass
+
+def completed_prefix(block_size, blocks, total_size):
+    # طول بخش پیوسته کامل از ابتدای فایل؛ برای ادامه تک‌اتصالی
+    done = set(blocks)
+    index = 0
+    while index in done:
+        index += 1
+    return min(total_size, index * block_size)
+
+# ============================
+# Bandwidth Limiting (Token Bucket)
+# ============================
+FAIR_SLICE_SECONDS = 0.1
+MIN_THROTTLED_CHUNK = 1024
+
+class TokenBucket:
+    # پیاده‌سازی GCRA؛ هر درخواست سهم خود را به ترتیب ورود رزرو می‌کند و نیازی به قفل ندارد
+    def __init__(self, rate=0, burst=1.0):
+        self.rate = rate
+        self.burst = burst
+        self.tat = 0.0
+
+    def reserve(self, nbytes):
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tat = max(self.tat, now) + nbytes / self.rate
+        return max(0.0, self.tat - self.burst - now)
+
+class BandwidthLimiter:
+    def __init__(self):
+        self.global_bucket = TokenBucket()
+        self.host_rates = {}
+        self.host_buckets = {}
+        self.item_buckets = {}
+        self.active_total = 0
+        self.active_hosts = {}
+        self.active_items = {}
+
+    def configure(self, global_rate, host_rates):
+        # مقادیر بر حسب بایت بر ثانیه؛ در زمان اجرا و بدون راه‌اندازی مجدد worker قابل تغییر است
+        self.global_bucket.rate = global_rate
+        self.host_rates = dict(host_rates)
+        for host, bucket in list(self.host_buckets.items()):
+            bucket.rate = self.host_rates.get(host, 0)
+
+    def set_item_rate(self, item, rate):
+        self.item_buckets.setdefault(item, TokenBucket()).rate = rate
+
+    def buckets_for(self, host, item):
+        if host not in self.host_buckets:
+            self.host_buckets[host] = TokenBucket(self.host_rates.get(host, 0))
+        buckets = [(self.global_bucket, self.active_total), (self.host_buckets[host], self.active_hosts.get(host, 0))]
+        if item in self.item_buckets:
+            buckets.append((self.item_buckets[item], self.active_items.get(item, 0)))
+        return buckets
+
+    @contextmanager
+    def stream(self, host, item):
+        self.active_total += 1
+        self.active_hosts[host] = self.active_hosts.get(host, 0) + 1
+        self.active_items[item] = self.active_items.get(item, 0) + 1
+        try:
+            yield
+        finally:
+            self.active_total -= 1
+            self.active_hosts[host] -= 1
+            self.active_items[item] -= 1
+
+    def chunk_limit(self, host, item):
+        # سهم هر جریان از هر سطل به نسبت تعداد جریان‌های فعال آن سطل تقسیم می‌شود
+        limits = [bucket.rate * FAIR_SLICE_SECONDS / max(1, active) for bucket, active in self.buckets_for(host, item) if bucket.rate > 0]
+        return max(MIN_THROTTLED_CHUNK, int(min(limits))) if limits else None
+
+    async def throttle(self, host, item, nbytes):
+        delay = max(bucket.reserve(nbytes) for bucket, _ in self.buckets_for(host, item))
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+bandwidth_limiter = BandwidthLimiter()
+
+def parse_host_rate_limits(text):
+    limits = {}
+    for entry in text.split(","):
+        if "=" not in entry:
+            continue
+        host, rate = entry.split("=", 1)
+        if host.strip():
+            limits[host.strip().lower()] = int(rate.strip())
+    return limits
+
+def apply_bandwidth_config(config):
+    host_limits = config.get("host_rate_limits", DEFAULT_CONFIG["host_rate_limits"])
+    bandwidth_limiter.configure(
+        int(config.get("global_rate_limit", DEFAULT_CONFIG["global_rate_limit"])) * 1024,
+        {host: int(rate) * 1024 for host, rate in host_limits.items()}
+    )
+
+# ============================
+# Retry Policy (Error Classes, Retry-After, Per-host Circuit Breaker)
+# ============================
+RETRY_AFTER_MAX = 600
+CIRCUIT_COOLDOWN_MAX = 600
+CIRCUIT_PROBE_TIMEOUT = 60
+# ضریب تأخیر پایه برای هر کلاس خطا؛ خطاهای دائمی (مثل 404) اصلاً تکرار نمی‌شوند
+RETRY_BACKOFF_FACTORS = {"throttled": 2.0, "server": 1.0, "timeout": 1.0, "network": 0.5, "other": 1.0}
+# این کلاس‌ها نشانه مشکل سرور هستند و در شمارش خطاهای میزبان حساب می‌شوند
+HOST_FAILURE_CLASSES = {"throttled", "server", "timeout", "network"}
+
+class HTTPStatusError(Exception):
+    def __init__(self, status, retry_after=None, message=None):
+        super().__init__(message or f"HTTP response {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+def parse_retry_after(value):
+    # Retry-After می‌تواند تعداد ثانیه یا یک تاریخ HTTP باشد
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return min(int(value), RETRY_AFTER_MAX)
+    try:
+        return min(max(0.0, parsedate_to_datetime(value).timestamp() - time.time()), RETRY_AFTER_MAX)
+    except (TypeError, ValueError):
+        return None
+
+def classify_error(error):
+    if isinstance(error, HTTPStatusError):
+        if error.status in (429, 503):
+            return "throttled"
+        if error.status >= 500:
+            return "server"
+        if error.status in (408, 425):
+            return "timeout"
+        return "permanent" if error.status >= 400 else "other"
+    if isinstance(error, asyncio.TimeoutError) or httpx and isinstance(error, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, ConnectionError)) or httpx and isinstance(error, httpx.TransportError):
+        return "network"
+    return "other"
+
+class RetryPolicy:
+    def __init__(self, max_retries, initial_backoff, max_backoff):
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config.get("max_retries", DEFAULT_CONFIG["max_retries"]),
+            config.get("initial_backoff", DEFAULT_CONFIG["initial_backoff"]),
+            config.get("max_backoff", DEFAULT_CONFIG["max_backoff"])
+        )
+
+    def should_retry(self, error_class, attempt):
+        return error_class in RETRY_BACKOFF_FACTORS and attempt <= self.max_retries
+
+    def delay(self, error_class, attempt, retry_after=None):
+        if retry_after is not None:
+            # مقدار سرور رعایت می‌شود؛ jitter کوچک از هم‌زمانی درخواست‌های بعدی جلوگیری می‌کند
+            return retry_after + random.uniform(0, 1)
+        backoff = min(self.max_backoff, self.initial_backoff * RETRY_BACKOFF_FACTORS[error_class] * 2 ** (attempt - 1))
+        # equal jitter: نیمی ثابت و نیمی تصادفی
+        return backoff / 2 + random.uniform(0, backoff / 2)
+
+class CircuitBreaker:
+    # closed: عادی | open: همه درخواست‌های میزبان منتظر می‌مانند | half_open: فقط یک درخواست آزمایشی
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.open_until = 0.0
+        self.trips = 0
+        self.probing = False
+        self.probe_started = 0.0
+
+    def allow(self, now):
+        # زمان انتظار تا مجاز شدن درخواست؛ 0 یعنی همین حالا
+        if self.state == "closed":
+            return 0
+        if self.state == "open":
+            if now < self.open_until:
+                return self.open_until - now
+            self.state = "half_open"
+        # درخواست آزمایشی لغوشده هیچ‌وقت نتیجه‌ای گزارش نمی‌کند؛ پس از مدتی آزمایش دیگری مجاز است
+        if self.probing and now - self.probe_started < CIRCUIT_PROBE_TIMEOUT:
+            return 0.5
+        self.probing = True
+        self.probe_started = now
+        return 0
+
+    def success(self):
+        self.state = "closed"
+        self.failures = 0
+        self.trips = 0
+        self.probing = False
+
+    def failure(self, now, retry_after=None):
+        # مقدار بازگشتی: مدت باز ماندن مدار در صورت باز شدن
+        self.failures += 1
+        self.probing = False
+        if retry_after is None and self.state == "closed" and self.failures < self.threshold:
+            return None
+        if self.state != "open":
+            self.trips += 1
+        # در هر بار شکست آزمایش نیمه‌باز، مدت انتظار دو برابر می‌شود
+        cooldown = retry_after if retry_after is not None else min(CIRCUIT_COOLDOWN_MAX, self.cooldown * 2 ** (self.trips - 1))
+        self.state = "open"
+        self.open_until = max(self.open_until, now + cooldown)
+        return cooldown
+
+class HostCircuitBreakers:
+    def __init__(self):
+        self.threshold = DEFAULT_CONFIG["circuit_breaker_threshold"]
+        self.cooldown = DEFAULT_CONFIG["circuit_breaker_cooldown"]
+        self.breakers = {}
+
+    def configure(self, config):
+        self.threshold = config.get("circuit_breaker_threshold", DEFAULT_CONFIG["circuit_breaker_threshold"])
+        self.cooldown = config.get("circuit_breaker_cooldown", DEFAULT_CONFIG["circuit_breaker_cooldown"])
+        for breaker in self.breakers.values():
+            breaker.threshold = self.threshold
+            breaker.cooldown = self.cooldown
+
+    def breaker(self, host):
+        if host not in self.breakers:
+            self.breakers[host] = CircuitBreaker(self.threshold, self.cooldown)
+        return self.breakers[host]
+
+    async def acquire(self, host):
+        # فقط درخواست‌های میزبان معیوب منتظر می‌مانند؛ بقیه میزبان‌ها با سرعت کامل ادامه می‌دهند
+        breaker = self.breaker(host)
+        while True:
+            wait = breaker.allow(time.monotonic())
+            if not wait:
+                return
+            await asyncio.sleep(min(wait, 1.0))
+
+    def success(self, host):
+        breaker = self.breakers.get(host)
+        if breaker and (breaker.state != "closed" or breaker.failures):
+            if breaker.state != "closed":
+                logging.info(f"Circuit closed for {host}.")
+            breaker.success()
+
+    def failure(self, host, error_class, retry_after=None):
+        if error_class not in HOST_FAILURE_CLASSES:
+            # پاسخ دائمی (مثلاً 404) یعنی میزبان سالم است؛ در غیر این صورت فقط نوبت آزمایش آزاد می‌شود
+            if error_class == "permanent":
+                self.success(host)
+            elif host in self.breakers:
+                self.breakers[host].probing = False
+            return None
+        cooldown = self.breaker(host).failure(time.monotonic(), retry_after)
+        if cooldown is not None:
+            logging.warning(f"Circuit open for {host}; pausing requests for {cooldown:.0f} sec.")
+        return cooldown
+
+    def report(self):
+        now = time.monotonic()
+        return {host: {"state": b.state, "failures": b.failures, "retry_in": round(max(0.0, b.open_until - now), 1)}
+                for host, b in self.breakers.items() if b.state != "closed" or b.failures}
+
+host_breakers = HostCircuitBreakers()
+
+# ============================
+# Per-host Connection Tuning (AIMD)
+# ============================
+HOST_TUNING_FILE = "host_tuning.json"
+TUNE_START_CONNECTIONS = 4
+TUNE_INTERVAL = 5.0
+TUNE_MIN_GAIN = 0.05
+TUNE_REPROBE_AFTER = 600
+TUNE_SCAN_AHEAD = 200
+
+class HostTuning:
+    __slots__ = ("limit", "ceiling", "ceiling_until", "rates", "active", "files", "peak", "window_start", "window_bytes", "errors", "changed")
+
+    def __init__(self, limit, rates=None):
+        self.limit = limit
+        self.ceiling = None
+        self.ceiling_until = 0.0
+        # توان عملیاتی مشاهده‌شده (بایت بر ثانیه) برای هر تعداد اتصال
+        self.rates = rates or {}
+        self.active = 0
+        self.files = 0
+        self.peak = 0
+        self.window_start = time.monotonic()
+        self.window_bytes = 0
+        self.errors = 0
+        self.changed = None
+
+class HostTuner:
+    # افزایش جمعی (+1) تا زمانی که توان کل میزبان بهتر می‌شود؛ کاهش ضربی (نصف) با خطا یا 429
+    def __init__(self):
+        self.enabled = DEFAULT_CONFIG["auto_tune_hosts"]
+        self.max_connections = DEFAULT_CONFIG["auto_tune_max_connections"]
+        self.hosts = {}
+        self.loop = None
+        self.on_limit_change = None
+
+    def configure(self, config):
+        self.enabled = bool(config.get("auto_tune_hosts", DEFAULT_CONFIG["auto_tune_hosts"]))
+        self.max_connections = max(1, int(config.get("auto_tune_max_connections", DEFAULT_CONFIG["auto_tune_max_connections"])))
+
+    def state(self, host):
+        if host not in self.hosts:
+            self.hosts[host] = HostTuning(min(TUNE_START_CONNECTIONS, self.max_connections))
+        return self.hosts[host]
+
+    def limit(self, host):
+        return min(self.state(host).limit, self.max_connections) if self.enabled else None
+
+    def has_room(self, host):
+        # آیا فایل دیگری از این میزبان می‌تواند شروع شود
+        if not self.enabled:
+            return True
+        state = self.state(host)
+        return state.files < min(state.limit, self.max_connections)
+
+    @asynccontextmanager
+    async def connection(self, host):
+        state = self.state(host)
+        if self.loop is not asyncio.get_running_loop():
+            # Eventها به حلقه سازنده وابسته‌اند؛ worker جدید حلقه جدیدی دارد
+            self.loop = asyncio.get_running_loop()
+            for other in self.hosts.values():
+                other.changed = None
+        if self.enabled:
+            while state.active >= min(state.limit, self.max_connections):
+                if state.changed is None:
+                    state.changed = asyncio.Event()
+                state.changed.clear()
+                await state.changed.wait()
+        state.active += 1
+        state.peak = max(state.peak, state.active)
+        try:
+            yield
+        finally:
+            state.active -= 1
+            if state.changed:
+                state.changed.set()
+
+    def record(self, host, nbytes):
+        state = self.state(host)
+        state.window_bytes += nbytes
+        now = time.monotonic()
+        if now - state.window_start >= TUNE_INTERVAL:
+            self.evaluate(host, state, now)
+
+    def failure(self, host, error_class):
+        if error_class in HOST_FAILURE_CLASSES:
+            state = self.state(host)
+            state.errors += 1
+            self.evaluate(host, state, time.monotonic())
+
+    def evaluate(self, host, state, now):
+        elapsed = now - state.window_start
+        limit = state.limit
+        if state.errors:
+            # کاهش ضربی؛ سقف فعلی تا مدتی دوباره امتحان نمی‌شود
+            state.ceiling = limit
+            state.ceiling_until = now + TUNE_REPROBE_AFTER
+            state.limit = max(1, limit // 2)
+        elif elapsed >= TUNE_INTERVAL and state.peak >= limit:
+            # فقط پنجره‌هایی که از همه اتصال‌های مجاز استفاده کرده‌اند معیار مقایسه هستند
+            rate = state.window_bytes / elapsed
+            previous = state.rates.get(limit)
+            state.rates[limit] = rate if previous is None else 0.5 * previous + 0.5 * rate
+            lower = state.rates.get(limit - 1)
+            if now >= state.ceiling_until:
+                state.ceiling = None
+            if lower is not None and state.rates[limit] < lower * (1 + TUNE_MIN_GAIN):
+                # افزایش اتصال سودی نداشته است
+                state.ceiling = limit
+                state.ceiling_until = now + TUNE_REPROBE_AFTER
+                state.limit = limit - 1
+            elif limit < self.max_connections and (state.ceiling is None or limit + 1 < state.ceiling):
+                state.limit = limit + 1
+            elif lower is None and limit > 1:
+                # سطح پایین‌تر هنوز اندازه‌گیری نشده است؛ شاید با اتصال کمتر همین توان به دست آید
+                state.limit = limit - 1
+        elif elapsed < TUNE_INTERVAL:
+            return
+        state.window_start = now
+        state.window_bytes = 0
+        state.errors = 0
+        state.peak = state.active
+        if state.limit != limit:
+            logging.info(f"Connection limit for {host}: {limit} -> {state.limit}")
+            if state.changed:
+                state.changed.set()
+            if self.on_limit_change:
+                self.on_limit_change()
+
+    def load(self, path=HOST_TUNING_FILE):
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for host, entry in data.items():
+                self.hosts[host] = HostTuning(max(1, int(entry["limit"])), {int(k): v for k, v in entry.get("rates", {}).items()})
+        except Exception as e:
+            logging.error(f"Error loading host tuning: {e}")
+
+    def save(self, path=HOST_TUNING_FILE):
+        # حد یادگرفته‌شده هر میزبان برای شروع اجرای بعدی در همان سطح ذخیره می‌شود؛ بدون تنظیم خودکار چیزی یاد گرفته نشده است
+        if not self.enabled:
+            return
+        data = {host: {"limit": state.limit, "rates": {str(k): round(v) for k, v in sorted(state.rates.items())}}
+                for host, state in list(self.hosts.items()) if state.rates or state.limit != TUNE_START_CONNECTIONS}
+        try:
+            # پردازه‌های موتور هر کدام میزبان‌های خود را ذخیره می‌کنند؛ ورودی‌های دیگر حفظ می‌شوند
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    data = {**json.load(f), **data}
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=4)
+            os.replace(temp_path, path)
+        except (OSError, ValueError) as e:
+            logging.error(f"Error saving host tuning: {e}")
+
+host_tuner = HostTuner()
+host_tuner.load()
+
+# ============================
+# Event Loop and Socket Tuning
+# ============================
+try:
+    import uvloop
+except ImportError:  # ویندوز یا نصب‌نشده
+    uvloop = None
+
+def event_loop_name(config):
+    return "uvloop" if uvloop and config.get("use_uvloop", DEFAULT_CONFIG["use_uvloop"]) else "asyncio"
+
+def run_event_loop(coroutine, config):
+    # uvloop در صورت نصب و فعال بودن؛ در غیر این صورت حلقه پیش‌فرض asyncio
+    if event_loop_name(config) == "uvloop" and hasattr(asyncio, "Runner"):
+        with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+            return runner.run(coroutine)
+    return asyncio.run(coroutine)
+
+def make_socket_factory(config):
+    nodelay = config.get("tcp_nodelay", DEFAULT_CONFIG["tcp_nodelay"])
+    recv_buffer = int(config.get("socket_recv_buffer", DEFAULT_CONFIG["socket_recv_buffer"]) or 0)
+
+    def create_socket(addr_info):
+        family, type_, proto, _, _ = addr_info
+        sock = socket.socket(family=family, type=type_, proto=proto)
+        if nodelay:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if recv_buffer:
+            # پیش از connect تنظیم می‌شود تا در window scaling اثر داشته باشد؛ 0 یعنی تنظیم خودکار سیستم‌عامل
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, recv_buffer)
+        return sock
+    return create_socket
+
+def make_connector(ssl_context, config):
+    try:
+        return aiohttp.TCPConnector(ssl=ssl_context, socket_factory=make_socket_factory(config))
+    except TypeError:
+        # aiohttp قدیمی‌تر از 3.12 پارامتر socket_factory ندارد
+        return aiohttp.TCPConnector(ssl=ssl_context)
+
+# ============================
+# Executors (Disk I/O Threads, CPU Process Pool, Backpressure)
+# ============================
+WRITE_BATCH_BYTES = 256 * 1024
+CPU_OFFLOAD_BYTES = 1024 * 1024
+
+class EngineExecutors:
+    # کارهای مسدودکننده از حلقه شبکه خارج می‌شوند: نخ‌ها برای دیسک و شبکه همگام، پردازه‌ها برای کار پردازشی سنگین.
+    # تعداد کارهای در انتظار هر مخزن محدود است و فراخواننده تا آزاد شدن جا منتظر می‌ماند
+    def __init__(self):
+        self.io_threads = DEFAULT_CONFIG["io_threads"]
+        self.cpu_processes = DEFAULT_CONFIG["cpu_processes"]
+        self.queue_depth = DEFAULT_CONFIG["executor_queue_depth"]
+        self.io_pool = None
+        self.cpu_pool = None
+        self.loop = None
+        self.slots = {}
+        self.pending = {"io": 0, "cpu": 0}
+
+    def configure(self, config):
+        # اندازه مخزن‌ها از ساخت بعدی اعمال می‌شود
+        self.io_threads = max(1, int(config.get("io_threads", DEFAULT_CONFIG["io_threads"])))
+        self.cpu_processes = max(0, int(config.get("cpu_processes", DEFAULT_CONFIG["cpu_processes"])))
+        self.queue_depth = max(1, int(config.get("executor_queue_depth", DEFAULT_CONFIG["executor_queue_depth"])))
+
+    def slot(self, kind):
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            self.loop = loop
+            self.slots = {}
+        if kind not in self.slots:
+            self.slots[kind] = asyncio.Semaphore(self.queue_depth)
+        return self.slots[kind]
+
+    async def submit(self, kind, pool, func, *args):
+        async with self.slot(kind):
+            self.pending[kind] += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+            finally:
+                self.pending[kind] -= 1
+
+    async def io(self, func, *args):
+        if self.io_pool is None:
+            self.io_pool = ThreadPoolExecutor(max_workers=self.io_threads, thread_name_prefix="linkstorm-io")
+        return await self.submit("io", self.io_pool, func, *args)
+
+    async def cpu(self, func, *args):
+        # func و آرگومان‌ها باید قابل pickle باشند؛ بدون پردازه، در همین نخ اجرا می‌شود
+        if not self.cpu_processes:
+            return func(*args)
+        if self.cpu_pool is None:
+            self.cpu_pool = ProcessPoolExecutor(max_workers=self.cpu_processes, mp_context=mp.get_context("spawn"))
+        try:
+            return await self.submit("cpu", self.cpu_pool, func, *args)
+        except BrokenProcessPool as e:
+            logging.warning(f"CPU worker process died ({e}); running {func.__name__} inline.")
+            self.cpu_pool = None
+            return func(*args)
+
+    def shutdown(self):
+        if self.io_pool:
+            self.io_pool.shutdown(wait=True)
+            self.io_pool = None
+        if self.cpu_pool:
+            self.cpu_pool.shutdown(wait=False, cancel_futures=True)
+            self.cpu_pool = None
+
+executors = EngineExecutors()
+
+class ChunkWriter:
+    # write-behind: تکه‌ها تا WRITE_BATCH_BYTES جمع و در نخ I/O نوشته می‌شوند؛
+    # برای هر جریان حداکثر یک دسته در حال نوشتن است، پس حافظه و عقب‌ماندگی دیسک محدود می‌ماند.
+    # هر تکه از لحظه خواندن تا پایان نوشتن از memory_budget کسر می‌شود
+    def __init__(self, write_batch, batch_bytes=WRITE_BATCH_BYTES):
+        self.write_batch = write_batch
+        self.batch_bytes = batch_bytes
+        self.chunks = []
+        self.size = 0
+        self.context = None
+        self.pending = None
+        memory_budget.streams += 1
+
+    async def read(self, content, size):
+        size = memory_budget.read_size(size)
+        if not memory_budget.available(size):
+            # داده جمع‌شده همین جریان نوشته می‌شود تا بودجه آزاد شود
+            await self.flush()
+        await memory_budget.acquire(size)
+        try:
+            chunk = await content.read(size)
+        except BaseException:
+            memory_budget.release(size)
+            raise
+        memory_budget.release(size - len(chunk))
+        return chunk
+
+    async def add(self, chunk, context=None):
+        if not self.chunks:
+            self.context = context
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        if self.size >= self.batch_bytes:
+            await self.flush()
+
+    async def wait(self):
+        if self.pending:
+            pending, self.pending = self.pending, None
+            await pending
+
+    async def flush(self):
+        await self.wait()
+        if self.chunks:
+            data = self.chunks[0] if len(self.chunks) == 1 else b"".join(self.chunks)
+            context = self.context
+            self.chunks, self.size = [], 0
+            self.pending = asyncio.ensure_future(self.write(context, data))
+
+    async def write(self, context, data):
+        try:
+            await executors.io(self.write_batch, context, data)
+        finally:
+            memory_budget.release(len(data))
+
+    async def close(self):
+        # داده دریافت‌شده پیش از بازگشت (از جمله هنگام خطا، مکث یا لغو) روی دیسک است
+        try:
+            await self.flush()
+            await self.wait()
+        finally:
+            memory_budget.streams -= 1
+            memory_budget.release(self.size)
+            self.chunks, self.size = [], 0
+
+# ============================
+# Transports (HTTP/1.1 via aiohttp, Optional HTTP/2 via httpx)
+# ============================
+try:
+    import httpx
+    import h2  # httpx بدون این بسته HTTP/2 را مذاکره نمی‌کند
+    # httpx هر درخواست را در سطح INFO ثبت می‌کند
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+except ImportError:
+    httpx = None
+
+TRANSPORT_MODES = ("auto", "http1", "http2")
+ALPN_PROBE_TIMEOUT = 5
+# پروتکل انتخاب‌شده برای هر (میزبان، پورت)؛ برای تمام عمر برنامه نگه داشته می‌شود
+host_protocols = {}
+
+async def negotiate_alpn(host, port):
+    context = ssl.create_default_context()
+    context.set_alpn_protocols(["h2", "http/1.1"])
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port, ssl=context, server_hostname=host), ALPN_PROBE_TIMEOUT)
+    except (OSError, asyncio.TimeoutError) as e:
+        logging.warning(f"ALPN negotiation with {host}:{port} failed: {e}")
+        return "http/1.1"
+    try:
+        return writer.get_extra_info("ssl_object").selected_alpn_protocol() or "http/1.1"
+    finally:
+        writer.close()
+
+class Http2Content:
+    # همان رابط resp.content.read(n) در aiohttp
+    def __init__(self, response):
+        self.chunks = response.aiter_bytes()
+        self.buffer = b""
+
+    async def read(self, n=-1):
+        if not self.buffer:
+            try:
+                self.buffer = await self.chunks.__anext__()
+            except StopAsyncIteration:
+                return b""
+        if n < 0 or n >= len(self.buffer):
+            data, self.buffer = self.buffer, b""
+        else:
+            data, self.buffer = self.buffer[:n], self.buffer[n:]
+        return data
+
+class Http2Response:
+    def __init__(self, response):
+        self.response = response
+        self.status = response.status_code
+        self.headers = response.headers
+        self.content = Http2Content(response)
+
+    async def read(self):
+        data = self.content.buffer
+        async for chunk in self.content.chunks:
+            data += chunk
+        self.content.buffer = b""
+        return data
+
+class Http2Transport:
+    # چندین درخواست هم‌زمان به صورت stream روی یک اتصال TLS
+    def __init__(self, ssl_context):
+        self.client = httpx.AsyncClient(http2=True, verify=ssl_context, follow_redirects=True, limits=httpx.Limits(max_connections=None, max_keepalive_connections=None))
+
+    @asynccontextmanager
+    async def get(self, url, headers=None, timeout=30, ssl=None):
+        async with self.client.stream("GET", url, headers=headers, timeout=timeout) as response:
+            yield Http2Response(response)
+
+    async def close(self):
+        await self.client.aclose()
+
+class TransportSession:
+    # رابط session.get همانند aiohttp؛ برای هر میزبان HTTPS پس از مذاکره ALPN بین HTTP/1.1 و HTTP/2 انتخاب می‌شود
+    def __init__(self, session, ssl_context, config):
+        self.http1 = session
+        self.ssl_context = ssl_context
+        self.config = config
+        self.http2 = None
+        self.probes = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        if self.http2:
+            await self.http2.close()
+            self.http2 = None
+
+    async def protocol(self, url):
+        parsed = urlparse(url)
+        # تنظیمات به صورت زنده خوانده می‌شود؛ worker دائمی است
+        mode = self.config.get("transport", DEFAULT_CONFIG["transport"]) if httpx else "http1"
+        if mode == "http1" or parsed.scheme != "https":
+            return "http/1.1"
+        if mode == "http2":
+            # httpx خود ALPN را مذاکره می‌کند و در صورت نیاز به HTTP/1.1 برمی‌گردد
+            return "h2"
+        key = (parsed.hostname, parsed.port or 443)
+        if key not in host_protocols:
+            task = self.probes.get(key)
+            if task is None:
+                task = self.probes[key] = asyncio.ensure_future(negotiate_alpn(*key))
+                task.add_done_callback(lambda done, key=key: self.probes.pop(key, None) if self.probes.get(key) is done else None)
+            # کاوش بین منتظرها مشترک است؛ لغو یک دانلود نباید آن را برای بقیه لغو کند
+            protocol = await asyncio.shield(task)
+            if key not in host_protocols:
+                host_protocols[key] = protocol
+                logging.info(f"Using {'HTTP/2' if protocol == 'h2' else 'HTTP/1.1'} for {key[0]}:{key[1]}")
+        return host_protocols[key]
+
+    def get(self, url, **kwargs):
+        return self.request(url, kwargs)
+
+    @asynccontextmanager
+    async def request(self, url, kwargs):
+        if await self.protocol(url) == "h2":
+            if self.http2 is None:
+                self.http2 = Http2Transport(self.ssl_context)
+            transport = self.http2
+        else:
+            transport = self.http1
+        async with transport.get(url, **kwargs) as resp:
+            yield resp
+
+# ============================
+# Adaptive Read Size (Throughput-based)
+# ============================
+READ_WINDOW_SECONDS = 1.0
+
+class ReadSizeController:
+    # اندازه خواندن بر اساس توان عملیاتی در یک پنجره لغزان تعیین می‌شود تا تعداد رویدادها در ثانیه ثابت بماند
+    def __init__(self, min_size=8192, max_size=4 * 1024 * 1024, events_per_second=64, stats=None):
+        self.min_size = min_size
+        self.max_size = max(min_size, max_size)
+        self.events_per_second = events_per_second
+        self.size = min_size
+        self.samples = deque()
+        self.window_bytes = 0
+        self.throughput = 0.0
+        self.adjustments = 0
+        self.stats = stats if stats is not None else {}
+
+    @classmethod
+    def from_config(cls, config, stats=None):
+        return cls(
+            config.get("chunk_size", DEFAULT_CONFIG["chunk_size"]),
+            config.get("max_read_size", DEFAULT_CONFIG["max_read_size"]),
+            config.get("read_events_per_second", DEFAULT_CONFIG["read_events_per_second"]),
+            stats
+        )
+
+    def record(self, nbytes):
+        now = time.monotonic()
+        self.samples.append((now, nbytes))
+        self.window_bytes += nbytes
+        while len(self.samples) > 1 and now - self.samples[0][0] > READ_WINDOW_SECONDS:
+            self.window_bytes -= self.samples.popleft()[1]
+        span = max(now - self.samples[0][0], 0.05)
+        self.throughput = self.window_bytes / span
+        target = self.throughput / self.events_per_second
+        size = self.min_size
+        while size * 2 <= target and size * 2 <= self.max_size:
+            size *= 2
+        if size != self.size:
+            self.size = size
+            self.adjustments += 1
+        self.stats["read_size"] = self.size
+        self.stats["throughput_bps"] = int(self.throughput)
+        self.stats["read_size_changes"] = self.adjustments
+        return self.size
+
+# ============================
+# Memory-mapped Output for Segmented Downloads
+# ============================
+MMAP_FLUSH_BYTES = 64 * 1024 * 1024
+
+class MappedFileWriter:
+    # فایل از پیش اندازه‌گذاری‌شده یک بار map می‌شود و هر سگمنت مستقیماً در ناحیه خود کپی می‌کند
+    def __init__(self, file_path, total_size, flush_bytes=MMAP_FLUSH_BYTES):
+        self.file = open(file_path, "r+b")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), total_size)
+        except Exception:
+            self.file.close()
+            raise
+        self.view = memoryview(self.map)
+        self.flush_bytes = flush_bytes
+        self.dirty = 0
+
+    @classmethod
+    def open(cls, file_path, total_size):
+        if total_size > sys.maxsize:
+            logging.warning(f"File too large to map in this process; using regular writes for {file_path}")
+            return None
+        try:
+            return cls(file_path, total_size)
+        except (OSError, ValueError, OverflowError) as e:
+            logging.warning(f"Memory mapping failed for {file_path}: {e}. Using regular writes.")
+            return None
+
+    def write_at(self, offset, data):
+        self.view[offset:offset + len(data)] = data
+        self.dirty += len(data)
+        if self.dirty >= self.flush_bytes:
+            self.flush()
+
+    def flush(self):
+        # msync در لینوکس/مک و FlushViewOfFile در ویندوز
+        self.map.flush()
+        self.dirty = 0
+
+    def close(self):
+        try:
+            self.flush()
+            os.fsync(self.file.fileno())
+        finally:
+            self.view.release()
+            self.map.close()
+            self.file.close()
+
+# ============================
+# Pause and Cancel (Events and Task Cancellation)
+# ============================
+class ConnectionReleased(Exception):
+    # مکث طولانی: اتصال بسته می‌شود و پس از ادامه با درخواست Range از همان نقطه شروع می‌شود
+    pass
+
+class ItemControl:
+    # فقط در حلقه worker تغییر می‌کند؛ نخ رابط کاربری از طریق call_soon_threadsafe به آن دسترسی دارد
+    __slots__ = ("resumed", "task", "release_after")
+
+    def __init__(self, paused=False, release_after=None):
+        self.resumed = asyncio.Event()
+        if not paused:
+            self.resumed.set()
+        self.task = None
+        self.release_after = release_after
+
+    @property
+    def paused(self):
+        return not self.resumed.is_set()
+
+    async def checkpoint(self, release=True):
+        # مکث کوتاه اتصال را نگه می‌دارد؛ پس از release_after ثانیه اتصال آزاد می‌شود
+        if self.resumed.is_set():
+            return
+        if not release or self.release_after is None:
+            await self.resumed.wait()
+            return
+        try:
+            await asyncio.wait_for(self.resumed.wait(), self.release_after)
+        except asyncio.TimeoutError:
+            raise ConnectionReleased() from None
+
 # ============================
 # Multi-connection Download and Adaptive Chunking
 # ============================
-async def download_part(session, url, headers, file_path, start, end, adaptive_threshold, base_chunk):
-    current_chunk = base_chunk
+BLOCK_REPAIR_ROUNDS = 3
+
+async def download_part(session, url, headers, file_path, start, end, controller, hasher=None, ledger=None, mapped=None, control=None, release=True, item=None):
     downloaded = 0
-    with open(file_path, "r+b") as f:
-        f.seek(start)
-    async with session.get(url, headers=headers, timeout=30) as resp:
-        while True:
-            t0 = time.time()
-            chunk = await resp.content.read(current_chunk)
-            t1 = time.time()
-            if not chunk:
-                break
-            with open(file_path, "r+b") as f:
-                f.seek(start + downloaded)
-                f.write(chunk)
-            downloaded += len(chunk)
-            elapsed = t1 - t0
-            if elapsed < adaptive_threshold:
-                current_chunk = min(current_chunk * 2, 65536)
-            elif elapsed > adaptive_threshold * 2:
-                current_chunk = max(current_chunk // 2, 1024)
+    host = urlparse(url).hostname or ""
+    # کلید محدودیت هر فایل نام نهایی آن است، نه نام فایل .part
+    item = item or os.path.basename(file_path)
+    started = time.perf_counter()
+    async with host_tuner.connection(host), session.get(url, headers=headers, timeout=30) as resp:
+        if instrumentation.enabled:
+            instrumentation.add_time("fetch.response", time.perf_counter() - started)
+        if resp.status != 206:
+            raise HTTPStatusError(resp.status, parse_retry_after(resp.headers.get("Retry-After")), f"HTTP response {resp.status} for range request")
+        with bandwidth_limiter.stream(host, item), metrics.connection(), open(file_path, "r+b") if mapped is None else nullcontext() as f:
+            if f:
+                f.seek(start)
+
+            def write_batch(offset, data):
+                # در نخ I/O اجرا می‌شود؛ هش‌ها پس از نوشتن به‌روز می‌شوند
+                with instrumentation.timer("write"):
+                    if mapped:
+                        mapped.write_at(offset, data)
+                    else:
+                        f.write(data)
+                        if hasher:
+                            # هش‌کننده بخش‌های جلوتر را از دیسک می‌خواند؛ داده نباید در بافر بماند
+                            f.flush()
+                if hasher:
+                    hasher.feed(start, offset, data)
+                if ledger:
+                    ledger.feed(offset, data)
+
+            writer = ChunkWriter(write_batch)
+            try:
+                while True:
+                    if control:
+                        await control.checkpoint(release)
+                    with instrumentation.timer("fetch.read"):
+                        chunk = await writer.read(resp.content, min(controller.size, bandwidth_limiter.chunk_limit(host, item) or controller.size))
+                    if not chunk:
+                        break
+                    await writer.add(chunk, start + downloaded)
+                    instrumentation.count("fetch.bytes", len(chunk))
+                    metrics.add_bytes(host, len(chunk))
+                    host_tuner.record(host, len(chunk))
+                    downloaded += len(chunk)
+                    controller.record(len(chunk))
+                    await bandwidth_limiter.throttle(host, item, len(chunk))
+            finally:
+                await writer.close()
     return downloaded
 
-async def multi_connection_download(session, url, file_path, parts, adaptive_threshold, base_chunk):
+# ============================
+# Mirrors (Multi-Source Segmented Download)
+# ============================
+MIRROR_MAX_FAILURES = 3
+MIRROR_PROBE_BYTES = 4096
+SEGMENTS_PER_CONNECTION = 4
+
+class MirrorSource:
+    def __init__(self, url, metadata):
+        self.url = url
+        self.host = urlparse(url).hostname or ""
+        # If-Range با اعتبارسنج همین منبع؛ اگر فایل روی آینه عوض شود پاسخ 200 می‌آید و آینه کنار گذاشته می‌شود
+        self.validator = resume_validator(metadata)
+        self.bytes = 0
+        self.seconds = 0.0
+        self.errors = 0
+        self.failures = 0
+        self.active = True
+
+    def headers(self, start, end):
+        headers = {"Range": f"bytes={start}-{end}"}
+        if self.validator:
+            headers["If-Range"] = self.validator
+        return headers
+
+    def speed(self):
+        return self.bytes / self.seconds if self.seconds else 0
+
+    def record_failure(self, error, streak=None, keep=False):
+        # streak: خطاهای پشت‌سرهم یک اتصال؛ خطاهای هم‌زمان اتصال‌های دیگر با هم جمع نمی‌شوند.
+        # بدون آن (مثلاً بلوک معیوب) خطاها روی خود منبع شمرده می‌شوند
+        self.errors += 1
+        self.failures += 1
+        failures = self.failures if streak is None else streak
+        if failures >= MIRROR_MAX_FAILURES and self.active and not keep:
+            self.active = False
+            logging.warning(f"Dropping mirror {self.url} after {failures} failures: {error}")
+
+    def report(self):
+        return {"url": self.url, "bytes": self.bytes, "speed_bps": round(self.speed()), "errors": self.errors, "status": "Active" if self.active else "Dropped"}
+
+def group_mirrors(links):
+    # لینک‌هایی با نام فایل یکسان روی میزبان‌های مختلف و اندازه برابر، آینه یکدیگر در نظر گرفته می‌شوند
+    groups = {}
+    for link in links:
+        groups.setdefault(url_file_name(link), []).append(link)
+    result = []
+    for primary, *others in groups.values():
+        mirrors = []
+        host = urlparse(primary).hostname
+        if any(urlparse(link).hostname != host for link in others):
+            try:
+                size = probe_metadata(primary)["size"]
+                for link in others:
+                    if size and urlparse(link).hostname != host and probe_metadata(link)["size"] == size:
+                        mirrors.append(link)
+            except Exception as e:
+                logging.warning(f"HEAD check failed while matching mirrors of {primary}: {e}")
+        result.append((primary, mirrors))
+        result.extend((link, []) for link in others if link not in mirrors)
+    return result
+
+async def select_mirrors(session, url, mirrors, total_size):
+    sources = [MirrorSource(url, await executors.io(probe_metadata, url))]
+    candidates = []
+    seen = {normalize_url(url)}
+    for mirror in mirrors:
+        if normalize_url(mirror) not in seen:
+            seen.add(normalize_url(mirror))
+            candidates.append(mirror)
+    results = await asyncio.gather(*(executors.io(probe_metadata, m) for m in candidates), return_exceptions=True)
+    for mirror, metadata in zip(candidates, results):
+        if isinstance(metadata, Exception):
+            logging.warning(f"Ignoring mirror {mirror}: {metadata}")
+        elif metadata["size"] != total_size:
+            logging.warning(f"Ignoring mirror {mirror}: size {metadata['size']} differs from {total_size}.")
+        else:
+            sources.append(MirrorSource(mirror, metadata))
+    if len(sources) == 1:
+        return sources
+    # انتهای فایل از همه منابع خوانده و مقایسه می‌شود تا آینه‌ای با نسخه متفاوت وارد نشود
+    start = max(0, total_size - MIRROR_PROBE_BYTES)
+
+    async def read_tail(source):
+        async with session.get(source.url, headers=source.headers(start, total_size - 1), timeout=30) as resp:
+            if resp.status != 206:
+                raise Exception(f"HTTP response {resp.status} for range request")
+            return await resp.read()
+
+    tails = await asyncio.gather(*(read_tail(source) for source in sources), return_exceptions=True)
+    if isinstance(tails[0], Exception):
+        raise tails[0]
+    agreed = [sources[0]]
+    for source, tail in zip(sources[1:], tails[1:]):
+        if isinstance(tail, Exception) or tail != tails[0]:
+            logging.warning(f"Ignoring mirror {source.url}: content does not match {url}.")
+        else:
+            agreed.append(source)
+    return agreed
+
+async def multi_connection_download(session, url, file_path, parts, controller, hasher=None, ledger=None, use_mmap=False, mirrors=None, stats=None, control=None, item=None, block_size=None, retry_policy=None):
     try:
-        head_resp = requests.head(url, timeout=5)
-        head_resp.raise_for_status()
-        total_size = int(head_resp.headers.get("Content-Length", 0))
+        total_size = (await executors.io(probe_metadata, url))["size"]
     except Exception as e:
         raise Exception("Cannot get file size for multi-connection download.") from e
-    part_size = total_size // parts
-    with open(file_path, "wb") as f:
-        f.truncate(total_size)
-    tasks = []
-    for i in range(parts):
-        start = i * part_size
-        end = total_size - 1 if i == parts - 1 else (start + part_size - 1)
-        headers = {"Range": f"bytes={start}-{end}"}
-        tasks.append(download_part(session, url, headers, file_path, start, end, adaptive_threshold, base_chunk))
-    results = await asyncio.gather(*tasks)
-    return sum(results)
+    if not total_size:
+        raise Exception("Cannot get file size for multi-connection download.")
+    if ledger is None:
+        ledger = BlockLedger(total_size, block_size or DEFAULT_CONFIG["block_size"])
+    sources = await select_mirrors(session, url, mirrors or [], total_size)
+    # سگمنت‌های هم‌اندازه و هم‌مرز با بلوک در یک صف مشترک؛ هر اتصال پس از پایان سگمنت خود سگمنت بعدی را برمی‌دارد
+    # بنابراین سهم هر آینه متناسب با سرعت آن است
+    connections = max(parts, len(sources))
+    blocks_per_segment = max(1, -(-ledger.block_count // (connections * SEGMENTS_PER_CONNECTION)))
+    # بلوک‌های بازیابی‌شده از نقشه سگمنت دوباره دریافت نمی‌شوند؛ هر سگمنت به بازه‌های پیوسته بلوک‌های باقی‌مانده شکسته می‌شود
+    done = set(ledger.completed_blocks())
+    queue = deque()
+    for first in range(0, ledger.block_count, blocks_per_segment):
+        run = None
+        for index in range(first, min(first + blocks_per_segment, ledger.block_count)):
+            if index in done:
+                if run:
+                    queue.append(run)
+                run = None
+                continue
+            start, end = ledger.block_range(index)
+            run = (run[0], end) if run else (start, end)
+        if run:
+            queue.append(run)
+    block_sources = {}
+    in_flight = 0
+    downloaded = sum(ledger.filled[index] for index in done)
+    if done and os.path.exists(file_path) and os.path.getsize(file_path) == total_size:
+        if hasher:
+            for first, last in compact_blocks(done):
+                hasher.skip_written(ledger.block_range(first)[0], ledger.block_range(last)[1] + 1)
+    else:
+        await executors.io(preallocate_file, file_path, total_size)
+    mapped = MappedFileWriter.open(file_path, total_size) if use_mmap else None
+    validator = sources[0].validator
+    map_lock = asyncio.Lock()
+
+    async def save_map():
+        async with map_lock:
+            await executors.io(save_segment_map, file_path, ledger, validator)
+
+    def unwritten(start, end, source):
+        # بایت‌هایی که روی دیسک نوشته شده‌اند نگه داشته می‌شوند؛ درخواست بعدی با Range از ادامه همان بلوک شروع می‌شود
+        nonlocal downloaded
+        index = start // ledger.block_size
+        last = end // ledger.block_size
+        while index <= last and ledger.digests[index] is not None:
+            block_sources[index] = source
+            index += 1
+        resume = end + 1
+        if index <= last:
+            # هشِ در جریان بلوک ناقص با همان ترتیب بایت‌ها ادامه پیدا می‌کند
+            resume = ledger.block_range(index)[0] + ledger.filled[index]
+            for rest in range(index + 1, last + 1):
+                ledger.reset_block(rest)
+        downloaded += resume - start
+        return (resume, end) if resume <= end else None
+    retry_policy = retry_policy or RetryPolicy.from_config(DEFAULT_CONFIG)
+    # وقتی همه سگمنت‌ها تمام شدند منتظر اتصال‌هایی که پشت مدارشکن یا تأخیر مانده‌اند نمی‌مانیم
+    finished = asyncio.Event()
+
+    async def fetch_segments(source):
+        nonlocal in_flight, downloaded
+        streak = 0
+        while source.active:
+            if not queue:
+                if not in_flight:
+                    return
+                # سگمنت‌های در حال دریافت ممکن است با خطا به صف برگردند
+                await asyncio.sleep(0.1)
+                continue
+            if control and control.paused:
+                # در زمان مکث سگمنت جدیدی شروع نمی‌شود
+                await control.resumed.wait()
+                continue
+            await host_breakers.acquire(source.host)
+            if not queue or not source.active:
+                host_breakers.breaker(source.host).probing = False
+                continue
+            start, end = queue.popleft()
+            in_flight += 1
+            began = time.monotonic()
+            try:
+                received = await download_part(session, source.url, source.headers(start, end), file_path, start, end, controller, hasher, ledger, mapped, control, item=item)
+            except Exception as e:
+                if is_disk_full(e):
+                    raise
+                segment = unwritten(start, end, source)
+                if isinstance(e, ConnectionReleased):
+                    if segment:
+                        queue.appendleft(segment)
+                    continue
+                streak += 1
+                error_class = classify_error(e)
+                retry_after = getattr(e, "retry_after", None)
+                # آخرین منبع فعال با خطای گذرا کنار گذاشته نمی‌شود؛ فقط با تأخیر دوباره تلاش می‌شود
+                last_source = not any(other.active for other in sources if other is not source)
+                source.record_failure(e, streak, keep=last_source and error_class in HOST_FAILURE_CLASSES)
+                metrics.count_retry(source.host)
+                host_breakers.failure(source.host, error_class, retry_after)
+                host_tuner.failure(source.host, error_class)
+                logging.warning(f"Segment {start}-{end} from {source.url} failed: {e}")
+                if source.active and retry_policy.should_retry(error_class, streak):
+                    # سگمنت پس از تأخیر به صف برمی‌گردد؛ تا آن زمان in_flight بقیه اتصال‌ها را منتظر نگه می‌دارد
+                    await asyncio.sleep(retry_policy.delay(error_class, streak, retry_after))
+                    if segment:
+                        queue.appendleft(segment)
+                    continue
+                # منبع کنار رفته یا این اتصال تلاش‌هایش را تمام کرده است؛ سگمنت برای اتصال‌های دیگر می‌ماند
+                if segment:
+                    queue.appendleft(segment)
+                if source.active:
+                    return
+                continue
+            finally:
+                in_flight -= 1
+            streak = 0
+            source.failures = 0
+            host_breakers.success(source.host)
+            source.bytes += received
+            source.seconds += time.monotonic() - began
+            metrics.observe_segment(received, time.monotonic() - began)
+            downloaded += received
+            for index in range(start // ledger.block_size, end // ledger.block_size + 1):
+                block_sources[index] = source
+            if not queue and not in_flight:
+                finished.set()
+            else:
+                await save_map()
+
+    def repair_source(index):
+        # بلوک معیوب در صورت امکان از منبع دیگری دریافت می‌شود
+        bad_source = block_sources.get(index)
+        candidates = [s for s in sources if s.active and s is not bad_source] or [s for s in sources if s.active]
+        if not candidates:
+            raise Exception("No mirror left to re-fetch corrupt blocks.")
+        return max(candidates, key=MirrorSource.speed)
+
+    try:
+        workers = [asyncio.ensure_future(fetch_segments(sources[i % len(sources)])) for i in range(connections)]
+        waiter = asyncio.ensure_future(finished.wait())
+        running = set(workers)
+        try:
+            while running and not waiter.done():
+                done, _ = await asyncio.wait(running | {waiter}, return_when=asyncio.FIRST_COMPLETED)
+                for worker in done - {waiter}:
+                    running.discard(worker)
+                    if worker.exception():
+                        raise worker.exception()
+        finally:
+            waiter.cancel()
+            for worker in workers:
+                worker.cancel()
+        if queue:
+            raise Exception(f"All sources failed for {os.path.basename(file_path)}; {len(queue)} segment(s) left.")
+        for round_number in range(1, BLOCK_REPAIR_ROUNDS + 1):
+            bad_blocks = ledger.mismatched_blocks()
+            if not bad_blocks:
+                break
+            # فقط بلوک‌های معیوب دوباره دریافت می‌شوند
+            logging.warning(f"{len(bad_blocks)} corrupt block(s) in {os.path.basename(file_path)}; re-fetching (round {round_number}).")
+            tasks = []
+            for index in bad_blocks:
+                if index in block_sources and ledger.expected:
+                    block_sources[index].record_failure("corrupt block")
+                source = repair_source(index)
+                block_sources[index] = source
+                ledger.reset_block(index)
+                start, end = ledger.block_range(index)
+                tasks.append(download_part(session, source.url, source.headers(start, end), file_path, start, end, controller, None, ledger, mapped, control, False, item=item))
+            downloaded += sum(await asyncio.gather(*tasks))
+            ledger.repaired += len(bad_blocks)
+        else:
+            bad_blocks = ledger.mismatched_blocks()
+    finally:
+        if mapped:
+            mapped.close()
+        # پس از خطا، مکث طولانی یا لغو، ادامه از بلوک‌های کامل‌شده انجام می‌شود
+        save_segment_map(file_path, ledger, validator)
+        if stats is not None and len(sources) > 1:
+            stats["mirrors"] = [source.report() for source in sources]
+    if bad_blocks:
+        raise Exception(f"{len(bad_blocks)} block(s) failed verification after {BLOCK_REPAIR_ROUNDS} repair rounds.")
+    if hasher and ledger.repaired:
+        # هش کل فایل شامل داده معیوب بوده است؛ پس از ترمیم از ابتدا محاسبه می‌شود
+        hasher.reset()
+    return downloaded
 
 # ============================
 # DownloadWorker Class with Advanced Techniques and Resource Optimization
@@ -315,38 +2723,326 @@ class DownloadWorker(QtCore.QThread):
     log_message = QtCore.Signal(str)
     download_canceled = QtCore.Signal(str)
     all_downloads_complete = QtCore.Signal()
+    links_discovered = QtCore.Signal(str, list)
 
-    def __init__(self, download_list, folder, config):
+    def __init__(self, download_list, folder, config, checksums=None, dedup=None, mirrors=None, keep_alive=False, priorities=None):
         super().__init__()
         self.download_list = download_list[:]  
         self.download_folder = folder
         self.config = config
+        self.checksums = checksums if checksums is not None else {}
+        self.dedup = dedup if dedup is not None else DedupIndex()
+        self.mirrors = mirrors if mirrors is not None else {}
+        self.priorities = priorities if priorities is not None else {}
         self.analytics = {}  
         self.cancel_flags = {}
         self.pause_flags = {}
+        # در حالت keep_alive نخ و حلقه رویداد پس از اتمام صف باقی می‌مانند و موارد جدید را با submit می‌پذیرند
+        self.keep_alive = keep_alive
+        self.inbox = deque(self.download_list)
+        self.loop = None
+        self.wakeup = None
+        self.session = None
+        self.pending = deque()
+        self.pending_dirty = False
+        self.queued = set()
+        self.tasks = {}
+        self.controls = {}
+        self.total = 0
+        self.completed = 0
+        self.stopping = False
+        self.monitor = None
+        self.shards = None
+
+    def submit(self, urls):
+        # از هر نخی قابل فراخوانی است؛ موارد در حلقه worker زمان‌بندی می‌شوند
+        self.inbox.extend(urls)
+        self.notify()
+
+    def stop(self):
+        self.stopping = True
+        self.notify()
+
+    def cancel_all(self):
+        # در حالت چندپردازه‌ای موارد در حال اجرا فقط در controls هستند
+        for file_name in list(self.analytics.keys()) + list(self.controls.keys()):
+            self.cancel_flags[file_name] = True
+        self.call_in_loop(self.drop_pending)
+        self.call_in_loop(self.interrupt_canceled)
+
+    def call_in_loop(self, callback, *args):
+        loop = self.loop
+        if loop and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(callback, *args)
+            except RuntimeError:
+                pass
+
+    def interrupt_canceled(self):
+        # لغو task بلافاصله پاسخ HTTP و فایل‌ها را می‌بندد؛ منتظر chunk بعدی نمی‌ماند
+        for file_name, control in list(self.controls.items()):
+            if self.cancel_flags.get(file_name, False) and control.task:
+                control.task.cancel()
+
+    def apply_limits(self):
+        # تغییر محدودیت‌ها در زمان اجرا؛ در حالت تک‌پردازه‌ای همان bandwidth_limiter مشترک کافی است
+        if self.shards:
+            self.shards.send_limits()
+
+    def apply_pause(self, file_name):
+        if self.shards:
+            self.shards.pause(file_name, self.pause_flags.get(file_name, False))
+        control = self.controls.get(file_name)
+        if control:
+            if self.pause_flags.get(file_name, False):
+                control.resumed.clear()
+            else:
+                control.resumed.set()
+
+    def drop_pending(self):
+        # موارد شروع‌نشده بدون اعلان جداگانه از صف worker حذف می‌شوند
+        dropped = len(self.pending) + len(self.inbox)
+        self.inbox.clear()
+        while self.pending:
+            self.queued.discard(self.pending.popleft())
+            self.completed += 1
+        if dropped:
+            self.log_message.emit(f"Dropped {dropped} queued item(s).")
+            self.overall_progress.emit(self.completed, self.total)
+        self.wakeup.set()
+
+    def notify(self):
+        loop = self.loop
+        if loop and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self.wakeup.set)
+            except RuntimeError:
+                pass
+
+    @property
+    def busy(self):
+        return bool(self.tasks or self.pending or self.inbox)
 
     def cancel_download(self, file_name):
         self.cancel_flags[file_name] = True
+        self.call_in_loop(self.interrupt_canceled)
         self.log_message.emit(f"Cancel request received for {file_name}.")
         logging.info(f"Cancel download: {file_name}")
 
     def pause_resume_download(self, file_name):
         current = self.pause_flags.get(file_name, False)
         self.pause_flags[file_name] = not current
+        self.call_in_loop(self.apply_pause, file_name)
         action = tr("pause", self.config.get("language", "en")) if not current else tr("resume", self.config.get("language", "en"))
         self.log_message.emit(f"{action} requested for {file_name}.")
         logging.info(f"{action} download: {file_name}")
 
+    def complete_duplicates(self, file_name, final_path, hash_algorithm=None, digest=None):
+        link_mode = self.config.get("dedup_link_mode", DEFAULT_CONFIG["dedup_link_mode"])
+        if digest and link_mode == "hardlink" and self.config.get("dedup_by_hash", DEFAULT_CONFIG["dedup_by_hash"]):
+            existing = self.dedup.register_hash(f"{hash_algorithm}:{digest}", final_path)
+            if existing:
+                try:
+                    link_or_copy(existing, final_path, link_mode)
+                    self.log_message.emit(f"{file_name} is identical to {os.path.basename(existing)}; stored as a hard link.")
+                except OSError as e:
+                    logging.warning(f"Hash deduplication failed for {file_name}: {e}")
+        # مواردی با محتوای یکسان (اندازه و ETag) فقط یک بار دانلود و سپس لینک/کپی می‌شوند
+        for alias in self.dedup.aliases_of(file_name):
+            alias_path = os.path.join(self.download_folder, alias)
+            try:
+                how = link_or_copy(final_path, alias_path, link_mode)
+            except OSError as e:
+                self.file_error.emit(alias, f"Cannot create {alias} from {file_name}: {e}")
+                continue
+            self.analytics[alias] = {"start": time.time(), "end": time.time(), "errors": 0, "downloaded_bytes": 0, "status": "Completed"}
+            self.progress_update.emit(alias, 100)
+            self.file_complete.emit(alias)
+            self.log_message.emit(f"{alias} has the same content as {file_name}; created by {how}.")
+
+    def fail_download(self, file_name, error_msg):
+        self.analytics[file_name]["status"] = "Failed"
+        self.analytics[file_name]["end"] = time.time()
+        self.file_error.emit(file_name, error_msg)
+        self.log_message.emit(error_msg)
+        logging.error(error_msg)
+
+    def verify_checksum(self, file_name, actual, checksum):
+        algorithm, expected = checksum
+        if actual == expected:
+            self.analytics[file_name]["checksum"] = "Verified"
+            self.log_message.emit(f"Checksum verified ({algorithm}) for {file_name}.")
+            logging.info(f"Checksum verified ({algorithm}) for {file_name}.")
+            return True
+        error_msg = f"Checksum mismatch ({algorithm}) for {file_name}: expected {expected}, got {actual}"
+        self.analytics[file_name]["checksum"] = "Mismatch"
+        self.analytics[file_name]["status"] = "Corrupt"
+        self.analytics[file_name]["end"] = time.time()
+        self.file_error.emit(file_name, error_msg)
+        self.log_message.emit(error_msg)
+        logging.error(error_msg)
+        return False
+
     def run(self):
-        asyncio.run(self.process_downloads())
+        run_event_loop(self.process_downloads(), self.config)
 
     async def process_downloads(self):
-        total = len(self.download_list)
-        self.overall_progress.emit(0, total)
+        self.loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
         ssl_context = ssl.create_default_context()
-        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=ssl_context)) as session:
-            tasks = [self.download_file(session, url, idx, total) for idx, url in enumerate(self.download_list, start=1)]
-            await asyncio.gather(*tasks)
+        # یک context ثابت برای دانلودهای تک‌اتصالی؛ aiohttp اتصال‌ها را بر اساس همین شیء در مخزن نگه می‌دارد
+        # و ساختن context جدید برای هر درخواست، استفاده مجدد از اتصال‌ها را غیرممکن می‌کرد
+        self.stream_ssl_context = ssl.create_default_context()  # Creating an SSL context for secure connections.
+        self.stream_ssl_context.check_hostname = False  # This disables hostname checking if needed, though you can set it to True for security.
+        memory_budget.configure(self.config)
+        read_bufsize = memory_budget.socket_buffer(self.config)
+        # یک session و مخزن اتصال برای تمام عمر worker؛ بین دسته‌ها بسته نمی‌شود
+        logging.info(f"Download engine running on the {'uvloop' if type(self.loop).__module__.startswith('uvloop') else 'asyncio'} event loop.")
+        async with aiohttp.ClientSession(connector=make_connector(ssl_context, self.config), read_bufsize=read_bufsize) as http1, \
+                TransportSession(http1, ssl_context, self.config) as session:
+            self.session = session
+            processes = int(self.config.get("engine_processes", DEFAULT_CONFIG["engine_processes"]))
+            if processes > 1:
+                self.shards = EngineShards(self, processes, self.config.get("engine_shard_by", DEFAULT_CONFIG["engine_shard_by"]))
+                self.shards.start()
+            while not self.stopping:
+                while self.inbox:
+                    self.schedule(self.inbox.popleft())
+                self.launch_pending()
+                if not self.tasks:
+                    if self.total:
+                        self.finish_batch()
+                    if not self.keep_alive:
+                        break
+                await self.wakeup.wait()
+                self.wakeup.clear()
+            self.pending.clear()
+            if self.tasks:
+                # بستن برنامه: دانلودهای جاری متوقف می‌شوند و فایل‌های .part برای ادامه باقی می‌مانند
+                for task in self.tasks.values():
+                    task.cancel()
+                await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+                self.finish_batch()
+            if self.shards:
+                self.shards.close()
+                self.shards = None
+        executors.shutdown()
+        self.session = None
+
+    def schedule(self, url):
+        if url in self.queued:
+            return
+        if not self.total:
+            self.start_batch()
+        file_name = self.dedup.file_name(url)
+        self.cancel_flags.pop(file_name, None)
+        self.pause_flags.pop(file_name, None)
+        self.queued.add(url)
+        self.pending.append(url)
+        self.pending_dirty = True
+        self.total += 1
+        self.overall_progress.emit(self.completed, self.total)
+
+    def launch_pending(self):
+        # همه موارد (از جمله لینک‌های کشف‌شده) از یک بودجه هم‌زمانی مشترک استفاده می‌کنند؛
+        # سقف در هر بار از تنظیمات خوانده می‌شود تا تغییر آن بدون راه‌اندازی مجدد اعمال شود
+        limit = max(1, int(self.config.get("concurrent_downloads", DEFAULT_CONFIG["concurrent_downloads"])))
+        if self.pending_dirty:
+            # موارد جدید (از رابط کاربری یا کشف‌شده) طبق سیاست صف در جای خود قرار می‌گیرند
+            self.pending = deque(self.order(self.pending))
+            self.pending_dirty = False
+        while self.pending and len(self.tasks) < limit:
+            url = self.next_launchable()
+            if url is None:
+                break
+            file_name = self.dedup.file_name(url)
+            if self.cancel_flags.get(file_name, False):
+                # پیش از شروع لغو شده است
+                self.queued.discard(url)
+                self.completed += 1
+                self.download_canceled.emit(file_name)
+                self.overall_progress.emit(self.completed, self.total)
+                continue
+            host_tuner.state(urlparse(url).hostname or "").files += 1
+            control = ItemControl(self.pause_flags.get(file_name, False), self.config.get("pause_release_after", DEFAULT_CONFIG["pause_release_after"]))
+            self.controls[file_name] = control
+            task = asyncio.ensure_future(self.run_item(url, file_name, self.completed + len(self.tasks) + 1))
+            control.task = task
+            self.tasks[url] = task
+            task.add_done_callback(functools.partial(self.item_done, url, file_name))
+
+    async def run_item(self, url, file_name, idx):
+        try:
+            allowed_extensions = self.config.get("allowed_extensions", DEFAULT_CONFIG["allowed_extensions"])
+            if self.shards and any(url.lower().endswith(ext) for ext in allowed_extensions):
+                # صفحات index در هماهنگ‌کننده باز می‌شوند تا لینک‌های کشف‌شده در همین صف قرار گیرند
+                await self.shards.download(url, file_name)
+            else:
+                await self.download_file(self.session, url, idx, self.total)
+        except asyncio.CancelledError:
+            if self.stopping or not self.cancel_flags.get(file_name, False):
+                raise
+            # فایل .part برای ادامه احتمالی باقی می‌ماند
+            self.log_message.emit(f"Download canceled for {file_name}.")
+            logging.info(f"Download canceled: {file_name}")
+            self.analytics.setdefault(file_name, {"start": time.time(), "errors": 0, "downloaded_bytes": 0})
+            self.analytics[file_name]["status"] = "Canceled"
+            self.analytics[file_name]["end"] = time.time()
+            self.download_canceled.emit(file_name)
+
+    def resort_pending(self):
+        self.pending_dirty = True
+        self.launch_pending()
+
+    def order(self, urls):
+        policy = self.config.get("queue_policy", DEFAULT_CONFIG["queue_policy"])
+        if policy == "fifo":
+            return list(urls)
+        return order_queue(urls, policy, self.dedup.file_name, priority_of=lambda url: self.priorities.get(self.dedup.file_name(url), 0))
+
+    def next_launchable(self):
+        # اولین مورد صف که میزبانش هنوز به سقف اتصال یادگرفته‌شده نرسیده است
+        for index, url in enumerate(islice(self.pending, TUNE_SCAN_AHEAD)):
+            # در حالت چندپردازه‌ای حد اتصال را پردازه صاحب میزبان اعمال می‌کند
+            if self.shards or host_tuner.has_room(urlparse(url).hostname or ""):
+                del self.pending[index]
+                return url
+        return None
+
+    def item_done(self, url, file_name, task):
+        host_tuner.state(urlparse(url).hostname or "").files -= 1
+        self.tasks.pop(url, None)
+        self.controls.pop(file_name, None)
+        self.queued.discard(url)
+        if not task.cancelled() and task.exception():
+            error_msg = f"Unexpected error while downloading {url}: {task.exception()}"
+            self.log_message.emit(error_msg)
+            logging.error(error_msg)
+        self.completed += 1
+        self.overall_progress.emit(self.completed, self.total)
+        self.wakeup.set()
+
+    def start_batch(self):
+        host_breakers.configure(self.config)
+        host_tuner.configure(self.config)
+        executors.configure(self.config)
+        memory_budget.configure(self.config)
+        host_tuner.on_limit_change = lambda: self.wakeup.set()
+        self.analytics = {}
+        self.completed = 0
+        if instrumentation.enabled or metrics.enabled:
+            self.monitor = asyncio.ensure_future(instrumentation.monitor_loop())
+        instrumentation.start_profile()
+
+    def finish_batch(self):
+        host_tuner.save()
+        if self.monitor:
+            self.monitor.cancel()
+            self.monitor = None
+        path = instrumentation.stop_profile()
+        if path:
+            self.log_message.emit(f"Profile saved to {path}")
+        self.total = 0
         self.log_message.emit("All downloads completed.")
         logging.info("All downloads completed.")
         self.all_downloads_complete.emit()
@@ -355,69 +3051,141 @@ class DownloadWorker(QtCore.QThread):
         allowed_extensions = self.config.get("allowed_extensions", DEFAULT_CONFIG["allowed_extensions"])
         min_bitrate = self.config.get("min_bitrate", DEFAULT_CONFIG["min_bitrate"])
         max_retries = self.config.get("max_retries", DEFAULT_CONFIG["max_retries"])
-        initial_backoff = self.config.get("initial_backoff", DEFAULT_CONFIG["initial_backoff"])
+        retry_policy = RetryPolicy.from_config(self.config)
+        control = self.controls.get(self.dedup.file_name(url)) or ItemControl()
         multi_parts = self.config.get("multi_connection_parts", 4)
-        adaptive_threshold = self.config.get("adaptive_threshold", 0.05)
-        base_chunk = self.config.get("chunk_size", 8192)
+        if host_tuner.enabled:
+            # multi_connection_parts سقف کاربر است؛ محدودیت واقعی میزبان را دروازه اتصال اعمال می‌کند
+            multi_parts = min(multi_parts, host_tuner.max_connections)
 
         if not any(url.lower().endswith(ext) for ext in allowed_extensions):
-            links = extract_all_download_links(url, allowed_extensions, min_bitrate)
+            page_content = await executors.io(fetch_page_content, url)
+            listing = self.config.get("listing_metadata", DEFAULT_CONFIG["listing_metadata"])
+            if len(page_content) >= CPU_OFFLOAD_BYTES:
+                # صفحات index بسیار بزرگ در پردازه جداگانه تجزیه می‌شوند
+                links, entries = await executors.cpu(parse_page, page_content, url, allowed_extensions, min_bitrate, listing)
+            else:
+                links, entries = parse_page(page_content, url, allowed_extensions, min_bitrate, listing)
+            remember_listing(entries, links)
             if links:
-                for link in links:
-                    file_name = unquote(os.path.basename(link.split("?")[0]))
-                    if file_name not in self.parent().added_file_names:
-                        self.download_list.append(link)
-                        self.parent().queue_list.addItem(link)
-                        self.parent().add_progress_row(link)
-                        self.parent().added_file_names.add(file_name)
+                self.checksums.update(await executors.io(extract_checksum_sidecars, page_content, url, links))
+                discovered = []
+                # تطبیق آینه‌ها برای نام‌های تکراری روی میزبان‌های مختلف HEAD می‌فرستد
+                for link, link_mirrors in await executors.io(group_mirrors, links):
+                    file_name = self.dedup.add(link)
+                    if file_name:
+                        if link_mirrors:
+                            self.mirrors[file_name] = link_mirrors
+                        discovered.append(link)
+                        # لینک‌های کشف‌شده در همین اجرا و با همین session دانلود می‌شوند
+                        self.schedule(link)
                         self.log_message.emit(f"Added to queue: {link}")
+                self.links_discovered.emit(url, discovered)
                 return
             else:
                 self.log_message.emit(f"No downloadable file found on {url}.")
                 logging.warning(f"No downloadable file found on {url}.")
                 return
 
-        original_file_name = unquote(os.path.basename(url.split("?")[0]))
+        original_file_name = self.dedup.file_name(url)
+        host = urlparse(url).hostname or ""
         self.analytics[original_file_name] = {"start": time.time(), "end": None, "errors": 0, "downloaded_bytes": 0, "status": "Running"}
         file_name = original_file_name
-        file_path = os.path.join(self.download_folder, file_name)
+        final_path = os.path.join(self.download_folder, file_name)
+        # داده تا پایان دانلود در فایل .part نوشته می‌شود و سپس به صورت اتمیک تغییر نام می‌یابد
+        file_path = final_path + PART_SUFFIX
         
         use_multi = False
         total_size = None
+        metadata = {}
         try:
-            head_resp = requests.head(url, timeout=5)
-            head_resp.raise_for_status()
-            total_size = int(head_resp.headers.get("Content-Length", 0))
-            if total_size and total_size > 10 * 1024 * 1024:
+            # HEAD در نخ جداگانه؛ برای صف‌های پر از فایل کوچک حلقه رویداد نباید منتظر هر HEAD بماند
+            metadata = await asyncio.to_thread(probe_metadata, url)
+            total_size = metadata["size"]
+            large = total_size and total_size > self.config.get("multi_connection_min_size", DEFAULT_CONFIG["multi_connection_min_size"])
+            # میزبانی که فقط یک اتصال را تحمل می‌کند از تقسیم فایل سودی نمی‌برد
+            if large and host_tuner.limit(host) != 1 or total_size and self.mirrors.get(file_name):
                 use_multi = True
         except Exception as e:
             logging.warning(f"HEAD check failed for {file_name}: {e}")
-        
+
+        if self.config.get("resume_downloads", True) and os.path.exists(final_path):
+            final_size = os.path.getsize(final_path)
+            if not total_size or final_size >= total_size:
+                self.log_message.emit(f"File {file_name} already downloaded; skipping.")
+                self.analytics[original_file_name]["status"] = "Completed"
+                self.analytics[original_file_name]["end"] = time.time()
+                self.progress_update.emit(file_name, 100)
+                return
+            if not os.path.exists(file_path):
+                # فایل ناقص از نسخه‌های قبلی (بدون پسوند .part)
+                os.replace(final_path, file_path)
+
         resume_header = {}
         mode = "wb"
         existing_size = 0
+        segment_map = None
         if self.config.get("resume_downloads", True) and os.path.exists(file_path):
             existing_size = os.path.getsize(file_path)
             if total_size and existing_size >= total_size:
-                self.log_message.emit(f"File {file_name} already downloaded; skipping.")
-                self.analytics[original_file_name]["status"] = "Completed"
-                self.analytics[original_file_name]["end"] = time.time()
-                self.progress_update.emit(file_name, 100)
-                return
+                # فایل .part با اندازه کامل: یا از حالت چنداتصالی است (فقط بلوک‌های نقشه سگمنت معتبرند)
+                # یا کامل ولی تأییدنشده (مثلاً خطای چک‌سام) که از ابتدا دانلود می‌شود
+                existing_size = 0
+                segment_map = load_segment_map(file_path, total_size, resume_validator(metadata))
+                if segment_map and not use_multi:
+                    # ادامه تک‌اتصالی فقط از بخش پیوسته ابتدای فایل ممکن است
+                    existing_size = completed_prefix(segment_map["block_size"], segment_map["blocks"], total_size)
+                    await executors.io(os.truncate, file_path, existing_size)
+                    remove_segment_map(file_path)
+        if not segment_map:
+            remove_segment_map(file_path)
+        if existing_size:
             resume_header = {"Range": f"bytes={existing_size}-"}
             mode = "ab"
             self.log_message.emit(f"Resuming download of {file_name} from {existing_size} bytes.")
             logging.info(f"Resuming download of {file_name} from {existing_size} bytes.")
         
         retry_count = 0
-        backoff = initial_backoff
         downloaded = existing_size
+        checksum = parse_checksum(self.checksums.get(file_name))
+        hash_algorithm = checksum[0] if checksum else ("sha256" if self.config.get("dedup_by_hash", DEFAULT_CONFIG["dedup_by_hash"]) else None)
 
         if use_multi and total_size:
+            ledger = None
             try:
-                downloaded = await multi_connection_download(session, url, file_path, multi_parts, adaptive_threshold, base_chunk)
+                hasher = StreamHasher(hash_algorithm, file_path) if hash_algorithm else None
+                manifest = None
+                if self.config.get("verify_block_manifest", DEFAULT_CONFIG["verify_block_manifest"]):
+                    # تا ۱۰ ثانیه برای هر نامزد؛ حلقه رویداد نباید منتظر بماند
+                    manifest = await executors.io(fetch_block_manifest, url, {"Link": metadata.get("link", "")})
+                if manifest:
+                    ledger = BlockLedger.from_manifest(total_size, manifest)
+                else:
+                    ledger = BlockLedger(total_size, self.config.get("block_size", DEFAULT_CONFIG["block_size"]))
+                if segment_map and segment_map["block_size"] == ledger.block_size:
+                    restored = await executors.io(ledger.restore, file_path, segment_map["blocks"])
+                    self.log_message.emit(f"Resuming segmented download of {file_name}: {len(ledger.completed_blocks())} of {ledger.block_count} blocks already on disk.")
+                    logging.info(f"Resuming segmented download of {file_name} from {restored} bytes.")
+                downloaded = await multi_connection_download(
+                    session, url, file_path, multi_parts, ReadSizeController.from_config(self.config, self.analytics[original_file_name]), hasher, ledger,
+                    self.config.get("use_mmap_writes", DEFAULT_CONFIG["use_mmap_writes"]), self.mirrors.get(file_name), self.analytics[original_file_name], control, file_name,
+                    self.config.get("block_size", DEFAULT_CONFIG["block_size"]), retry_policy
+                )
+                self.analytics[original_file_name]["blocks"] = ledger.block_count
+                self.analytics[original_file_name]["repaired_blocks"] = ledger.repaired
+                if ledger.repaired:
+                    self.log_message.emit(f"Re-fetched {ledger.repaired} corrupt block(s) of {file_name}.")
+                for mirror in self.analytics[original_file_name].get("mirrors", []):
+                    self.log_message.emit(f"{file_name}: {format_size(mirror['bytes'])} from {mirror['url']} ({mirror['status']}, {mirror['errors']} error(s)).")
+                digest = await executors.io(hasher.hexdigest, total_size) if hasher else None
+                # فایل کامل است (یا باید از ابتدا دانلود شود)؛ نقشه سگمنت دیگر لازم نیست
+                remove_segment_map(file_path)
+                if checksum and not self.verify_checksum(file_name, digest, checksum):
+                    return
+                os.replace(file_path, final_path)
                 self.progress_update.emit(file_name, 100)
                 self.file_complete.emit(file_name)
+                self.complete_duplicates(file_name, final_path, hash_algorithm, digest)
                 self.analytics[original_file_name]["downloaded_bytes"] = downloaded
                 self.analytics[original_file_name]["status"] = "Completed"
                 self.analytics[original_file_name]["end"] = time.time()
@@ -425,80 +3193,611 @@ class DownloadWorker(QtCore.QThread):
                 logging.info(f"Download completed (multi-connection): {file_name}")
                 return
             except Exception as e:
+                if is_disk_full(e):
+                    self.fail_download(original_file_name, str(e))
+                    return
                 self.log_message.emit(f"Multi-connection download failed for {file_name}: {e}")
                 logging.warning(f"Multi-connection download failed for {file_name}: {e}")
-        
+                # فایل .part با اندازه کامل ساخته شده است؛ ادامه تک‌اتصالی از بخش پیوسته ابتدای فایل انجام می‌شود
+                existing_size = 0
+                if self.config.get("resume_downloads", True) and os.path.exists(file_path):
+                    if os.path.getsize(file_path) < total_size:
+                        # حالت چنداتصالی پیش از ساختن فایل شکست خورده است؛ فایل ناقص قبلی دست‌نخورده است
+                        existing_size = os.path.getsize(file_path)
+                    elif ledger or segment_map:
+                        if ledger:
+                            existing_size = completed_prefix(ledger.block_size, ledger.completed_blocks(), total_size)
+                        else:
+                            existing_size = completed_prefix(segment_map["block_size"], segment_map["blocks"], total_size)
+                        await executors.io(os.truncate, file_path, existing_size)
+                remove_segment_map(file_path)
+                downloaded = existing_size
+                resume_header = {"Range": f"bytes={existing_size}-"} if existing_size else {}
+                mode = "ab" if existing_size else "wb"
+                if existing_size:
+                    self.log_message.emit(f"Resuming download of {file_name} from {existing_size} bytes.")
+
+        if total_size:
+            try:
+                check_free_space(self.download_folder, total_size - existing_size)
+            except OSError as e:
+                self.fail_download(original_file_name, str(e))
+                return
+
+        controller = ReadSizeController.from_config(self.config, self.analytics[original_file_name])
+        hasher = None
+        if hash_algorithm:
+            hasher = StreamHasher(hash_algorithm, file_path)
+            if existing_size:
+                await executors.io(hasher.catch_up, None, existing_size)
+
+        def write_batch(write_mode, data):
+            # در نخ I/O اجرا می‌شود
+            try:
+                with instrumentation.timer("write"), open(file_path, write_mode) as f:
+                    f.write(data)
+            except PermissionError as pe:
+                self.log_message.emit(f"Permission denied for {file_name}.")
+                logging.error(f"Permission denied for {file_name}: {pe}")
+                raise Exception("Permission denied. Check file access rights.")
+            instrumentation.count("write.file_opens")
+            if hasher:
+                hasher.update(data)
+
         while retry_count <= max_retries:
             try:
-                ssl_context = ssl.create_default_context()  # Creating an SSL context for secure connections.
-                ssl_context.check_hostname = False  # This disables hostname checking if needed, though you can set it to True for security.
-                async with session.get(url, headers=resume_header, timeout=30, ssl=ssl_context) as resp:
+                if downloaded:
+                    resume_header = {"Range": f"bytes={downloaded}-"}
+                    mode = "ab"
+                await host_breakers.acquire(host)
+                async with host_tuner.connection(host), session.get(url, headers=resume_header, timeout=30, ssl=self.stream_ssl_context) as resp:
                     if resp.status not in [200, 206]:
-                        raise Exception(f"HTTP response {resp.status}")
+                        raise HTTPStatusError(resp.status, parse_retry_after(resp.headers.get("Retry-After")))
+                    host_breakers.success(host)
+                    if resp.status == 200 and downloaded:
+                        # سرور Range را نادیده گرفت؛ دانلود از ابتدا
+                        logging.info(f"Server ignored Range for {file_name}; restarting from zero.")
+                        downloaded = 0
+                        mode = "wb"
+                        if hasher:
+                            hasher = StreamHasher(hash_algorithm, file_path)
                     total_chunk = resp.headers.get("Content-Length")
                     try:
-                        total_chunk = int(total_chunk) + existing_size if total_chunk else None
+                        total_chunk = int(total_chunk) + downloaded if total_chunk else None
                     except Exception as e:
                         total_chunk = None
                         logging.error(f"Error calculating total_size for {file_name}: {e}")
-                    while True:
-                        while self.pause_flags.get(file_name, False):
-                            await asyncio.sleep(1)
-                        if self.cancel_flags.get(file_name, False):
-                            self.log_message.emit(f"Download canceled for {file_name}.")
-                            logging.info(f"Download canceled: {file_name}")
-                            self.analytics[original_file_name]["status"] = "Canceled"
-                            self.analytics[original_file_name]["end"] = time.time()
-                            self.download_canceled.emit(file_name)
-                            return
-                        t0 = time.time()
-                        chunk = await resp.content.read(base_chunk)
-                        t1 = time.time()
-                        if not chunk:
-                            break
+                    writer = ChunkWriter(write_batch)
+                    with bandwidth_limiter.stream(host, file_name), metrics.connection():
                         try:
-                            with open(file_path, mode) as f:
-                                f.write(chunk)
-                        except PermissionError as pe:
-                            self.log_message.emit(f"Permission denied for {file_name}.")
-                            logging.error(f"Permission denied for {file_name}: {pe}")
-                            raise Exception("Permission denied. Check file access rights.")
-                        downloaded += len(chunk)
-                        self.analytics[original_file_name]["downloaded_bytes"] = downloaded
-                        percent = int((downloaded / total_chunk) * 100) if total_chunk else 0
-                        self.progress_update.emit(file_name, percent)
-                        elapsed = t1 - t0
-                        if elapsed < adaptive_threshold:
-                            base_chunk = min(base_chunk * 2, 65536)
-                        elif elapsed > adaptive_threshold * 2:
-                            base_chunk = max(base_chunk // 2, 1024)
-                        mode = "ab"
+                            while True:
+                                await control.checkpoint()
+                                with instrumentation.timer("fetch.read"):
+                                    chunk = await writer.read(resp.content, min(controller.size, bandwidth_limiter.chunk_limit(host, file_name) or controller.size))
+                                if not chunk:
+                                    break
+                                await writer.add(chunk, mode)
+                                mode = "ab"
+                                instrumentation.count("fetch.bytes", len(chunk))
+                                metrics.add_bytes(host, len(chunk))
+                                host_tuner.record(host, len(chunk))
+                                downloaded += len(chunk)
+                                self.analytics[original_file_name]["downloaded_bytes"] = downloaded
+                                percent = int((downloaded / total_chunk) * 100) if total_chunk else 0
+                                self.analytics[original_file_name]["percent"] = percent
+                                self.progress_update.emit(file_name, percent)
+                                controller.record(len(chunk))
+                                await bandwidth_limiter.throttle(host, file_name, len(chunk))
+                        finally:
+                            await writer.close()
+                digest = hasher.hexdigest() if hasher else None
+                if checksum and not self.verify_checksum(file_name, digest, checksum):
+                    break
+                os.replace(file_path, final_path)
                 self.file_complete.emit(file_name)
+                self.complete_duplicates(file_name, final_path, hash_algorithm, digest)
                 self.analytics[original_file_name]["status"] = "Completed"
                 self.analytics[original_file_name]["end"] = time.time()
                 self.log_message.emit(f"Download completed: {file_name}")
                 logging.info(f"Download completed: {file_name}")
                 break
+            except ConnectionReleased:
+                self.log_message.emit(f"{file_name} paused; connection released until resumed.")
+                await control.resumed.wait()
+                continue
             except Exception as e:
+                if is_disk_full(e):
+                    self.fail_download(original_file_name, f"Disk full while downloading {file_name}: {e}")
+                    break
                 retry_count += 1
                 self.analytics[original_file_name]["errors"] += 1
+                error_class = classify_error(e)
+                retry_after = getattr(e, "retry_after", None)
+                host_tuner.failure(host, error_class)
+                cooldown = host_breakers.failure(host, error_class, retry_after)
+                if cooldown is not None:
+                    self.log_message.emit(f"Circuit open for {host}; pausing all requests to it for {cooldown:.0f} sec.")
                 error_msg = f"Error downloading {file_name}: {e}"
-                if retry_count <= max_retries:
-                    msg = f"{error_msg} - Retrying {retry_count} of {max_retries} after {backoff} sec."
+                if retry_policy.should_retry(error_class, retry_count):
+                    metrics.count_retry(host)
+                    delay = retry_policy.delay(error_class, retry_count, retry_after)
+                    msg = f"{error_msg} - Retrying {retry_count} of {max_retries} after {delay:.1f} sec."
                     self.log_message.emit(msg)
                     logging.warning(msg)
-                    await asyncio.sleep(backoff)
-                    backoff *= 2
+                    await asyncio.sleep(delay)
                 else:
+                    if error_class == "permanent":
+                        error_msg += " (not retried)"
                     self.file_error.emit(file_name, error_msg)
                     self.log_message.emit(error_msg)
                     logging.error(error_msg)
-            self.overall_progress.emit(idx, total)
+                    break
+
+# ============================
+# Engine Shards (Multi-process Download Engine)
+# ============================
+SHARD_MODES = ("host", "item")
+SHARD_COUNTER_INTERVAL = 0.5
+SHARD_STOP_TIMEOUT = 10
+# فاصله بررسی زنده بودن پردازه‌های موتور (ثانیه)
+SHARD_LIVENESS_INTERVAL = 1.0
+
+class ShardWorker(DownloadWorker):
+    # worker داخل پردازه فرزند؛ رویدادها به صورت tuple فشرده به هماهنگ‌کننده فرستاده می‌شوند
+    def __init__(self, index, folder, config, commands, events, counters):
+        config = dict(config)
+        # سقف هم‌زمانی را هماهنگ‌کننده اعمال می‌کند
+        config["concurrent_downloads"] = 1 << 30
+        # هر پردازه سهم مساوی از بودجه حافظه دارد
+        config["memory_budget_mb"] = config.get("memory_budget_mb", DEFAULT_CONFIG["memory_budget_mb"]) / max(1, int(config.get("engine_processes", 1)))
+        config["engine_processes"] = 1
+        config["metrics_enabled"] = True
+        super().__init__([], folder, config, keep_alive=True)
+        metrics.configure(config)
+        self.index = index
+        self.commands = commands
+        self.events = events
+        self.counters = counters
+        self.last_percent = {}
+        self.publisher = None
+        self.progress_update.connect(self.send_progress)
+        self.file_complete.connect(lambda name: self.events.put(("complete", name)))
+        self.file_error.connect(lambda name, error: self.events.put(("error", name, error)))
+        self.log_message.connect(lambda message: self.events.put(("log", message)))
+
+    async def process_downloads(self):
+        # فرمان‌ها پس از آماده شدن حلقه خوانده و به ترتیب در همان حلقه اجرا می‌شوند
+        self.loop = asyncio.get_running_loop()
+        threading.Thread(target=self.read_commands, daemon=True).start()
+        await super().process_downloads()
+
+    def read_commands(self):
+        while True:
+            command = self.commands.get()
+            self.call_in_loop(self.apply_command, command)
+            if command[0] == "stop":
+                return
+
+    def apply_command(self, command):
+        if command[0] == "download":
+            _, url, file_name, checksum, mirrors, metadata = command
+            self.dedup.assign(normalize_url(url), file_name)
+            if metadata:
+                metadata_cache.setdefault(url, metadata)
+            if checksum:
+                self.checksums[file_name] = checksum
+            if mirrors:
+                self.mirrors[file_name] = mirrors
+            self.schedule(url)
+            self.wakeup.set()
+        elif command[0] == "limits":
+            _, global_rate, host_rates, item_rates = command
+            bandwidth_limiter.configure(global_rate, host_rates)
+            for item, rate in item_rates.items():
+                bandwidth_limiter.set_item_rate(item, rate)
+        elif command[0] == "pause":
+            self.pause_flags[command[1]] = command[2]
+            self.apply_pause(command[1])
+        elif command[0] == "cancel":
+            self.cancel_flags[command[1]] = True
+            self.interrupt_canceled()
+        elif command[0] == "stop":
+            self.stop()
+
+    def send_progress(self, file_name, percent):
+        if self.last_percent.get(file_name) != percent:
+            self.last_percent[file_name] = percent
+            self.events.put(("progress", file_name, percent))
+
+    def complete_duplicates(self, file_name, final_path, hash_algorithm=None, digest=None):
+        # نام‌های مستعار و هش‌ها در فهرست هماهنگ‌کننده هستند
+        self.events.put(("duplicates", file_name, hash_algorithm, digest))
+
+    def item_done(self, url, file_name, task):
+        super().item_done(url, file_name, task)
+        self.last_percent.pop(file_name, None)
+        self.events.put(("done", url, file_name, self.analytics.get(file_name)))
+
+    def start_batch(self):
+        super().start_batch()
+        self.publisher = asyncio.ensure_future(self.publish_counters())
+
+    async def publish_counters(self):
+        while True:
+            self.counters[self.index] = sum(metrics.bytes_by_host.values())
+            await asyncio.sleep(SHARD_COUNTER_INTERVAL)
+
+    def finish_batch(self):
+        # پایان صف را هماهنگ‌کننده اعلام می‌کند
+        self.publisher.cancel()
+        self.counters[self.index] = sum(metrics.bytes_by_host.values())
+        host_tuner.save()
+        if self.monitor:
+            self.monitor.cancel()
+            self.monitor = None
+        instrumentation.stop_profile()
+        self.total = 0
+
+def run_shard(index, folder, config, commands, events, counters):
+    run_event_loop(ShardWorker(index, folder, config, commands, events, counters).process_downloads(), config)
+
+class EngineShards:
+    # هر پردازه حلقه رویداد، session و مخزن اتصال خود را دارد؛ صف، سقف هم‌زمانی و نام فایل‌ها در هماهنگ‌کننده می‌مانند
+    def __init__(self, worker, count, mode):
+        self.worker = worker
+        self.mode = mode if mode in SHARD_MODES else "host"
+        context = mp.get_context("spawn")
+        self.events = context.Queue()
+        # بایت‌های دریافت‌شده هر پردازه در حافظه مشترک
+        self.counters = context.RawArray("q", count)
+        self.commands = [context.Queue() for _ in range(count)]
+        self.processes = [
+            context.Process(target=run_shard, args=(index, worker.download_folder, worker.config, self.commands[index], self.events, self.counters), daemon=True)
+            for index in range(count)
+        ]
+        self.waiting = {}
+        self.assigned = {}
+        self.routes = {}
+        self.load = [0] * count
+        self.dead = set()
+        self.closing = False
+        self.reader = None
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+        self.send_limits()
+        self.reader = threading.Thread(target=self.read_events, daemon=True)
+        self.reader.start()
+        metrics.shard_counters = self.counters
+        logging.info(f"Download engine started with {len(self.processes)} processes (sharded by {self.mode}).")
+
+    def read_events(self):
+        checked = time.monotonic()
+        while True:
+            try:
+                event = self.events.get(timeout=SHARD_LIVENESS_INTERVAL)
+            except queue.Empty:
+                event = False
+            if event is None:
+                return
+            if event:
+                self.worker.call_in_loop(self.handle_event, event)
+            if time.monotonic() - checked >= SHARD_LIVENESS_INTERVAL:
+                checked = time.monotonic()
+                self.check_processes()
+
+    def check_processes(self):
+        # پردازه‌ای که بدون فرمان stop خارج شده (crash، kill یا OOM) دیگر رویداد done نمی‌فرستد
+        if self.closing:
+            return
+        for index, process in enumerate(self.processes):
+            if index not in self.dead and process.exitcode is not None:
+                self.dead.add(index)
+                self.worker.call_in_loop(self.shard_exited, index, process.exitcode)
+
+    def shard_exited(self, index, exitcode):
+        message = f"Engine process {index} exited unexpectedly (exit code {exitcode})."
+        self.worker.log_message.emit(message)
+        logging.error(message)
+        # موارد در انتظار این پردازه ناموفق اعلام می‌شوند تا دسته بتواند تمام شود
+        for url, (file_name, shard) in list(self.routes.items()):
+            future = self.waiting.get(url)
+            if shard != index or not future or future.done():
+                continue
+            analytics = self.worker.analytics.setdefault(file_name, {"start": time.time(), "errors": 0, "downloaded_bytes": 0})
+            analytics["status"] = "Failed"
+            analytics["end"] = time.time()
+            self.worker.file_error.emit(file_name, message)
+            future.set_result(None)
+
+    def shard_for(self, url):
+        alive = [index for index in range(len(self.processes)) if index not in self.dead]
+        if not alive:
+            raise Exception("No engine process is running.")
+        if self.mode == "host":
+            return alive[zlib.crc32((urlparse(url).hostname or "").encode("utf-8")) % len(alive)]
+        # کم‌بارترین پردازه
+        return min(alive, key=lambda index: self.load[index])
+
+    async def download(self, url, file_name):
+        index = self.shard_for(url)
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[url] = future
+        self.assigned[file_name] = index
+        self.routes[url] = (file_name, index)
+        self.load[index] += 1
+        # متادیتای شناخته‌شده (مثلاً از فهرست autoindex) همراه فرمان فرستاده می‌شود تا فرزند دوباره HEAD نکند
+        self.commands[index].put(("download", url, file_name, self.worker.checksums.get(file_name), self.worker.mirrors.get(file_name), metadata_cache.get(url)))
+        if self.worker.pause_flags.get(file_name, False):
+            self.commands[index].put(("pause", file_name, True))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if not self.worker.stopping:
+                self.commands[index].put(("cancel", file_name))
+            raise
+        finally:
+            self.waiting.pop(url, None)
+            self.assigned.pop(file_name, None)
+            self.routes.pop(url, None)
+            self.load[index] -= 1
+
+    def send_limits(self):
+        # هر پردازه سطل‌های خود را دارد؛ سقف کلی (و در حالت item سقف هر میزبان) بین پردازه‌ها تقسیم می‌شود
+        count = len(self.processes)
+        host_share = count if self.mode == "item" else 1
+        global_rate = bandwidth_limiter.global_bucket.rate / count
+        host_rates = {host: rate / host_share for host, rate in bandwidth_limiter.host_rates.items()}
+        item_rates = {item: bucket.rate for item, bucket in list(bandwidth_limiter.item_buckets.items())}
+        for commands in self.commands:
+            commands.put(("limits", global_rate, host_rates, item_rates))
+
+    def pause(self, file_name, paused):
+        index = self.assigned.get(file_name)
+        if index is not None:
+            self.commands[index].put(("pause", file_name, paused))
+
+    def handle_event(self, event):
+        kind = event[0]
+        worker = self.worker
+        if kind == "progress":
+            worker.progress_update.emit(event[1], event[2])
+        elif kind == "complete":
+            worker.file_complete.emit(event[1])
+        elif kind == "error":
+            worker.file_error.emit(event[1], event[2])
+        elif kind == "log":
+            worker.log_message.emit(event[1])
+        elif kind == "duplicates":
+            worker.complete_duplicates(event[1], os.path.join(worker.download_folder, event[1]), event[2], event[3])
+        elif kind == "done":
+            _, url, file_name, analytics = event
+            if analytics:
+                worker.analytics[file_name] = analytics
+            future = self.waiting.get(url)
+            if future and not future.done():
+                future.set_result(None)
+
+    def close(self):
+        self.closing = True
+        for commands in self.commands:
+            commands.put(("stop",))
+        deadline = time.monotonic() + SHARD_STOP_TIMEOUT
+        for process in self.processes:
+            process.join(max(0.1, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+        self.events.put(None)
+        metrics.shard_counters = None
+
+# ============================
+# Local Control API (HTTP/JSON + Server-Sent Events)
+# ============================
+class ControlServer(QtCore.QThread):
+    # درخواست‌ها از طریق سیگنال به نخ رابط کاربری منتقل می‌شوند
+    enqueue_requested = QtCore.Signal(list, dict, dict)
+    action_requested = QtCore.Signal(str, str)
+    rate_limit_requested = QtCore.Signal(str, int)
+    log_message = QtCore.Signal(str)
+
+    def __init__(self, window, host, port, token="", api_enabled=True, metrics_enabled=False):
+        super().__init__()
+        self.window = window
+        self.host = host
+        self.port = port
+        self.token = token
+        self.api_enabled = api_enabled
+        self.metrics_enabled = metrics_enabled
+        self.loop = None
+        self.stop_event = None
+        self.subscribers = set()
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except Exception as e:
+            self.log_message.emit(f"Control API stopped: {e}")
+            logging.error(f"Control API stopped: {e}")
+
+    def stop(self):
+        if self.loop and self.stop_event:
+            self.loop.call_soon_threadsafe(self.stop_event.set)
+
+    def publish(self, event):
+        # از نخ رابط کاربری صدا زده می‌شود؛ ارسال واقعی روی حلقه سرور انجام می‌شود
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.broadcast, event)
+
+    def broadcast(self, event):
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        app = web.Application(middlewares=[self.auth_middleware])
+        if self.api_enabled:
+            app.router.add_get("/api/items", self.handle_list_items)
+            app.router.add_post("/api/items", self.handle_enqueue)
+            app.router.add_get("/api/items/{item_id}", self.handle_get_item)
+            app.router.add_post("/api/items/{item_id}/{action}", self.handle_item_action)
+            app.router.add_get("/api/events", self.handle_events)
+        if self.metrics_enabled:
+            app.router.add_get("/metrics", self.handle_metrics)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, self.host, self.port)
+        await site.start()
+        self.log_message.emit(f"Control API listening on http://{self.host}:{self.port}")
+        logging.info(f"Control API listening on http://{self.host}:{self.port}")
+        try:
+            await self.stop_event.wait()
+        finally:
+            self.broadcast(None)
+            await runner.cleanup()
+
+    @web.middleware
+    async def auth_middleware(self, request, handler):
+        if self.token:
+            supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip() or request.query.get("token", "")
+            if supplied != self.token:
+                return web.json_response({"error": "Unauthorized"}, status=401)
+        return await handler(request)
+
+    def snapshot(self):
+        # کپی سطحی از وضعیت مشترک؛ بدون قفل کردن کل صف
+        urls = list(self.window.download_list)
+        worker = self.window.worker
+        analytics = dict(worker.analytics) if worker else {}
+        pause_flags = dict(worker.pause_flags) if worker else {}
+        items = {}
+        for url in urls:
+            file_name = self.window.dedup.file_name(url)
+            items[file_name] = {"id": file_name, "url": url, "status": "Queued", "percent": 0, "downloaded_bytes": 0, "errors": 0}
+        for file_name, data in analytics.items():
+            item = items.setdefault(file_name, {"id": file_name, "url": None})
+            status = data.get("status", "-")
+            if status == "Running" and pause_flags.get(file_name, False):
+                status = "Paused"
+            item.update({
+                "status": status,
+                "percent": 100 if status == "Completed" else data.get("percent", 0),
+                "downloaded_bytes": data.get("downloaded_bytes", 0),
+                "errors": data.get("errors", 0),
+                "start": data.get("start"),
+                "end": data.get("end")
+            })
+            if data.get("mirrors"):
+                item["mirrors"] = data["mirrors"]
+        return items
+
+    async def handle_metrics(self, request):
+        # فقط کپی شمارنده‌ها خوانده می‌شود؛ حلقه دانلود هرگز منتظر scrape نمی‌ماند
+        worker = self.window.worker
+        if worker:
+            # موارد pending در total شمرده شده‌اند؛ inbox هنوز زمان‌بندی نشده است
+            queue_depth = max(0, worker.total - worker.completed) + len(worker.inbox)
+        else:
+            queue_depth = len(self.window.download_list)
+        return web.Response(body=metrics.render(queue_depth).encode("utf-8"), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+    async def handle_list_items(self, request):
+        items = list(self.snapshot().values())
+        return web.json_response({"items": items, "count": len(items)})
+
+    async def handle_get_item(self, request):
+        item = self.snapshot().get(request.match_info["item_id"])
+        if item is None:
+            return web.json_response({"error": "Item not found"}, status=404)
+        return web.json_response(item)
+
+    async def handle_enqueue(self, request):
+        try:
+            payload = await request.json()
+        except Exception:
+            return web.json_response({"error": "Invalid JSON body"}, status=400)
+        entries = payload.get("urls", []) if isinstance(payload, dict) else payload
+        if not isinstance(entries, list):
+            return web.json_response({"error": "Expected a list of URLs"}, status=400)
+        # هر مورد می‌تواند یک رشته یا {"url": ..., "checksum": "sha256:...", "mirrors": [...]} باشد
+        urls = []
+        checksums = {}
+        mirrors = {}
+        for entry in entries:
+            if isinstance(entry, dict):
+                url = str(entry.get("url", "")).strip()
+                if url and entry.get("checksum"):
+                    if not parse_checksum(entry["checksum"]):
+                        return web.json_response({"error": f"Invalid checksum for {url}"}, status=400)
+                    checksums[url] = entry["checksum"]
+                if url and entry.get("mirrors"):
+                    if not isinstance(entry["mirrors"], list):
+                        return web.json_response({"error": f"Mirrors for {url} must be a list"}, status=400)
+                    mirrors[url] = [str(m).strip() for m in entry["mirrors"] if str(m).strip()]
+            else:
+                url = entry.strip() if isinstance(entry, str) else ""
+            if url:
+                urls.append(url)
+        if not urls:
+            return web.json_response({"error": "No URL given"}, status=400)
+        self.enqueue_requested.emit(urls, checksums, mirrors)
+        return web.json_response({"queued": len(urls)}, status=202)
+
+    async def handle_item_action(self, request):
+        item_id = request.match_info["item_id"]
+        action = request.match_info["action"]
+        if action not in ("pause", "resume", "cancel", "limit"):
+            return web.json_response({"error": f"Unknown action: {action}"}, status=404)
+        if item_id not in self.snapshot():
+            return web.json_response({"error": "Item not found"}, status=404)
+        if action == "limit":
+            try:
+                rate_kbps = int((await request.json()).get("rate_kbps", 0))
+            except Exception:
+                return web.json_response({"error": "Expected {\"rate_kbps\": <int>}"}, status=400)
+            # سطل‌ها را worker و نخ رابط کاربری می‌خوانند؛ تغییر در نخ رابط کاربری انجام می‌شود
+            self.rate_limit_requested.emit(item_id, rate_kbps)
+            return web.json_response({"id": item_id, "rate_kbps": rate_kbps})
+        self.action_requested.emit(action, item_id)
+        return web.json_response({"id": item_id, "action": action}, status=202)
+
+    async def handle_events(self, request):
+        response = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive"
+        })
+        await response.prepare(request)
+        queue = asyncio.Queue(maxsize=1000)
+        self.subscribers.add(queue)
+        try:
+            await response.write(f"event: snapshot\ndata: {json.dumps(list(self.snapshot().values()))}\n\n".encode("utf-8"))
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    await response.write(b": keep-alive\n\n")
+                    continue
+                if event is None:
+                    break
+                await response.write(f"event: {event.get('type', 'message')}\ndata: {json.dumps(event)}\n\n".encode("utf-8"))
+        except ConnectionError:
+            # کلاینت اتصال را بست؛ لغو (توقف سرور) باید به aiohttp برسد
+            pass
+        finally:
+            self.subscribers.discard(queue)
+        return response
 
 # ============================
 # MainWindow Class with About Tab and UI Enhancements
 # ============================
 class MainWindow(QtWidgets.QMainWindow):
+    links_extracted = QtCore.Signal(str, object, object)
+    metadata_prefetched = QtCore.Signal(str, object, object)
+
     def __init__(self):
         super().__init__()
         self.config_data = load_config()
@@ -509,13 +3808,158 @@ class MainWindow(QtWidgets.QMainWindow):
         self.download_folder = self.config_data.get("download_folder", "")
         self.download_list = []
         self.worker = None
-        self.added_file_names = set()
+        self.dedup = DedupIndex()
+        self.expected_checksums = {}
+        self.mirrors = {}
+        self.priorities = {}
+        self.queue_store = QueueStore()
+        self.restore_rows = deque()
+        # دریافت صفحات و HEAD ها خارج از نخ رابط کاربری
+        self.discovery_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="linkstorm-discovery")
+        self.links_extracted.connect(self.add_discovered_links)
+        self.metadata_prefetched.connect(self.handle_prefetched)
+        self.preparing = 0
+        self.start_check = None
+        self.completion_deferred = False
         self.about_data = app_info  # اطلاعات واکشی شده از API
         self.setup_ui()
         self.apply_theme()
+        self.restore_queue()
+        self.queue_flush_timer = QtCore.QTimer(self)
+        self.queue_flush_timer.timeout.connect(self.queue_store.flush)
+        self.queue_flush_timer.start(int(self.config_data.get("queue_flush_interval", DEFAULT_CONFIG["queue_flush_interval"])))
+        memory_budget.configure(self.config_data)
+        self.memory_timer = QtCore.QTimer(self)
+        self.memory_timer.timeout.connect(lambda: self.memory_label.setText(memory_budget.summary()))
+        self.memory_timer.start(1000)
         self.tray_icon = QtWidgets.QSystemTrayIcon(self)
         self.tray_icon.setIcon(QtGui.QIcon("icon.png"))
         self.tray_icon.show()
+        self.control_server = None
+        metrics.configure(self.config_data)
+        self.start_control_server()
+        apply_bandwidth_config(self.config_data)
+        instrumentation.configure(self.config_data)
+
+    def start_control_server(self):
+        api_enabled = self.config_data.get("control_api_enabled", DEFAULT_CONFIG["control_api_enabled"])
+        metrics_enabled = self.config_data.get("metrics_enabled", DEFAULT_CONFIG["metrics_enabled"])
+        if not api_enabled and not metrics_enabled:
+            return
+        self.control_server = ControlServer(
+            self,
+            self.config_data.get("control_api_host", DEFAULT_CONFIG["control_api_host"]),
+            int(self.config_data.get("control_api_port", DEFAULT_CONFIG["control_api_port"])),
+            self.config_data.get("control_api_token", DEFAULT_CONFIG["control_api_token"]),
+            api_enabled,
+            metrics_enabled
+        )
+        self.control_server.enqueue_requested.connect(self.enqueue_urls)
+        self.control_server.action_requested.connect(self.handle_control_action)
+        self.control_server.rate_limit_requested.connect(self.handle_control_rate_limit)
+        self.control_server.log_message.connect(self.log)
+        self.control_server.start()
+
+    def stop_control_server(self):
+        if self.control_server:
+            self.control_server.stop()
+            self.control_server.wait(3000)
+            self.control_server = None
+
+    def publish_event(self, event_type, file_name, **data):
+        if self.control_server:
+            self.control_server.publish({"type": event_type, "id": file_name, "time": time.time(), **data})
+
+    def handle_control_action(self, action, file_name):
+        if action == "cancel":
+            self.cancel_download(file_name)
+            return
+        if not self.worker:
+            return
+        paused = self.worker.pause_flags.get(file_name, False)
+        if (action == "pause") == paused:
+            return
+        for row in range(self.progress_table.rowCount()):
+            if self.progress_table.item(row, 0).text() == file_name:
+                widget = self.progress_table.cellWidget(row, 5)
+                btn = widget.findChildren(QtWidgets.QPushButton)[0] if widget else None
+                if btn:
+                    self.toggle_pause(file_name, btn)
+                else:
+                    self.worker.pause_resume_download(file_name)
+                break
+
+    def handle_control_rate_limit(self, file_name, rate_kbps):
+        bandwidth_limiter.set_item_rate(file_name, rate_kbps * 1024)
+        self.forward_rate_limits()
+        self.log(f"Speed limit for {file_name}: {rate_kbps or 'unlimited'} KB/s")
+
+    def closeEvent(self, event):
+        if self.worker:
+            self.worker.stop()
+            self.worker.wait(5000)
+        self.stop_control_server()
+        self.discovery_pool.shutdown(wait=False, cancel_futures=True)
+        self.queue_store.close()
+        super().closeEvent(event)
+
+    def restore_queue(self):
+        started = time.perf_counter()
+        items = []
+        for item in self.queue_store.load():
+            # موارد کامل‌شده یا لغوشده توسط کاربر بازیابی نمی‌شوند
+            if item["state"] in ("Completed", "Canceled"):
+                self.queue_store.remove(item["file_name"])
+                continue
+            file_name = item["file_name"]
+            self.dedup.assign(item["url_key"] or normalize_url(item["url"]), file_name)
+            if item["checksum"]:
+                self.expected_checksums[file_name] = item["checksum"]
+            if item["mirrors"]:
+                self.mirrors[file_name] = item["mirrors"]
+            if item["priority"]:
+                self.priorities[file_name] = item["priority"]
+            self.download_list.append(item["url"])
+            items.append(item)
+        if not items:
+            return
+        self.log(f"Restored {len(items)} queued item(s) in {time.perf_counter() - started:.2f}s.")
+        # ساخت ردیف‌های جدول در دسته‌های کوچک انجام می‌شود تا پنجره بلافاصله نمایش داده شود
+        self.restore_rows = deque(items)
+        self.populate_restored_rows()
+
+    def populate_restored_rows(self):
+        batch = [self.restore_rows.popleft() for _ in range(min(RESTORE_BATCH_SIZE, len(self.restore_rows)))]
+        # اگر صف در این فاصله پاک شده باشد، ردیف‌ها دیگر ساخته نمی‌شوند
+        batch = [item for item in batch if item["file_name"] in self.dedup.names]
+        self.queue_list.setUpdatesEnabled(False)
+        self.progress_table.setUpdatesEnabled(False)
+        try:
+            row = self.progress_table.rowCount()
+            self.progress_table.setRowCount(row + len(batch))
+            for item in batch:
+                list_item = QtWidgets.QListWidgetItem(item["url"])
+                list_item.setToolTip(item["url"])
+                self.queue_list.addItem(list_item)
+                self.fill_progress_row(row, item["file_name"], item["percent"] or 0)
+                row += 1
+        finally:
+            self.queue_list.setUpdatesEnabled(True)
+            self.progress_table.setUpdatesEnabled(True)
+        # دکمه‌های هر ردیف فقط برای ردیف‌های قابل مشاهده ساخته می‌شوند
+        self.ensure_row_actions()
+        if self.restore_rows:
+            QtCore.QTimer.singleShot(0, self.populate_restored_rows)
+        elif self.config_data.get("auto_resume_queue", DEFAULT_CONFIG["auto_resume_queue"]) and self.download_folder and self.download_list:
+            self.resume_queue()
+
+    def resume_queue(self):
+        if self.worker and self.worker.busy:
+            return
+        self.log("Resuming unfinished downloads.")
+        self.start_button.setEnabled(False)
+        self.start_button.setStyleSheet("background-color: #BDBDBD; color: #757575;")
+        self.start_download()
 
     def show_notification(self, title, message):
         self.tray_icon.showMessage(title, message, QtGui.QIcon("icon.png"), 3000)
@@ -595,6 +4039,8 @@ class MainWindow(QtWidgets.QMainWindow):
         ])
         self.progress_table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
         self.progress_table.setStyleSheet("font-size: 13px; background-color: #f5f5f5;")
+        self.progress_table.verticalScrollBar().valueChanged.connect(self.ensure_row_actions)
+        self.progress_table.verticalScrollBar().rangeChanged.connect(self.ensure_row_actions)
         layout.addWidget(self.progress_table)
 
         # نوار پیشرفت کلی
@@ -605,6 +4051,8 @@ class MainWindow(QtWidgets.QMainWindow):
         # بخش گزارش
         self.log_text = QtWidgets.QTextEdit()
         self.log_text.setReadOnly(True)
+        # قدیمی‌ترین خطوط حذف می‌شوند تا اجرای طولانی حافظه را پر نکند
+        self.log_text.document().setMaximumBlockCount(self.config_data.get("log_max_lines", DEFAULT_CONFIG["log_max_lines"]))
         self.log_text.setStyleSheet("font-size: 13px;")
         layout.addWidget(self.log_text)
 
@@ -644,26 +4092,129 @@ class MainWindow(QtWidgets.QMainWindow):
     def show_list_context_menu(self, pos):
         menu = QtWidgets.QMenu()
         remove_action = menu.addAction(tr("remove_selected", self.language))
+        checksum_action = menu.addAction(tr("set_checksum", self.language))
+        rate_action = menu.addAction(tr("set_rate_limit", self.language))
+        mirrors_action = menu.addAction(tr("set_mirrors", self.language))
+        priority_action = menu.addAction(tr("set_priority", self.language))
         action = menu.exec_(self.queue_list.mapToGlobal(pos))
-        if action == remove_action:
+        if action == priority_action:
+            self.set_item_priority()
+        elif action == checksum_action:
+            self.set_item_checksum()
+        elif action == rate_action:
+            self.set_item_rate_limit()
+        elif action == mirrors_action:
+            self.set_item_mirrors()
+        elif action == remove_action:
             selected_items = self.queue_list.selectedItems()
             if selected_items:
                 for item in selected_items:
                     row = self.queue_list.row(item)
-                    file_name = unquote(os.path.basename(item.text().split("?")[0]))
-                    if file_name in self.added_file_names:
-                        self.added_file_names.remove(file_name)
+                    self.queue_store.remove(self.dedup.file_name(item.text()))
+                    self.dedup.remove(self.dedup.file_name(item.text()))
                     self.download_list.pop(row)
                     self.queue_list.takeItem(row)
-                    self.progress_table.removeRow(row)
+                    self.remove_progress_row(self.dedup.file_name(item.text()))
                     self.log(f"Removed from queue: {item.text()}")
 
+    def set_item_checksum(self):
+        selected_items = self.queue_list.selectedItems()
+        if not selected_items:
+            return
+        file_name = self.dedup.file_name(selected_items[0].text())
+        spec, ok = QtWidgets.QInputDialog.getText(self, tr("set_checksum", self.language), "md5/sha1/sha256 (e.g. sha256:HEX):", text=self.expected_checksums.get(file_name, ""))
+        if not ok:
+            return
+        if not spec.strip():
+            self.expected_checksums.pop(file_name, None)
+            self.queue_store.put(file_name, checksum=None)
+            self.log(f"Checksum removed for {file_name}")
+        elif parse_checksum(spec):
+            self.expected_checksums[file_name] = spec.strip()
+            self.queue_store.put(file_name, checksum=spec.strip())
+            self.log(f"Checksum set for {file_name}")
+        else:
+            QtWidgets.QMessageBox.warning(self, "Error", "Invalid checksum.")
+
+    def set_item_rate_limit(self):
+        selected_items = self.queue_list.selectedItems()
+        if not selected_items:
+            return
+        file_name = self.dedup.file_name(selected_items[0].text())
+        current = bandwidth_limiter.item_buckets.get(file_name)
+        rate_kbps, ok = QtWidgets.QInputDialog.getInt(self, tr("set_rate_limit", self.language), "KB/s (0 = unlimited):", int(current.rate // 1024) if current else 0, 0)
+        if ok:
+            bandwidth_limiter.set_item_rate(file_name, rate_kbps * 1024)
+            self.forward_rate_limits()
+            self.log(f"Speed limit for {file_name}: {rate_kbps or 'unlimited'} KB/s")
+
+    def forward_rate_limits(self):
+        # تغییرات در حلقه worker به پردازه‌های موتور فرستاده می‌شوند
+        worker = self.worker
+        if worker:
+            worker.call_in_loop(worker.apply_limits)
+
+    def set_item_priority(self):
+        selected_items = self.queue_list.selectedItems()
+        if not selected_items:
+            return
+        file_name = self.dedup.file_name(selected_items[0].text())
+        priority, ok = QtWidgets.QInputDialog.getInt(self, tr("set_priority", self.language), "Higher runs first (used by the manual priority order):", self.priorities.get(file_name, 0), -100, 100)
+        if not ok:
+            return
+        for item in selected_items:
+            name = self.dedup.file_name(item.text())
+            self.priorities[name] = priority
+            self.queue_store.put(name, priority=priority)
+        self.queue_store.flush()
+        self.log(f"Priority {priority} set for {len(selected_items)} item(s)")
+        if self.config_data.get("queue_policy", DEFAULT_CONFIG["queue_policy"]) == "priority":
+            self.sort_queue()
+            if self.worker:
+                # موارد شروع‌نشده در صف worker هم با اولویت جدید مرتب می‌شوند
+                self.worker.call_in_loop(self.worker.resort_pending)
+
+    def sort_queue(self):
+        policy = self.config_data.get("queue_policy", DEFAULT_CONFIG["queue_policy"])
+        if policy == "fifo":
+            return
+        priority_of = lambda url: self.priorities.get(self.dedup.file_name(url), 0)
+        self.download_list = order_queue(self.download_list, policy, self.dedup.file_name, priority_of=priority_of)
+        items = order_queue([self.queue_list.item(i).text() for i in range(self.queue_list.count())], policy, self.dedup.file_name, priority_of=priority_of)
+        self.queue_list.clear()
+        for text in items:
+            list_item = QtWidgets.QListWidgetItem(text)
+            list_item.setToolTip(text)
+            self.queue_list.addItem(list_item)
+
+    def set_item_mirrors(self):
+        selected_items = self.queue_list.selectedItems()
+        if not selected_items:
+            return
+        file_name = self.dedup.file_name(selected_items[0].text())
+        text, ok = QtWidgets.QInputDialog.getMultiLineText(self, tr("set_mirrors", self.language), "One URL per line:", "\n".join(self.mirrors.get(file_name, [])))
+        if not ok:
+            return
+        mirrors = [line.strip() for line in text.splitlines() if line.strip()]
+        self.queue_store.put(file_name, mirrors=mirrors)
+        if mirrors:
+            self.mirrors[file_name] = mirrors
+            self.log(f"{len(mirrors)} mirror(s) set for {file_name}")
+        else:
+            self.mirrors.pop(file_name, None)
+            self.log(f"Mirrors removed for {file_name}")
+
     def setup_settings_tab(self):
         layout = QtWidgets.QFormLayout(self.settings_tab)
         self.concurrent_input = QtWidgets.QLineEdit(str(self.config_data.get("concurrent_downloads", 5)))
         layout.addRow(tr("concurrent_downloads", self.language), self.concurrent_input)
         self.chunk_input = QtWidgets.QLineEdit(str(self.config_data.get("chunk_size", 8192)))
         layout.addRow(tr("chunk_size", self.language), self.chunk_input)
+        self.global_rate_input = QtWidgets.QLineEdit(str(self.config_data.get("global_rate_limit", DEFAULT_CONFIG["global_rate_limit"])))
+        layout.addRow(tr("global_rate_limit", self.language), self.global_rate_input)
+        host_limits = self.config_data.get("host_rate_limits", DEFAULT_CONFIG["host_rate_limits"])
+        self.host_rate_input = QtWidgets.QLineEdit(", ".join(f"{host}={rate}" for host, rate in host_limits.items()))
+        layout.addRow(tr("host_rate_limits", self.language), self.host_rate_input)
         self.resume_checkbox = QtWidgets.QCheckBox(tr("resume_downloads", self.language))
         self.resume_checkbox.setChecked(self.config_data.get("resume_downloads", True))
         layout.addRow(self.resume_checkbox)
@@ -680,6 +4231,48 @@ class MainWindow(QtWidgets.QMainWindow):
         allowed_exts = [ext.strip().lower() for ext in self.extensions_input.text().split(",")]
         self.bitrate_combo.setVisible(".mp3" in allowed_exts)
         layout.addRow(tr("min_bitrate", self.language), self.bitrate_combo)
+        self.queue_policy_combo = QtWidgets.QComboBox()
+        for policy in QUEUE_POLICIES:
+            self.queue_policy_combo.addItem(tr(f"policy_{policy}", self.language), policy)
+        index = self.queue_policy_combo.findData(self.config_data.get("queue_policy", DEFAULT_CONFIG["queue_policy"]))
+        self.queue_policy_combo.setCurrentIndex(max(index, 0))
+        layout.addRow(tr("queue_policy", self.language), self.queue_policy_combo)
+        self.transport_combo = QtWidgets.QComboBox()
+        for mode in TRANSPORT_MODES:
+            self.transport_combo.addItem(tr(f"transport_{mode}", self.language), mode)
+        index = self.transport_combo.findData(self.config_data.get("transport", DEFAULT_CONFIG["transport"]))
+        self.transport_combo.setCurrentIndex(max(index, 0))
+        # بدون httpx و h2 فقط HTTP/1.1 در دسترس است
+        self.transport_combo.setEnabled(httpx is not None)
+        layout.addRow(tr("transport", self.language), self.transport_combo)
+        self.engine_processes_input = QtWidgets.QLineEdit(str(self.config_data.get("engine_processes", DEFAULT_CONFIG["engine_processes"])))
+        layout.addRow(tr("engine_processes", self.language), self.engine_processes_input)
+        self.shard_by_combo = QtWidgets.QComboBox()
+        for mode in SHARD_MODES:
+            self.shard_by_combo.addItem(tr(f"shard_{mode}", self.language), mode)
+        index = self.shard_by_combo.findData(self.config_data.get("engine_shard_by", DEFAULT_CONFIG["engine_shard_by"]))
+        self.shard_by_combo.setCurrentIndex(max(index, 0))
+        layout.addRow(tr("engine_shard_by", self.language), self.shard_by_combo)
+        self.io_threads_input = QtWidgets.QLineEdit(str(self.config_data.get("io_threads", DEFAULT_CONFIG["io_threads"])))
+        layout.addRow(tr("io_threads", self.language), self.io_threads_input)
+        self.cpu_processes_input = QtWidgets.QLineEdit(str(self.config_data.get("cpu_processes", DEFAULT_CONFIG["cpu_processes"])))
+        layout.addRow(tr("cpu_processes", self.language), self.cpu_processes_input)
+        self.memory_budget_input = QtWidgets.QLineEdit(str(self.config_data.get("memory_budget_mb", DEFAULT_CONFIG["memory_budget_mb"])))
+        layout.addRow(tr("memory_budget_mb", self.language), self.memory_budget_input)
+        self.page_cache_input = QtWidgets.QLineEdit(str(self.config_data.get("page_cache_mb", DEFAULT_CONFIG["page_cache_mb"])))
+        layout.addRow(tr("page_cache_mb", self.language), self.page_cache_input)
+        self.log_max_lines_input = QtWidgets.QLineEdit(str(self.config_data.get("log_max_lines", DEFAULT_CONFIG["log_max_lines"])))
+        layout.addRow(tr("log_max_lines", self.language), self.log_max_lines_input)
+        self.uvloop_checkbox = QtWidgets.QCheckBox(tr("use_uvloop", self.language))
+        self.uvloop_checkbox.setChecked(self.config_data.get("use_uvloop", DEFAULT_CONFIG["use_uvloop"]))
+        self.uvloop_checkbox.setEnabled(uvloop is not None)
+        layout.addRow(self.uvloop_checkbox)
+        self.auto_tune_checkbox = QtWidgets.QCheckBox(tr("auto_tune_hosts", self.language))
+        self.auto_tune_checkbox.setChecked(self.config_data.get("auto_tune_hosts", DEFAULT_CONFIG["auto_tune_hosts"]))
+        layout.addRow(self.auto_tune_checkbox)
+        self.listing_metadata_checkbox = QtWidgets.QCheckBox(tr("listing_metadata", self.language))
+        self.listing_metadata_checkbox.setChecked(self.config_data.get("listing_metadata", DEFAULT_CONFIG["listing_metadata"]))
+        layout.addRow(self.listing_metadata_checkbox)
         folder_layout = QtWidgets.QHBoxLayout()
         self.folder_display = QtWidgets.QLineEdit(self.config_data.get("download_folder", ""))
         self.folder_display.setReadOnly(True)
@@ -704,6 +4297,25 @@ class MainWindow(QtWidgets.QMainWindow):
         if index >= 0:
             self.theme_combo.setCurrentIndex(index)
         layout.addRow(tr("theme", self.language), self.theme_combo)
+        self.control_api_checkbox = QtWidgets.QCheckBox(tr("control_api_enabled", self.language))
+        self.control_api_checkbox.setChecked(self.config_data.get("control_api_enabled", DEFAULT_CONFIG["control_api_enabled"]))
+        layout.addRow(self.control_api_checkbox)
+        self.control_api_port_input = QtWidgets.QLineEdit(str(self.config_data.get("control_api_port", DEFAULT_CONFIG["control_api_port"])))
+        layout.addRow(tr("control_api_port", self.language), self.control_api_port_input)
+        self.metrics_checkbox = QtWidgets.QCheckBox(tr("metrics_enabled", self.language))
+        self.metrics_checkbox.setChecked(self.config_data.get("metrics_enabled", DEFAULT_CONFIG["metrics_enabled"]))
+        layout.addRow(self.metrics_checkbox)
+        self.instrumentation_checkbox = QtWidgets.QCheckBox(tr("instrumentation_enabled", self.language))
+        self.instrumentation_checkbox.setChecked(self.config_data.get("instrumentation_enabled", DEFAULT_CONFIG["instrumentation_enabled"]))
+        layout.addRow(self.instrumentation_checkbox)
+        self.profiler_combo = QtWidgets.QComboBox()
+        self.profiler_combo.addItem("Off", "off")
+        self.profiler_combo.addItem("cProfile", "cprofile")
+        if yappi:
+            self.profiler_combo.addItem("yappi", "yappi")
+        index = self.profiler_combo.findData(self.config_data.get("profiler", DEFAULT_CONFIG["profiler"]))
+        self.profiler_combo.setCurrentIndex(max(index, 0))
+        layout.addRow(tr("profiler", self.language), self.profiler_combo)
         save_btn = QtWidgets.QPushButton(tr("save_settings", self.language))
         save_btn.setStyleSheet("background-color: #009688; color: white;")
         save_btn.clicked.connect(self.save_settings)
@@ -728,6 +4340,27 @@ class MainWindow(QtWidgets.QMainWindow):
         refresh_btn.setStyleSheet("background-color: #3F51B5; color: white;")
         refresh_btn.clicked.connect(self.update_report)
         layout.addWidget(refresh_btn)
+        self.memory_label = QtWidgets.QLabel(memory_budget.summary())
+        self.memory_label.setStyleSheet("font-size: 13px;")
+        layout.addWidget(self.memory_label)
+        self.instrumentation_view = QtWidgets.QPlainTextEdit()
+        self.instrumentation_view.setReadOnly(True)
+        self.instrumentation_view.setStyleSheet("font-family: Consolas, monospace; font-size: 12px;")
+        layout.addWidget(self.instrumentation_view)
+        export_btn = QtWidgets.QPushButton(tr("export_instrumentation", self.language))
+        export_btn.setStyleSheet("background-color: #795548; color: white;")
+        export_btn.clicked.connect(self.export_instrumentation)
+        layout.addWidget(export_btn)
+
+    def export_instrumentation(self):
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, tr("export_instrumentation", self.language), "instrumentation.json", "JSON (*.json)")
+        if not path:
+            return
+        try:
+            instrumentation.export(path)
+            self.log(f"Instrumentation exported to {path}")
+        except OSError as e:
+            QtWidgets.QMessageBox.critical(self, "Error", str(e))
 
     def setup_about_tab(self):
         layout = QtWidgets.QVBoxLayout(self.about_tab)
@@ -780,18 +4413,24 @@ class MainWindow(QtWidgets.QMainWindow):
         self.download_list.clear()
         self.queue_list.clear()
         self.progress_table.setRowCount(0)
-        self.added_file_names.clear()
+        self.dedup.clear()
+        self.queue_store.clear()
+        self.queue_store.flush()
         self.log("Download tab has been reset.")
 
     def add_progress_row(self, url):
-        file_name = unquote(os.path.basename(url.split("?")[0]))
+        file_name = self.dedup.file_name(url)
         row = self.progress_table.rowCount()
         self.progress_table.insertRow(row)
+        self.fill_progress_row(row, file_name)
+        self.attach_row_actions(row, file_name)
+
+    def fill_progress_row(self, row, file_name, percent=0):
         name_item = QtWidgets.QTableWidgetItem(file_name)
         name_item.setToolTip(file_name)
-        progress_item = QtWidgets.QTableWidgetItem("0%")
+        progress_item = QtWidgets.QTableWidgetItem(f"{percent}%")
         progress_item.setTextAlignment(QtCore.Qt.AlignCenter)
-        progress_item.setToolTip("0%")
+        progress_item.setToolTip(f"{percent}%")
         self.progress_table.setItem(row, 0, name_item)
         self.progress_table.setItem(row, 1, progress_item)
         net_item = QtWidgets.QTableWidgetItem("0")
@@ -802,41 +4441,59 @@ class MainWindow(QtWidgets.QMainWindow):
         status_item.setTextAlignment(QtCore.Qt.AlignCenter)
         status_item.setToolTip("Running")
         self.progress_table.setItem(row, 4, status_item)
+
+    def attach_row_actions(self, row, file_name):
         action_widget = QtWidgets.QWidget()
         action_layout = QtWidgets.QHBoxLayout(action_widget)
         action_layout.setContentsMargins(0,0,0,0)
-        pause_btn = QtWidgets.QPushButton(tr("pause", self.language))
+        paused = bool(self.worker and self.worker.pause_flags.get(file_name, False))
+        pause_btn = QtWidgets.QPushButton(tr("resume" if paused else "pause", self.language))
         pause_btn.setStyleSheet("background-color: #FFC107; color: black;")
-        pause_btn.clicked.connect(lambda ch, fn=unquote(os.path.basename(url.split("?")[0])), btn=pause_btn: self.toggle_pause(fn, btn))
+        pause_btn.clicked.connect(lambda ch, fn=file_name, btn=pause_btn: self.toggle_pause(fn, btn))
         cancel_btn = QtWidgets.QPushButton("Cancel")
         cancel_btn.setStyleSheet("background-color: #F44336; color: white;")
-        cancel_btn.clicked.connect(lambda ch, fn=unquote(os.path.basename(url.split("?")[0])): self.cancel_download(fn))
+        cancel_btn.clicked.connect(lambda ch, fn=file_name: self.cancel_download(fn))
         delete_btn = QtWidgets.QPushButton(tr("remove_selected", self.language))
         delete_btn.setStyleSheet("background-color: #9C27B0; color: white;")
-        delete_btn.clicked.connect(lambda ch, fn=unquote(os.path.basename(url.split("?")[0])): self.delete_row(fn))
+        delete_btn.clicked.connect(lambda ch, fn=file_name: self.delete_row(fn))
         action_layout.addWidget(pause_btn)
         action_layout.addWidget(cancel_btn)
         action_layout.addWidget(delete_btn)
         self.progress_table.setCellWidget(row, 5, action_widget)
 
+    def ensure_row_actions(self, *args):
+        table = self.progress_table
+        if not table.rowCount():
+            return
+        first = max(table.rowAt(0), 0)
+        last = table.rowAt(table.viewport().height() - 1)
+        last = table.rowCount() - 1 if last < 0 else last
+        for row in range(first, last + 1):
+            if table.cellWidget(row, 5) is None and table.item(row, 0):
+                self.attach_row_actions(row, table.item(row, 0).text())
+
+    def remove_progress_row(self, file_name):
+        # ترتیب جدول پیشرفت با مرتب‌سازی صف تغییر نمی‌کند؛ ردیف با نام فایل پیدا می‌شود نه با شماره ردیف صف
+        for row in range(self.progress_table.rowCount()):
+            if self.progress_table.item(row, 0).text() == file_name:
+                self.progress_table.removeRow(row)
+                break
+
     def delete_row(self, file_name):
         # اگر دانلود در حال انجام است، لغو شود
         if self.worker:
             self.worker.cancel_download(file_name)
         # حذف ردیف از جدول و لیست
-        for row in range(self.progress_table.rowCount()):
-            if self.progress_table.item(row, 0).text() == file_name:
-                self.progress_table.removeRow(row)
-                break
+        self.remove_progress_row(file_name)
         # حذف از لیست دانلود و لیست نمایش
         for i in range(self.queue_list.count()):
-            if self.queue_list.item(i).text() == file_name:
+            if self.dedup.file_name(self.queue_list.item(i).text()) == file_name:
                 self.queue_list.takeItem(i)
                 break
-        if file_name in self.added_file_names:
-            self.added_file_names.remove(file_name)
         # همچنین از download_list حذف شود (با توجه به ترتیب ممکن است نیاز به تطبیق ایندکس داشته باشد)
-        self.download_list = [url for url in self.download_list if unquote(os.path.basename(url.split("?")[0])) != file_name]
+        self.download_list = [url for url in self.download_list if self.dedup.file_name(url) != file_name]
+        self.dedup.remove(file_name)
+        self.queue_store.remove(file_name)
         self.log(f"Deleted from queue: {file_name}")
 
     def toggle_pause(self, file_name, btn):
@@ -891,42 +4548,117 @@ class MainWindow(QtWidgets.QMainWindow):
         urls_text = self.url_input.text().strip()
         if urls_text:
             urls = [u.strip() for u in urls_text.replace(",", "\n").split("\n") if u.strip()]
-            for url in urls:
-                item = QtWidgets.QListWidgetItem(url)
-                item.setToolTip(url)
-                if not any(url.lower().endswith(ext) for ext in self.config_data.get("allowed_extensions", DEFAULT_CONFIG["allowed_extensions"])):
-                    links = extract_all_download_links(url, self.config_data.get("allowed_extensions", DEFAULT_CONFIG["allowed_extensions"]), self.config_data.get("min_bitrate", DEFAULT_CONFIG["min_bitrate"]))
-                    if links:
-                        for link in links:
-                            file_name = unquote(os.path.basename(link.split("?")[0]))
-                            if file_name not in self.added_file_names:
-                                self.download_list.append(link)
-                                self.queue_list.addItem(QtWidgets.QListWidgetItem(link))
-                                self.add_progress_row(link)
-                                self.added_file_names.add(file_name)
-                                self.log(f"Added to queue: {link}")
-                    else:
-                        self.log(f"No downloadable file found on {url}.")
-                else:
-                    file_name = unquote(os.path.basename(url.split("?")[0]))
-                    if file_name not in self.added_file_names:
-                        self.download_list.append(url)
-                        self.queue_list.addItem(item)
-                        self.add_progress_row(url)
-                        self.added_file_names.add(file_name)
-                        self.log(f"Added to queue: {url}")
-            self.download_list.sort(key=lambda x: unquote(os.path.basename(x.split("?")[0])).lower())
-            items = [self.queue_list.item(i).text() for i in range(self.queue_list.count())]
-            items.sort(key=lambda x: unquote(os.path.basename(x.split("?")[0])).lower())
-            self.queue_list.clear()
-            for text in items:
-                list_item = QtWidgets.QListWidgetItem(text)
-                list_item.setToolTip(text)
-                self.queue_list.addItem(list_item)
+            self.enqueue_urls(urls)
             self.url_input.clear()
         else:
             QtWidgets.QMessageBox.warning(self, "Error", "Input is empty.")
 
+    def enqueue_urls(self, urls, checksums=None, mirrors=None):
+        # checksums و mirrors بر اساس آدرس؛ پس از تعیین نام نهایی به نام فایل نگاشت می‌شوند
+        checksums = checksums or {}
+        mirrors = mirrors or {}
+        added = []
+        for url in urls:
+            item = QtWidgets.QListWidgetItem(url)
+            item.setToolTip(url)
+            if not any(url.lower().endswith(ext) for ext in self.config_data.get("allowed_extensions", DEFAULT_CONFIG["allowed_extensions"])):
+                # صفحه در نخ پس‌زمینه باز می‌شود (requests یا Selenium)؛ لینک‌ها با سیگنال links_extracted برمی‌گردند
+                self.log(f"Looking for downloadable files on {url}...")
+                self.discovery_pool.submit(self.discover_links, url)
+            else:
+                file_name = self.dedup.add(url)
+                if file_name:
+                    if url in checksums:
+                        self.expected_checksums[file_name] = checksums[url]
+                    if mirrors.get(url):
+                        self.mirrors[file_name] = mirrors[url]
+                    self.queue_store.add(file_name, url, checksum=self.expected_checksums.get(file_name), mirrors=mirrors.get(url))
+                    self.download_list.append(url)
+                    added.append(url)
+                    self.queue_list.addItem(item)
+                    self.add_progress_row(url)
+                    self.log(f"Added to queue: {url}" + (f" (saved as {file_name})" if file_name != url_file_name(url) else ""))
+                    self.publish_event("queued", file_name, url=url)
+                else:
+                    self.log(f"Already in queue: {url}")
+        self.queue_added(added)
+
+    def discover_links(self, url):
+        # در نخ پس‌زمینه اجرا می‌شود؛ به ویجت‌ها و queue_store دست نمی‌زند
+        page_checksums = {}
+        try:
+            links = extract_all_download_links(url, self.config_data.get("allowed_extensions", DEFAULT_CONFIG["allowed_extensions"]), self.config_data.get("min_bitrate", DEFAULT_CONFIG["min_bitrate"]), page_checksums, self.config_data.get("listing_metadata", DEFAULT_CONFIG["listing_metadata"]))
+            grouped = group_mirrors(links) if links else []
+        except Exception as e:
+            logging.warning(f"Link discovery failed for {url}: {e}")
+            grouped = []
+        self.links_extracted.emit(url, grouped, page_checksums)
+
+    def add_discovered_links(self, url, grouped, page_checksums):
+        if not grouped:
+            self.log(f"No downloadable file found on {url}.")
+            return
+        added = []
+        for link, link_mirrors in grouped:
+            file_name = self.dedup.add(link)
+            if file_name:
+                if url_file_name(link) in page_checksums:
+                    self.expected_checksums[file_name] = page_checksums[url_file_name(link)]
+                if link_mirrors:
+                    self.mirrors[file_name] = link_mirrors
+                    self.log(f"Found {len(link_mirrors)} mirror(s) for {file_name}")
+                self.queue_store.add(file_name, link, checksum=self.expected_checksums.get(file_name), mirrors=link_mirrors)
+                self.download_list.append(link)
+                added.append(link)
+                self.queue_list.addItem(QtWidgets.QListWidgetItem(link))
+                self.add_progress_row(link)
+                self.log(f"Added to queue: {link}")
+                self.publish_event("queued", file_name, url=link)
+        self.queue_added(added)
+
+    def queue_added(self, added):
+        self.queue_store.flush()
+        self.sort_queue()
+        if added and self.worker and self.worker.busy:
+            # دانلود در جریان است؛ HEAD ها در نخ پس‌زمینه و در دسته‌های کوچک انجام می‌شوند
+            # و هر دسته پس از آماده شدن به همان worker سپرده می‌شود
+            for start in range(0, len(added), PREFETCH_BATCH):
+                self.preparing += 1
+                self.discovery_pool.submit(self.prefetch_metadata, "added", added[start:start + PREFETCH_BATCH])
+
+    def prefetch_metadata(self, purpose, urls):
+        # در نخ پس‌زمینه اجرا می‌شود؛ خطاها نگه داشته می‌شوند تا prepare_downloads همان رفتار قبلی را داشته باشد
+        results = {}
+        for url in urls:
+            try:
+                results[url] = probe_metadata(url)
+            except Exception as e:
+                results[url] = e
+        self.metadata_prefetched.emit(purpose, urls, results)
+
+    def handle_prefetched(self, purpose, urls, results):
+        if purpose == "start":
+            self.finish_start_check(results)
+        else:
+            self.submit_prefetched(urls, results)
+
+    def submit_prefetched(self, urls, results):
+        self.preparing -= 1
+        # مواردی که در این فاصله حذف شده‌اند کنار گذاشته می‌شوند
+        queued = set(self.download_list)
+        urls = [url for url in urls if url in queued]
+        try:
+            filtered = self.prepare_downloads(urls, results)
+        except OSError as e:
+            self.log(str(e))
+            filtered = []
+        if filtered and self.worker and self.worker.isRunning():
+            self.completion_deferred = False
+            self.worker.submit(filtered)
+        elif self.completion_deferred and not self.preparing:
+            self.completion_deferred = False
+            self.all_downloads_complete()
+
     def remove_selected(self):
         selected = self.queue_list.selectedItems()
         if not selected:
@@ -934,19 +4666,20 @@ class MainWindow(QtWidgets.QMainWindow):
             return
         for item in selected:
             row = self.queue_list.row(item)
-            file_name = unquote(os.path.basename(item.text().split("?")[0]))
-            if file_name in self.added_file_names:
-                self.added_file_names.remove(file_name)
+            self.queue_store.remove(self.dedup.file_name(item.text()))
+            self.dedup.remove(self.dedup.file_name(item.text()))
             self.download_list.pop(row)
             self.queue_list.takeItem(row)
-            self.progress_table.removeRow(row)
+            self.remove_progress_row(self.dedup.file_name(item.text()))
             self.log(f"Removed from queue: {item.text()}")
 
     def clear_queue(self):
         self.download_list.clear()
         self.queue_list.clear()
         self.progress_table.setRowCount(0)
-        self.added_file_names.clear()
+        self.dedup.clear()
+        self.queue_store.clear()
+        self.queue_store.flush()
         self.log("Download queue cleared.")
 
     def move_up(self):
@@ -982,8 +4715,7 @@ class MainWindow(QtWidgets.QMainWindow):
     def stop_download(self):
         # توقف دانلود تمام موارد؛ برای هر فایل موجود در worker، cancel انجام شود
         if self.worker:
-            for file_name in list(self.worker.analytics.keys()):
-                self.worker.cancel_download(file_name)
+            self.worker.cancel_all()
             self.log("Stop download requested for all items.")
             self.show_notification("Stopped", "All downloads have been requested to stop.")
 
@@ -996,34 +4728,98 @@ class MainWindow(QtWidgets.QMainWindow):
             QtWidgets.QMessageBox.critical(self, "Error", "Please select a download folder.")
             self.start_button.setEnabled(True)
             return
+        if self.start_check is not None:
+            return
+        # HEAD همه موارد (مثلاً صف بازیابی‌شده در شروع برنامه) در نخ‌های پس‌زمینه انجام می‌شود؛ پنجره منتظر نمی‌ماند
+        self.start_check = {"results": {}, "left": 0}
+        urls = list(self.download_list)
+        for start in range(0, len(urls), PREFETCH_BATCH):
+            self.start_check["left"] += 1
+            self.discovery_pool.submit(self.prefetch_metadata, "start", urls[start:start + PREFETCH_BATCH])
+        self.log(f"Checking {len(urls)} item(s) before starting...")
+
+    def finish_start_check(self, results):
+        check = self.start_check
+        check["results"].update(results)
+        check["left"] -= 1
+        if check["left"]:
+            return
+        self.start_check = None
+        # مواردی که در این فاصله حذف شده‌اند دیگر در download_list نیستند
+        urls = [url for url in self.download_list if url in check["results"]]
+        try:
+            filtered_list = self.prepare_downloads(urls, check["results"])
+        except OSError as e:
+            self.log(str(e))
+            QtWidgets.QMessageBox.critical(self, "Error", str(e))
+            self.start_button.setEnabled(True)
+            self.start_button.setStyleSheet("background-color: #FF5722; color: white; font-size: 14px;")
+            return
+        # موارد اضافه‌شده در زمان بررسی در انتهای صف می‌مانند و با همین دسته شروع می‌شوند
+        checked = set(urls)
+        added = [url for url in self.download_list if url not in checked]
+        self.download_list = filtered_list + added
+        if not self.download_list:
+            self.start_button.setEnabled(True)
+            self.start_button.setStyleSheet("background-color: #FF5722; color: white; font-size: 14px;")
+            return
+        # اندازه‌ها در prepare_downloads شناخته شده‌اند؛ ترتیب بر اساس سیاست انتخاب‌شده
+        self.sort_queue()
+        self.overall_progress_bar.setMaximum(len(self.download_list))
+        self.overall_progress_bar.setValue(0)
+        self.ensure_worker().submit(self.download_list)
+        logging.info("Download process started.")
+
+    def prepare_downloads(self, urls, prefetched=None):
+        # بررسی‌های پیش از دانلود (فایل‌های کامل، محتوای تکراری، فضای آزاد)؛ در صورت کمبود فضا OSError
         filtered_list = []
-        for url in self.download_list:
-            file_name = unquote(os.path.basename(url.split("?")[0]))
+        required_space = 0
+        skipped = set()
+        for url in urls:
+            file_name = self.dedup.file_name(url)
             file_path = os.path.join(self.download_folder, file_name)
             try:
-                head_resp = requests.head(url, timeout=5)
-                head_resp.raise_for_status()
-                expected_size = int(head_resp.headers.get("Content-Length", 0))
+                metadata = prefetched[url] if prefetched and url in prefetched else probe_metadata(url)
+                if isinstance(metadata, Exception):
+                    raise metadata
+                expected_size = metadata["size"]
+                stored_etag = self.queue_store.etags.get(file_name)
+                if stored_etag and metadata["etag"] and stored_etag != metadata["etag"] and os.path.exists(file_path + PART_SUFFIX):
+                    # فایل روی سرور تغییر کرده است؛ داده ناقص قبلی قابل ادامه نیست
+                    os.remove(file_path + PART_SUFFIX)
+                    remove_segment_map(file_path + PART_SUFFIX)
+                    self.log(f"{file_name} changed on the server; restarting from the beginning.")
+                self.queue_store.put(file_name, size=expected_size, etag=metadata["etag"], part_path=file_path + PART_SUFFIX)
                 if os.path.exists(file_path):
                     existing_size = os.path.getsize(file_path)
                     if expected_size != 0 and existing_size >= expected_size:
                         self.log(f"File {file_name} already downloaded; skipping.")
+                        skipped.add(file_name)
                         continue
+                owner = self.dedup.register_content(file_name, expected_size, metadata["etag"]) if self.config_data.get("dedup_by_content", DEFAULT_CONFIG["dedup_by_content"]) else None
+                if owner:
+                    owner_path = os.path.join(self.download_folder, owner)
+                    if owner in skipped and os.path.exists(owner_path):
+                        how = link_or_copy(owner_path, file_path, self.config_data.get("dedup_link_mode", DEFAULT_CONFIG["dedup_link_mode"]))
+                        self.log(f"{file_name} has the same content as {owner}; created by {how}.")
+                        skipped.add(file_name)
+                    else:
+                        self.log(f"{file_name} has the same content as {owner}; it will be downloaded once.")
+                    continue
+                part_size = os.path.getsize(file_path + PART_SUFFIX) if os.path.exists(file_path + PART_SUFFIX) else 0
+                required_space += max(0, expected_size - part_size)
             except Exception as e:
                 logging.warning(f"HEAD check failed for {file_name}: {e}")
             filtered_list.append(url)
-        self.download_list = filtered_list
-        self.download_list.sort(key=lambda x: unquote(os.path.basename(x.split("?")[0])).lower())
-        items = [self.queue_list.item(i).text() for i in range(self.queue_list.count())]
-        items.sort(key=lambda x: unquote(os.path.basename(x.split("?")[0])).lower())
-        self.queue_list.clear()
-        for text in items:
-            list_item = QtWidgets.QListWidgetItem(text)
-            list_item.setToolTip(text)
-            self.queue_list.addItem(list_item)
-        self.overall_progress_bar.setMaximum(len(self.download_list))
-        self.overall_progress_bar.setValue(0)
-        self.worker = DownloadWorker(self.download_list, self.download_folder, self.config_data)
+        check_free_space(self.download_folder, required_space)
+        return filtered_list
+
+    def ensure_worker(self):
+        # یک worker دائمی برای کل عمر برنامه؛ session و اتصال‌ها بین دسته‌ها حفظ می‌شوند
+        if self.worker and self.worker.isRunning():
+            self.worker.download_folder = self.download_folder
+            return self.worker
+        self.worker = DownloadWorker([], self.download_folder, self.config_data, self.expected_checksums, self.dedup, self.mirrors, keep_alive=True, priorities=self.priorities)
         self.worker.progress_update.connect(self.handle_progress_update)
         self.worker.file_complete.connect(self.handle_file_complete)
         self.worker.file_error.connect(self.handle_file_error)
@@ -1031,13 +4827,33 @@ class MainWindow(QtWidgets.QMainWindow):
         self.worker.log_message.connect(self.log)
         self.worker.download_canceled.connect(self.handle_download_canceled)
         self.worker.all_downloads_complete.connect(self.all_downloads_complete)
+        self.worker.links_discovered.connect(self.handle_links_discovered)
         self.worker.start()
-        logging.info("Download process started.")
+        return self.worker
+
+    def handle_links_discovered(self, page_url, links):
+        # worker لینک‌ها را خودش زمان‌بندی کرده است؛ اینجا فقط صف و جدول به‌روز می‌شوند
+        for link in links:
+            file_name = self.dedup.file_name(link)
+            self.queue_store.add(file_name, link, checksum=self.expected_checksums.get(file_name), mirrors=self.mirrors.get(file_name))
+            self.download_list.append(link)
+            list_item = QtWidgets.QListWidgetItem(link)
+            list_item.setToolTip(link)
+            self.queue_list.addItem(list_item)
+            self.add_progress_row(link)
+            self.publish_event("queued", file_name, url=link)
+        self.queue_store.flush()
+        if links:
+            self.log(f"Found {len(links)} file(s) on {page_url}.")
 
     def handle_progress_update(self, file_name, percent):
-        self.update_progress_row(file_name, percent)
+        with instrumentation.timer("ui.progress"):
+            self.update_progress_row(file_name, percent)
+        self.queue_store.put(file_name, state="Running", percent=percent)
+        self.publish_event("progress", file_name, percent=percent)
 
     def handle_file_complete(self, file_name):
+        self.queue_store.put(file_name, state="Completed", percent=100)
         for row in range(self.progress_table.rowCount()):
             if self.progress_table.item(row, 0).text() == file_name:
                 self.progress_table.item(row, 4).setText("Completed")
@@ -1046,9 +4862,13 @@ class MainWindow(QtWidgets.QMainWindow):
                 self.progress_table.item(row, 2).setText(f"{mb:.2f} MB")
                 break
         self.log(f"Download completed: {file_name}")
+        self.publish_event("completed", file_name)
         self.show_notification("Completed", f"Download completed: {file_name}")
 
     def handle_file_error(self, file_name, error):
+        for alias in self.dedup.aliases_of(file_name):
+            self.handle_file_error(alias, f"Duplicate of {file_name}: {error}")
+        self.queue_store.put(file_name, state="Failed")
         for row in range(self.progress_table.rowCount()):
             if self.progress_table.item(row, 0).text() == file_name:
                 self.progress_table.item(row, 4).setText("Failed")
@@ -1057,28 +4877,42 @@ class MainWindow(QtWidgets.QMainWindow):
                 self.progress_table.item(row, 2).setText(f"{mb:.2f} MB")
                 break
         self.log(f"Error downloading {file_name}: {error}")
+        self.publish_event("failed", file_name, error=error)
         self.show_notification("Error", f"{file_name}\n{error}")
         QtWidgets.QMessageBox.critical(self, "Download Error", f"{file_name}\n{error}")
 
     def handle_download_canceled(self, file_name):
+        for alias in self.dedup.aliases_of(file_name):
+            self.handle_download_canceled(alias)
+        self.queue_store.put(file_name, state="Canceled")
         for row in range(self.progress_table.rowCount()):
             if self.progress_table.item(row, 0).text() == file_name:
                 self.progress_table.item(row, 4).setText("Canceled")
                 break
         self.log(f"Download canceled: {file_name}")
+        self.publish_event("canceled", file_name)
         self.show_notification("Canceled", f"Download {file_name} has been canceled.")
         QtWidgets.QMessageBox.information(self, "Download Canceled", f"Download {file_name} has been canceled.")
 
     def handle_overall_progress(self, current, total):
+        self.overall_progress_bar.setMaximum(total)
         self.overall_progress_bar.setValue(current)
 
     def all_downloads_complete(self):
         self.update_report()
+        if self.worker and self.worker.busy:
+            # دسته جدیدی پیش از رسیدن این سیگنال شروع شده است
+            return
+        if self.preparing:
+            # موارد اضافه‌شده هنوز در حال بررسی‌اند؛ پس از آن یا دسته جدید شروع می‌شود یا همین پیام نمایش داده می‌شود
+            self.completion_deferred = True
+            return
         QtWidgets.QMessageBox.information(self, "Info", "All downloads are complete.")
         self.download_list.clear()
         self.queue_list.clear()
         self.progress_table.setRowCount(0)
-        self.added_file_names.clear()
+        self.dedup.clear()
+        self.queue_store.remove_completed()
         self.start_button.setEnabled(True)
         self.start_button.setStyleSheet("background-color: #FF5722; color: white; font-size: 14px;")
 
@@ -1089,13 +4923,49 @@ class MainWindow(QtWidgets.QMainWindow):
         try:
             self.config_data["concurrent_downloads"] = int(self.concurrent_input.text())
             self.config_data["chunk_size"] = int(self.chunk_input.text())
+            self.config_data["global_rate_limit"] = int(self.global_rate_input.text() or 0)
+            self.config_data["host_rate_limits"] = parse_host_rate_limits(self.host_rate_input.text())
+            apply_bandwidth_config(self.config_data)
+            self.forward_rate_limits()
             self.config_data["resume_downloads"] = self.resume_checkbox.isChecked()
             extensions = [ext.strip() for ext in self.extensions_input.text().split(",") if ext.strip()]
             self.config_data["allowed_extensions"] = extensions if extensions else DEFAULT_CONFIG["allowed_extensions"]
             self.config_data["min_bitrate"] = self.bitrate_combo.currentData()
+            if self.config_data.get("queue_policy") != self.queue_policy_combo.currentData():
+                self.config_data["queue_policy"] = self.queue_policy_combo.currentData()
+                self.sort_queue()
+                if self.worker:
+                    self.worker.call_in_loop(self.worker.resort_pending)
+            self.config_data["auto_tune_hosts"] = self.auto_tune_checkbox.isChecked()
+            self.config_data["listing_metadata"] = self.listing_metadata_checkbox.isChecked()
+            self.config_data["transport"] = self.transport_combo.currentData()
+            self.config_data["engine_processes"] = max(1, int(self.engine_processes_input.text()))
+            self.config_data["engine_shard_by"] = self.shard_by_combo.currentData()
+            self.config_data["io_threads"] = max(1, int(self.io_threads_input.text()))
+            self.config_data["cpu_processes"] = max(0, int(self.cpu_processes_input.text()))
+            self.config_data["memory_budget_mb"] = max(0, int(self.memory_budget_input.text()))
+            self.config_data["page_cache_mb"] = max(0, int(self.page_cache_input.text()))
+            self.config_data["log_max_lines"] = max(100, int(self.log_max_lines_input.text()))
+            # بودجه روی worker در حال اجرا هم بلافاصله اعمال می‌شود
+            memory_budget.configure(self.config_data)
+            self.log_text.document().setMaximumBlockCount(self.config_data["log_max_lines"])
+            self.config_data["use_uvloop"] = self.uvloop_checkbox.isChecked()
+            host_tuner.configure(self.config_data)
             self.config_data["download_folder"] = self.download_folder
             self.config_data["language"] = self.language_combo.currentData()
             self.config_data["theme"] = self.theme_combo.currentData()
+            api_settings = (self.config_data.get("control_api_enabled"), self.config_data.get("control_api_port"), self.config_data.get("metrics_enabled"))
+            self.config_data["control_api_enabled"] = self.control_api_checkbox.isChecked()
+            self.config_data["control_api_port"] = int(self.control_api_port_input.text())
+            self.config_data["metrics_enabled"] = self.metrics_checkbox.isChecked()
+            metrics.configure(self.config_data)
+            if api_settings != (self.config_data["control_api_enabled"], self.config_data["control_api_port"], self.config_data["metrics_enabled"]):
+                self.stop_control_server()
+                self.start_control_server()
+            # اندازه‌گیری‌ها بلافاصله فعال/غیرفعال می‌شوند؛ پایش حلقه و پروفایلر از دانلود بعدی
+            self.config_data["instrumentation_enabled"] = self.instrumentation_checkbox.isChecked()
+            self.config_data["profiler"] = self.profiler_combo.currentData()
+            instrumentation.configure(self.config_data)
             self.language = self.config_data["language"]
             self.theme = self.config_data["theme"]
             save_config(self.config_data)
@@ -1112,10 +4982,13 @@ class MainWindow(QtWidgets.QMainWindow):
     def update_cache(self):
         global cache_data
         cache_data = {}
+        metadata_cache.clear()
         save_cache_data()
         self.log("Cache updated and old data cleared.")
 
     def update_report(self):
+        self.memory_label.setText(memory_budget.summary())
+        self.instrumentation_view.setPlainText(instrumentation.summary() if instrumentation.enabled or instrumentation.timers else "")
         if self.worker is None or not hasattr(self.worker, "analytics"):
             return
         for file_name, data in self.worker.analytics.items():
@@ -1203,4 +5076,6 @@ def main():
     sys.exit(app.exec())
 
 if __name__ == "__main__":
+    # پردازه‌های موتور در نسخه PyInstaller از همین فایل اجرایی ساخته می‌شوند
+    mp.freeze_support()
     main()